@@ -1,23 +1,55 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from pyfin_sentiment.model import SentimentModel
+import time
+from startup import StartupReport
+
+# Timings of each startup phase, reported by /readyz and /metrics/
+startup_report = StartupReport()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Header, HTTPException, Query, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from datetime import datetime, timedelta
 import os
 import json
 import hashlib
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from io import BytesIO
-import yfinance as yf
-from statsmodels.tsa.ar_model import AutoReg
-import datetime as dt
-import requests
+import asyncio
+import base64
+from io import TextIOWrapper
 import numpy as np
 
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-import os
+
+from storage import (
+    BUDGET_PERIODS,
+    GroupCommitter,
+    UserLocks,
+    decode_cursor,
+    encode_cursor,
+    get_backend,
+    new_record_id,
+    period_key,
+)
+from user_cache import CachingBackend
+from scheduler import RecurringScheduler
+from importers import DEFAULT_CATEGORY, ImportRowError, iter_csv_transactions, iter_ofx_transactions, transaction_hash
+from pydantic import ValidationError
+from executors import PoolBusyError, make_cpu_pool, make_io_pool
+from ar_cache import ArModelCache
+from forecast_adjustment import AdjustmentParams, adjust_forecast_series
+from forecasting import fit_ar_forecast, warm_up as warm_up_forecasting
+from issuers import IssuerRegistry, yfinance_ticker
+from market_data import OhlcStore, get_provider, market_is_open
+from precompute import CronSchedule, PrecomputeScheduler, PredictionStore, RequestCounter, after_close_cron
+from quote_cache import SingleFlightCache
+from serialization import VARY, compact_prediction, decode_prediction, encode_json, encode_prediction, render, wants_msgpack
+from sentiment import CachedSentiment, MicroBatcher, ModelNotReadyError, SentimentCache, SentimentModelLoader
+from charts import CHART_FORMATS, ChartCache, analytics_data, chart_key, render_pie_chart
+
+# pandas, yfinance, statsmodels, matplotlib and the sentiment model are
+# imported on first use or by the background warm-up, not here
+startup_report.mark("imports")
 
 # Get CORS origins from environment variable or use defaults
 cors_origins_env = os.getenv("CORS_ORIGINS", "")
@@ -30,12 +62,122 @@ else:
 # Global variables
 file = "users_data.json"
 
-# Download sentiment model
-model_size = os.getenv("SENTIMENT_MODEL_SIZE", "small")
-SentimentModel.download(model_size)
-sentiment_model = SentimentModel(model_size)
+# User data storage (sqlite by default, "json" keeps the single users_data.json file)
+user_store = get_backend(
+    os.getenv("STORAGE_BACKEND", "sqlite"),
+    json_path=file,
+    sqlite_path=os.getenv("STORAGE_SQLITE_PATH", "users_data.db"),
+)
+
+# In-process LRU cache of user profiles (0 entries disables it). Saves are written
+# through unless USER_CACHE_FLUSH_SECONDS enables write-behind (single worker only)
+user_cache_max_entries = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1000"))
+if user_cache_max_entries > 0:
+    user_store = CachingBackend(
+        user_store,
+        max_entries=user_cache_max_entries,
+        max_bytes=int(os.getenv("USER_CACHE_MAX_MB", "64")) * 1024 * 1024,
+        flush_interval=float(os.getenv("USER_CACHE_FLUSH_SECONDS", "0")),
+    )
+startup_report.mark("storage")
+
+# Blocking work runs in bounded pools: threads for I/O, processes for CPU
+io_pool = make_io_pool()
+cpu_pool = make_cpu_pool()
+
+async def run_io(fn, *args, **kwargs):
+    try:
+        return await io_pool.run(fn, *args, **kwargs)
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def run_cpu(fn, *args, **kwargs):
+    try:
+        return await cpu_pool.run(fn, *args, **kwargs)
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-app = FastAPI()
+# Per-user locks around read-modify-write, and optional group commit that merges
+# writes arriving within STORAGE_GROUP_COMMIT_MS into a single commit. Storage
+# calls run in the I/O pool.
+user_locks = UserLocks()
+user_commits = GroupCommitter(user_store, float(os.getenv("STORAGE_GROUP_COMMIT_MS", "0")) / 1000.0, run_io)
+
+# Posts due recurring transactions, off unless enabled; one worker is enough
+recurring_scheduler = RecurringScheduler(user_store, user_locks, run_io)
+recurring_scheduler_enabled = os.getenv("RECURRING_SCHEDULER_ENABLED", "0") == "1"
+
+# Sentiment model, downloaded and loaded in the background once the app is up
+model_size = os.getenv("SENTIMENT_MODEL_SIZE", "small")
+sentiment_loader = SentimentModelLoader(model_size, startup_report)
+
+# Texts from concurrent callers are scored together in one predict call
+sentiment_batcher = MicroBatcher(
+    sentiment_loader.predict,
+    run_io,
+    max_batch=int(os.getenv("SENTIMENT_BATCH_MAX", "64")),
+    max_wait=float(os.getenv("SENTIMENT_BATCH_WAIT_MS", "5")) / 1000.0,
+)
+
+# Labels of texts already scored by this model size, in memory and on disk
+sentiment_cache = SentimentCache(
+    model_size,
+    path=os.getenv("SENTIMENT_CACHE_PATH", "sentiment_cache.db") or None,
+    max_entries=int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", "10000")),
+    max_disk_entries=int(os.getenv("SENTIMENT_CACHE_DISK_MAX_ENTRIES", "1000000")),
+)
+cached_sentiment = CachedSentiment(sentiment_batcher, sentiment_cache, run_io)
+
+async def predict_sentiment(texts):
+    try:
+        return await cached_sentiment.predict(texts)
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def warm_up():
+    """Load the sentiment model and warm the pools and issuer index without blocking startup."""
+    async def warm_cpu_pool():
+        with startup_report.phase("cpu_pool_warmup"):
+            await asyncio.gather(*[cpu_pool.run(warm_up_forecasting) for _ in range(cpu_pool.max_concurrency)])
+
+    async def warm_issuers():
+        with startup_report.phase("issuer_index"):
+            await io_pool.run(issuer_registry.index)
+
+    async def load_model():
+        await sentiment_loader.run(io_pool.run, float(os.getenv("SENTIMENT_LOAD_RETRY_SECONDS", "30")))
+        startup_report.ready()
+        print(f"Ready: {startup_report.report()}")
+
+    results = await asyncio.gather(warm_cpu_pool(), warm_issuers(), load_model(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error during warm-up: {result}")
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(warm_up())]
+    if isinstance(user_store, CachingBackend) and user_store.write_behind:
+        tasks.append(asyncio.create_task(user_store.run_flusher()))
+    if recurring_scheduler_enabled:
+        tasks.append(asyncio.create_task(recurring_scheduler.run()))
+    tasks.append(asyncio.create_task(prediction_counter.run_flusher(io_pool.run)))
+    if precompute_enabled:
+        tasks.append(asyncio.create_task(precompute_scheduler.run(io_pool.run)))
+    startup_report.phases["lifespan"] = time.perf_counter() - started
+    yield
+    for task in tasks:
+        task.cancel()
+    # Persist anything still waiting in the write-behind cache
+    user_store.close()
+    await prediction_counter.flush(io_pool.run)
+    prediction_store.close()
+    sentiment_cache.close()
+    io_pool.shutdown()
+    cpu_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware - allow all origins by default, or specific origins if configured
 # Empty origins list + allow_origin_regex=".*" allows all origins with credentials
@@ -71,7 +213,7 @@ async def analyze_sentiment(request: SentimentRequest):
         raise HTTPException(status_code=400, detail="No text provided for analysis.")
     
     # Predict sentiment for the entire text block
-    sentiment = sentiment_model.predict([statement])
+    sentiment = await predict_sentiment([statement])
     
     # Return the sentiment analysis result
     return {
@@ -79,11 +221,35 @@ async def analyze_sentiment(request: SentimentRequest):
         "predicted_sentiment": sentiment[0]
     }
 
+class SentimentBatchRequest(BaseModel):
+    texts: List[str]
+
+# Most texts accepted by one /analyze_sentiment_batch/ call
+SENTIMENT_BATCH_REQUEST_MAX = int(os.getenv("SENTIMENT_BATCH_REQUEST_MAX", "1000"))
+
+@app.post("/analyze_sentiment_batch/")
+async def analyze_sentiment_batch(request: SentimentBatchRequest):
+    if not request.texts:
+        raise HTTPException(status_code=400, detail="No texts provided for analysis.")
+    if len(request.texts) > SENTIMENT_BATCH_REQUEST_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {SENTIMENT_BATCH_REQUEST_MAX} texts per request.")
+    if not all(request.texts):
+        raise HTTPException(status_code=400, detail="Texts must not be empty.")
+
+    sentiments = await predict_sentiment(request.texts)
+    return {
+        "results": [
+            {"text": text, "predicted_sentiment": sentiment}
+            for text, sentiment in zip(request.texts, sentiments)
+        ]
+    }
+
 # Data models
 class Transaction(BaseModel):
     amount: float
     description: str
     category: str
+    date: Optional[str] = None  # "YYYY-MM-DD[ HH:MM:SS]", defaults to now
 
 class RecurringTransaction(BaseModel):
     amount: float
@@ -107,6 +273,7 @@ class SavingsGoal(BaseModel):
 class Budget(BaseModel):
     category: str
     amount: float
+    period: str = "all"  # "all", "monthly" or "weekly"
 
 class Loan(BaseModel):
     loan_amount: float
@@ -114,59 +281,85 @@ class Loan(BaseModel):
     duration_months: int
 
 # Helper functions
-def load_user_data(user):
-    if os.path.exists(file):
-        with open(file, "r") as f:
-            data = json.load(f)
-            user_data = data.get(user, {})
-            return user_data
-    return {}
-
-def save_user_data(user, data):
-    if os.path.exists(file):
-        with open(file, "r") as f:
-            all_data = json.load(f)
-    else:
-        all_data = {}
+async def load_user_data(user, fields=None):
+    # The user's profile (or only `fields` of it): never the transaction log, which is only appended to
+    return await run_io(user_store.load_profile, user, fields)
+
+async def save_user_data(user, data):
+    await user_commits.submit(("save", user, data))
 
-    all_data[user] = data
-    with open(file, "w") as f:
-        json.dump(all_data, f, indent=4)
+async def append_user_transactions(user, transactions):
+    return await user_commits.submit(("append", user, transactions))
+
+def normalize_transaction_date(date):
+    # Stored as "YYYY-MM-DD HH:MM:SS" so month/week keys can be sliced from it
+    if not date:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        return datetime.fromisoformat(date).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid transaction date: {date}")
+
+def normalize_due_date(due_date):
+    # Stored as "YYYY-MM-DD" so the bill index sorts and range-filters correctly
+    try:
+        return datetime.fromisoformat(due_date).strftime("%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid due date: {due_date}")
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def update_savings(user_data):
-    user_data["savings"] = max(0, sum(t['amount'] for t in user_data.get('transactions', [])))
-    return user_data
-
 # Routes
 
 @app.post("/signup/")
 async def sign_up(user: User):
-    data = {}
-    if os.path.exists(file):
-        with open(file, "r") as f:
-            data = json.load(f)
-
-    if user.username in data:
-        raise HTTPException(status_code=400, detail="Username already exists!")
+    async with user_locks(user.username):
+        if await run_io(user_store.user_exists, user.username):
+            raise HTTPException(status_code=400, detail="Username already exists!")
     
-    data[user.username] = {"password": hash_password(user.password), "transactions": [], "recurring_transactions": [], "budget": {}, "savings_goal": 0.0, "savings": 0.0, "bills": []}
-    save_user_data(user.username, data[user.username])
-    return {"message": "Sign up successful!"}
+        user_data = {"password": hash_password(user.password), "transactions": [], "recurring_transactions": [], "budget": {}, "budget_periods": {}, "savings_goal": 0.0, "savings": 0.0, "bills": []}
+        await save_user_data(user.username, user_data)
+        return {"message": "Sign up successful!"}
 
 @app.post("/login/")
 async def login(user: User):
-    if os.path.exists(file):
-        with open(file, "r") as f:
-            data = json.load(f)
-        
-        if user.username in data and data[user.username]["password"] == hash_password(user.password):
-            return {"message": f"Welcome back, {user.username}!"}
-        else:
-            raise HTTPException(status_code=400, detail="Invalid credentials!")
-    raise HTTPException(status_code=400, detail="User data not found!")
+    user_data = await load_user_data(user.username, ("password",))
+    if user_data and user_data["password"] == hash_password(user.password):
+        return {"message": f"Welcome back, {user.username}!"}
+    raise HTTPException(status_code=400, detail="Invalid credentials!")
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    # Readiness: the sentiment model is loaded
+    if not sentiment_loader.ready:
+        return JSONResponse(status_code=503, content={"status": "loading", "sentiment_model": sentiment_loader.status()})
+    return {"status": "ready", "sentiment_model": sentiment_loader.status(), "startup": startup_report.report()}
+
+@app.get("/metrics/")
+async def metrics():
+    return {
+        "user_cache": user_store.stats() if isinstance(user_store, CachingBackend) else None,
+        "group_commit": user_commits.stats(),
+        "recurring_scheduler": recurring_scheduler.stats() if recurring_scheduler_enabled else None,
+        "executors": {"io": io_pool.stats(), "cpu": cpu_pool.stats()},
+        "chart_cache": chart_cache.stats(),
+        "issuers": issuer_registry.stats(),
+        "market_data": market_store.stats(),
+        "stock_info_cache": stock_info_cache.stats(),
+        "sentiment_batcher": sentiment_batcher.stats(),
+        "sentiment_cache": sentiment_cache.stats(),
+        "ar_model_cache": ar_cache.stats(),
+        "prediction_requests": prediction_counter.stats(),
+        "precompute": precompute_scheduler.stats() if precompute_enabled else None,
+        "sentiment_model": sentiment_loader.status(),
+        "startup": startup_report.report(),
+    }
 
 @app.post("/logout/")
 async def logout():
@@ -174,37 +367,214 @@ async def logout():
 
 @app.post("/add_transaction/")
 async def add_transaction(user: str, transaction: Transaction):
-    user_data = load_user_data(user)
-    if not user_data:
+    async with user_locks(user):
+        if not await run_io(user_store.user_exists, user):
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        transaction_data = transaction.dict()
+        transaction_data["date"] = normalize_transaction_date(transaction_data["date"])
+
+        # Appends to the user's transaction log and updates the running totals
+        await append_user_transactions(user, [transaction_data])
+        return {"message": "Transaction added successfully!"}
+
+@app.post("/add_transactions/")
+async def add_transactions(user: str, transactions: List[Transaction]):
+    async with user_locks(user):
+        if not await run_io(user_store.user_exists, user):
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        batch = []
+        for transaction in transactions:
+            transaction_data = transaction.dict()
+            transaction_data["date"] = normalize_transaction_date(transaction_data["date"])
+            batch.append(transaction_data)
+
+        # One append (and one persistence write) for the whole list
+        if batch:
+            await append_user_transactions(user, batch)
+        return {"message": f"{len(batch)} transactions added successfully!"}
+
+# Imported rows are committed in batches of this size, one storage write each
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+def read_import_batch(user, rows, seen, report):
+    """
+    Parse up to IMPORT_BATCH_SIZE rows of an upload and return the ones not
+    imported before, or None once the upload is exhausted. Blocking: reads the
+    upload and the stored hashes.
+    """
+    batch = []
+    for line_number, row in rows:
+        report["rows_read"] += 1
+        try:
+            if isinstance(row, ImportRowError):
+                raise row
+            transaction_data = Transaction(**row).dict()
+        except (ImportRowError, ValidationError) as e:
+            report["rejected"] += 1
+            if len(report["errors"]) < 20:
+                report["errors"].append({"line": line_number, "error": str(e)})
+            continue
+
+        transaction_data["hash"] = transaction_hash(transaction_data)
+        if transaction_data["hash"] in seen:
+            report["duplicates"] += 1
+            continue
+        seen.add(transaction_data["hash"])
+
+        batch.append(transaction_data)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            break
+    if not batch:
+        return None
+
+    # Drop rows already imported earlier
+    existing = user_store.existing_hashes(user, [t["hash"] for t in batch])
+    new_rows = [t for t in batch if t["hash"] not in existing]
+    report["duplicates"] += len(batch) - len(new_rows)
+    return new_rows
+
+@app.post("/import_transactions/")
+async def import_transactions(
+    user: str,
+    file: UploadFile = File(...),
+    statement_format: Optional[str] = None,
+    default_category: str = DEFAULT_CATEGORY,
+    date_format: Optional[str] = None,
+):
+    statement_format = (statement_format or os.path.splitext(file.filename or "")[1].lstrip(".")).lower()
+    if statement_format not in ("csv", "ofx", "qfx"):
+        raise HTTPException(status_code=400, detail="Statement format must be csv or ofx")
+
+    # The upload is parsed as a stream, rows are never all held in memory
+    text_stream = TextIOWrapper(file.file, encoding="utf-8-sig", errors="replace", newline="")
+    if statement_format == "csv":
+        rows = iter_csv_transactions(text_stream, default_category, date_format)
+    else:
+        rows = iter_ofx_transactions(text_stream, default_category)
+
+    report = {"rows_read": 0, "imported": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    started = time.perf_counter()
+
+    async with user_locks(user):
+        if not await run_io(user_store.user_exists, user):
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        seen = set()
+        while True:
+            # Parsing and dedupe run in the I/O pool, only the append runs on the event loop
+            try:
+                batch = await run_io(read_import_batch, user, rows, seen, report)
+            except ImportRowError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if batch is None:
+                break
+            if batch:
+                await append_user_transactions(user, batch)
+                report["imported"] += len(batch)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows_read"] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+# Rows fetched per storage query while streaming NDJSON
+TRANSACTION_STREAM_PAGE_SIZE = 500
+
+def transaction_date_range(start_date, end_date):
+    # Inclusive "YYYY-MM-DD" bounds to the [from, to) range used by the storage index
+    try:
+        date_from = datetime.fromisoformat(start_date).strftime("%Y-%m-%d 00:00:00") if start_date else None
+        date_to = None
+        if end_date:
+            date_to = (datetime.fromisoformat(end_date) + timedelta(days=1)).strftime("%Y-%m-%d 00:00:00")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be formatted as YYYY-MM-DD")
+    return date_from, date_to
+
+@app.get("/transactions/")
+async def list_transactions(
+    user: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    stream: bool = False,
+):
+    if not await run_io(user_store.user_exists, user):
         raise HTTPException(status_code=400, detail="User not found or not logged in!")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
 
-    user_data["transactions"].append(transaction.dict())
-    user_data = update_savings(user_data)
-    save_user_data(user, user_data)
-    return {"message": "Transaction added successfully!"}
+    date_from, date_to = transaction_date_range(start_date, end_date)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if stream:
+        # NDJSON of every matching row from the cursor on, fetched one page at a time
+        async def generate():
+            key = after
+            while True:
+                page = await run_io(
+                    user_store.query_transactions, user, key, date_from, date_to, category, TRANSACTION_STREAM_PAGE_SIZE
+                )
+                if not page:
+                    break
+                yield "".join(json.dumps(t) + "\n" for t in page)
+                key = (page[-1]["date"], page[-1]["id"])
+                if len(page) < TRANSACTION_STREAM_PAGE_SIZE:
+                    break
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    page = await run_io(user_store.query_transactions, user, after, date_from, date_to, category, limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]["date"], page[-1]["id"])
+    return {"transactions": page, "next_cursor": next_cursor}
+
+# Profile fields the budget handlers read and save
+BUDGET_FIELDS = ("budget", "budget_periods")
 
 @app.post("/set_budget/")
 async def set_budget(user: str, budget: Budget):
-    user_data = load_user_data(user)
-    if not user_data:
-        raise HTTPException(status_code=400, detail="User not found or not logged in!")
+    async with user_locks(user):
+        user_data = await load_user_data(user, BUDGET_FIELDS)
+        if not user_data:
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        if budget.period not in BUDGET_PERIODS:
+            raise HTTPException(status_code=400, detail=f"Budget period must be one of {', '.join(BUDGET_PERIODS)}")
 
-    user_data["budget"][budget.category] = budget.amount
-    save_user_data(user, user_data)
-    return {"message": f"Budget for {budget.category} set to {budget.amount}"}
+        user_data["budget"][budget.category] = budget.amount
+        user_data.setdefault("budget_periods", {})[budget.category] = budget.period
+        await save_user_data(user, user_data)
+        return {"message": f"Budget for {budget.category} set to {budget.amount}"}
 
 @app.get("/check_budget/")
 async def check_budget(user: str):
-    user_data = load_user_data(user)
+    user_data = await load_user_data(user, BUDGET_FIELDS)
     if not user_data:
         raise HTTPException(status_code=400, detail="User not found or not logged in!")
     
+    # Each budget is compared against its current window from the category index
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    budget_periods = user_data.get("budget_periods", {})
+    windows = {category: period_key(budget_periods.get(category, "all"), now) for category in user_data["budget"]}
+    totals = await run_io(user_store.get_category_totals, user, set(windows.values()))
+
     budget_status = []
     for category, budget_amount in user_data["budget"].items():
-        spent = sum(t['amount'] for t in user_data['transactions'] if t['category'] == category)
+        spent = totals.get(category, {}).get(windows[category], 0.0)
         budget_status.append({
             "category": category,
             "budget": budget_amount,
+            "period": budget_periods.get(category, "all"),
             "spent": spent,
             "status": "Exceeded" if abs(spent) >= budget_amount else "On Track" if abs(spent) < budget_amount else "Close to Exceeding"
         })
@@ -213,182 +583,241 @@ async def check_budget(user: str):
 
 @app.post("/add_recurring_transaction/")
 async def add_recurring_transaction(user: str, recurring_transaction: RecurringTransaction):
-    user_data = load_user_data(user)
-    if not user_data:
-        raise HTTPException(status_code=400, detail="User not found or not logged in!")
-
-    next_date = datetime.now() + timedelta(days=recurring_transaction.interval_days)
-    user_data["recurring_transactions"].append({
-        'amount': recurring_transaction.amount, 
-        'description': recurring_transaction.description, 
-        'category': recurring_transaction.category, 
-        'next_date': next_date.strftime("%Y-%m-%d %H:%M:%S"), 
-        'interval_days': recurring_transaction.interval_days
-    })
-    save_user_data(user, user_data)
-    return {"message": "Recurring transaction added successfully!"}
+    async with user_locks(user):
+        user_data = await load_user_data(user, ("recurring_transactions",))
+        if not user_data:
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        if recurring_transaction.interval_days < 1:
+            raise HTTPException(status_code=400, detail="interval_days must be at least 1")
+
+        next_date = datetime.now() + timedelta(days=recurring_transaction.interval_days)
+        entry = {
+            'id': new_record_id(),
+            'amount': recurring_transaction.amount, 
+            'description': recurring_transaction.description, 
+            'category': recurring_transaction.category, 
+            'next_date': next_date.strftime("%Y-%m-%d %H:%M:%S"), 
+            'interval_days': recurring_transaction.interval_days
+        }
+        user_data["recurring_transactions"].append(entry)
+        await save_user_data(user, user_data)
+        if recurring_scheduler_enabled:
+            recurring_scheduler.schedule(user, entry)
+        return {"message": "Recurring transaction added successfully!"}
 
 @app.post("/set_savings_goal/")
 async def set_savings_goal(user: str, savings_goal: SavingsGoal):
-    user_data = load_user_data(user)
-    if not user_data:
-        raise HTTPException(status_code=400, detail="User not found or not logged in!")
-
-    user_data["savings_goal"] = savings_goal.goal
-    save_user_data(user, user_data)
-    return {"message": f"Savings goal set to {savings_goal.goal}"}
+    async with user_locks(user):
+        user_data = await load_user_data(user, ("savings_goal",))
+        if not user_data:
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        user_data["savings_goal"] = savings_goal.goal
+        await save_user_data(user, user_data)
+        return {"message": f"Savings goal set to {savings_goal.goal}"}
+
+# Rendered pie charts keyed by a hash of their inputs
+chart_cache = ChartCache(int(os.getenv("CHART_CACHE_MAX_ENTRIES", "256")))
+
+async def cached_pie_chart(labels, amounts, title, chart_format):
+    key = chart_key(labels, amounts, title, chart_format)
+    image = chart_cache.get(key)
+    if image is None:
+        image = await run_cpu(render_pie_chart, labels, amounts, title, chart_format)
+        chart_cache.put(key, image)
+    return base64.b64encode(image).decode()
+
+def analytics_month(value, name):
+    # Rollups are monthly, so ranges are month granular: "YYYY-MM" or "YYYY-MM-DD"
+    if value is None:
+        return None
+    try:
+        datetime.strptime(value[:7], "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, use YYYY-MM or YYYY-MM-DD")
+    return value[:7]
 
 @app.get("/view_analytics/")
-async def view_analytics(user: str):
-    user_data = load_user_data(user)
-    if not user_data:
+async def view_analytics(
+    user: str,
+    chart_format: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    """
+    Chart data (category totals, monthly savings) as JSON for client-side
+    rendering, served from the monthly rollups; pass chart_format=png or svg
+    to also get base64 pie images.
+    """
+    if chart_format is not None and chart_format not in CHART_FORMATS:
+        raise HTTPException(status_code=400, detail=f"chart_format must be one of {', '.join(CHART_FORMATS)}")
+    month_from = analytics_month(start_date, "start_date")
+    month_to = analytics_month(end_date, "end_date")
+
+    if not await run_io(user_store.user_exists, user):
         raise HTTPException(status_code=400, detail="User not found or not logged in!")
 
-    transactions_df = pd.DataFrame(user_data["transactions"])
-    if transactions_df.empty:
+    rollups = await run_io(user_store.get_rollups, user, month_from, month_to)
+    if not rollups:
         raise HTTPException(status_code=400, detail="No transactions found.")
 
-    income_df = transactions_df[transactions_df['amount'] > 0]
-    expenditure_df = transactions_df[transactions_df['amount'] < 0]
+    analytics = analytics_data(rollups)
 
-    analytics = {}
+    # Savings Progress (all time, whatever the range)
+    totals = await run_io(user_store.get_category_totals, user, ["all"])
+    analytics['savings_progress'] = max(0, sum(t["all"] for t in totals.values()))
 
     # Income and Expenditure by Category Pie Charts
-    if not income_df.empty:
-        income_summary = income_df.groupby('category')['amount'].sum().reset_index()
-        analytics['income_pie'] = generate_pie_chart(income_summary, "Income by Category")
-
-    if not expenditure_df.empty:
-        expenditure_summary = expenditure_df.groupby('category')['amount'].sum().reset_index()
-        analytics['expenditure_pie'] = generate_pie_chart(expenditure_summary, "Expenditure by Category")
-
-    # Savings Progress
-    update_savings(user_data)
-    analytics['savings_progress'] = user_data["savings"]
-
-    # Monthly Savings Over Time
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-    transactions_df['month'] = transactions_df['date'].dt.to_period('M')
-    monthly_savings = transactions_df.groupby('month')['amount'].sum().reset_index()
-    analytics['monthly_savings'] = monthly_savings
+    if chart_format:
+        analytics['chart_format'] = chart_format
+        income = analytics['income_by_category']
+        if income['labels']:
+            analytics['income_pie'] = await cached_pie_chart(income['labels'], income['values'], "Income by Category", chart_format)
+        expenditure = analytics['expenditure_by_category']
+        if expenditure['labels']:
+            # Pie wedges must be positive
+            amounts = [abs(v) for v in expenditure['values']]
+            analytics['expenditure_pie'] = await cached_pie_chart(expenditure['labels'], amounts, "Expenditure by Category", chart_format)
 
     return analytics
 
-def generate_pie_chart(data, title):
-    fig, ax = plt.subplots(figsize=(8, 8))
-    ax.pie(data['amount'], labels=data['category'], autopct='%1.1f%%', startangle=90, colors=sns.color_palette('coolwarm', len(data)))
-    ax.set_title(title)
-    img = BytesIO()
-    plt.savefig(img, format='png')
-    img.seek(0)
-    return img.getvalue()
-
 @app.post("/add_bill/")
 async def add_bill(user: str, bill: Bill):
-    user_data = load_user_data(user)
-    if not user_data:
-        raise HTTPException(status_code=400, detail="User not found or not logged in!")
-
-    user_data["bills"].append({
-        'title': bill.title, 
-        'amount': bill.amount, 
-        'due_date': bill.due_date, 
-        'status': "Paid" if bill.paid else "Pending", 
-        'date_added': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
-    save_user_data(user, user_data)
-    return {"message": "Bill added successfully!"}
+    async with user_locks(user):
+        user_data = await load_user_data(user, ("bills",))
+        if not user_data:
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+
+        bill_id = new_record_id()
+        user_data["bills"].append({
+            'id': bill_id,
+            'title': bill.title, 
+            'amount': bill.amount, 
+            'due_date': normalize_due_date(bill.due_date), 
+            'status': "Paid" if bill.paid else "Pending", 
+            'date_added': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        await save_user_data(user, user_data)
+        return {"message": "Bill added successfully!", "id": bill_id}
 
 @app.get("/view_bills/")
-async def view_bills(user: str):
-    user_data = load_user_data(user)
-    if not user_data:
+async def view_bills(user: str, limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0)):
+    if not await run_io(user_store.user_exists, user):
         raise HTTPException(status_code=400, detail="User not found or not logged in!")
 
-    return user_data["bills"]
+    # Sorted by due date from the bill index
+    return await run_io(user_store.query_bills, user, limit=limit, offset=offset)
 
-@app.post("/mark_bill_as_paid/")
-async def mark_bill_as_paid(user: str, bill_title: str):
-    user_data = load_user_data(user)
-    if not user_data:
+def bills_page(bills, limit, offset):
+    # `bills` holds up to limit + 1 rows, the extra one only tells whether there is a next page
+    return {
+        "bills": bills[:limit],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if len(bills) > limit else None,
+    }
+
+@app.get("/bills_due/")
+async def bills_due(
+    user: str, days: int = Query(7, ge=0), limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)
+):
+    if not await run_io(user_store.user_exists, user):
         raise HTTPException(status_code=400, detail="User not found or not logged in!")
 
-    for bill in user_data["bills"]:
-        if bill['title'] == bill_title:
-            bill['status'] = "Paid"
-            save_user_data(user, user_data)
-            return {"message": f"Bill '{bill_title}' marked as paid."}
-    raise HTTPException(status_code=404, detail="Bill not found!")
+    today = datetime.now().date()
+    bills = await run_io(
+        user_store.query_bills,
+        user,
+        due_from=today.isoformat(),
+        due_to=(today + timedelta(days=days)).isoformat(),
+        status="Pending",
+        limit=limit + 1,
+        offset=offset,
+    )
+    return bills_page(bills, limit, offset)
 
-def fetch_stocks():
-    try:
-        # Try to load from data directory first
-        import os
-        csv_path = os.path.join(os.path.dirname(__file__), "data", "equity_issuers.csv")
-        
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path)
-        else:
-            # If file doesn't exist, return a default list of popular Indian stocks
-            print(f"Warning: {csv_path} not found. Using default stock list.")
-            default_stocks = {
-                "RELIANCE": "Reliance Industries Ltd",
-                "TCS": "Tata Consultancy Services Ltd",
-                "HDFCBANK": "HDFC Bank Ltd",
-                "INFY": "Infosys Ltd",
-                "ICICIBANK": "ICICI Bank Ltd",
-                "HINDUNILVR": "Hindustan Unilever Ltd",
-                "SBIN": "State Bank of India",
-                "BHARTIARTL": "Bharti Airtel Ltd",
-                "ITC": "ITC Ltd",
-                "KOTAKBANK": "Kotak Mahindra Bank Ltd",
-                "LT": "Larsen & Toubro Ltd",
-                "AXISBANK": "Axis Bank Ltd",
-                "HCLTECH": "HCL Technologies Ltd",
-                "ASIANPAINT": "Asian Paints Ltd",
-                "MARUTI": "Maruti Suzuki India Ltd",
-                "TITAN": "Titan Company Ltd",
-                "SUNPHARMA": "Sun Pharmaceutical Industries Ltd",
-                "BAJFINANCE": "Bajaj Finance Ltd",
-                "WIPRO": "Wipro Ltd",
-                "NESTLEIND": "Nestle India Ltd"
-            }
-            return default_stocks
-        
-        # Filter the data
-        df = df[["Security Code", "Issuer Name"]]
+@app.get("/bills_overdue/")
+async def bills_overdue(user: str, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    if not await run_io(user_store.user_exists, user):
+        raise HTTPException(status_code=400, detail="User not found or not logged in!")
 
-        # Create a dictionary
-        stock_dict = dict(zip(df["Security Code"], df["Issuer Name"]))
+    yesterday = datetime.now().date() - timedelta(days=1)
+    bills = await run_io(user_store.query_bills, user, due_to=yesterday.isoformat(), status="Pending", limit=limit + 1, offset=offset)
+    return bills_page(bills, limit, offset)
 
-        # Return the dictionary
-        return stock_dict
-    except Exception as e:
-        print(f"Error loading stocks: {e}")
-        # Return default stocks if CSV loading fails
-        default_stocks = {
-            "RELIANCE": "Reliance Industries Ltd",
-            "TCS": "Tata Consultancy Services Ltd",
-            "HDFCBANK": "HDFC Bank Ltd",
-            "INFY": "Infosys Ltd",
-            "ICICIBANK": "ICICI Bank Ltd",
-            "HINDUNILVR": "Hindustan Unilever Ltd",
-            "SBIN": "State Bank of India",
-            "BHARTIARTL": "Bharti Airtel Ltd",
-            "ITC": "ITC Ltd",
-            "KOTAKBANK": "Kotak Mahindra Bank Ltd",
-            "LT": "Larsen & Toubro Ltd",
-            "AXISBANK": "Axis Bank Ltd",
-            "HCLTECH": "HCL Technologies Ltd",
-            "ASIANPAINT": "Asian Paints Ltd",
-            "MARUTI": "Maruti Suzuki India Ltd",
-            "TITAN": "Titan Company Ltd",
-            "SUNPHARMA": "Sun Pharmaceutical Industries Ltd",
-            "BAJFINANCE": "Bajaj Finance Ltd",
-            "WIPRO": "Wipro Ltd",
-            "NESTLEIND": "Nestle India Ltd"
-        }
-        return default_stocks
+@app.post("/mark_bill_as_paid/")
+async def mark_bill_as_paid(user: str, bill_title: Optional[str] = None, bill_id: Optional[str] = None):
+    async with user_locks(user):
+        if not await run_io(user_store.user_exists, user):
+            raise HTTPException(status_code=400, detail="User not found or not logged in!")
+        if not bill_id and not bill_title:
+            raise HTTPException(status_code=400, detail="Provide bill_id or bill_title!")
+
+        # Direct lookup by id (or through the title index)
+        if not bill_id:
+            bill_id = await run_io(user_store.find_bill_id, user, bill_title)
+        if bill_id and await run_io(user_store.update_bill_status, user, bill_id, "Paid"):
+            return {"message": f"Bill '{bill_title or bill_id}' marked as paid."}
+        raise HTTPException(status_code=404, detail="Bill not found!")
+
+# Issuer list, loaded once and re-read when the CSV changes
+issuer_registry = IssuerRegistry(
+    os.path.join(os.path.dirname(__file__), "data", "equity_issuers.csv"),
+    cache_path=os.getenv("ISSUER_CACHE_PATH") or None,
+)
+
+def resolve_stock_ticker(stock, stock_exchange):
+    """Return (issuer, yfinance ticker) for an Issuer Name, Security Code, Security Id or ISIN."""
+    issuer = issuer_registry.index().lookup(stock)
+    if issuer is None:
+        raise HTTPException(status_code=400, detail="Invalid stock selected")
+    return issuer, yfinance_ticker(issuer, stock_exchange)
+
+@app.get("/search_stocks/")
+async def search_stocks(q: str, limit: int = 10):
+    """Stock picker search over issuer names and symbols (prefix and one-typo matches)."""
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    return {"results": issuer_registry.index().search(q, limit)}
+
+@app.get("/stocks/")
+async def list_stocks(
+    sector: Optional[str] = None,
+    industry: Optional[str] = None,
+    industry_group: Optional[str] = None,
+    group: Optional[str] = None,
+    status: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 50,
+):
+    """Issuers with their sector/industry/status, filtered and paged."""
+    if not 1 <= limit <= 500 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500 and offset >= 0")
+    total, stocks = issuer_registry.index().filter(
+        offset, limit, sector=sector, industry=industry, industry_group=industry_group, group=group, status=status
+    )
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "stocks": stocks,
+    }
+
+@app.get("/stocks/facets/")
+async def stock_facets(
+    sector: Optional[str] = None,
+    industry: Optional[str] = None,
+    industry_group: Optional[str] = None,
+    group: Optional[str] = None,
+    status: Optional[str] = None,
+):
+    """Issuer counts per sector, industry, industry group, group and status for the filtered issuers."""
+    total, facets = issuer_registry.index().facets(
+        sector=sector, industry=industry, industry_group=industry_group, group=group, status=status
+    )
+    return {"total": total, "facets": facets}
 
 
 # Create function to fetch periods and intervals
@@ -414,6 +843,8 @@ def fetch_periods_intervals():
 # Function to fetch the stock info
 def fetch_stock_info(stock_ticker):
     # Pull the data for the first security
+    import yfinance as yf
+
     stock_data = yf.Ticker(stock_ticker)
 
     # Extract full of the stock
@@ -505,21 +936,27 @@ class StockRequest(BaseModel):
     stock: str
     stock_exchange: str
 
+# fetch_stock_info results per ticker; concurrent misses share one upstream call
+stock_info_cache = SingleFlightCache(
+    lambda stock_ticker: run_io(fetch_stock_info, stock_ticker),
+    ttl=float(os.getenv("STOCK_INFO_TTL_SECONDS", "60")),
+    stale_seconds=float(os.getenv("STOCK_INFO_STALE_SECONDS", "300")),
+    closed_ttl=float(os.getenv("STOCK_INFO_CLOSED_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("STOCK_INFO_CACHE_MAX_ENTRIES", "1000")),
+    is_open=market_is_open,
+)
+
 # Endpoint to get stock data based on user input
 @app.post("/get_stock_info", response_model=dict)
 async def get_stock_info(request: StockRequest):
-    stock_dict = fetch_stocks()
-    
-    # Check if the stock exists in the available list
-    if request.stock not in stock_dict:
-        raise HTTPException(status_code=400, detail="Invalid stock selected")
-    
-    # Build the stock ticker based on the exchange selected
-    stock_ticker = f"{stock_dict[request.stock]}.{'BO' if request.stock_exchange == 'BSE' else 'NS'}"
+    # Check the stock exists and build its ticker for the exchange selected
+    _, stock_ticker = resolve_stock_ticker(request.stock, request.stock_exchange)
     
     # Fetch the stock info from the API
     try:
-        stock_data_info = fetch_stock_info(stock_ticker)
+        stock_data_info = await stock_info_cache.get(stock_ticker)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stock data: {str(e)}")
     
@@ -585,33 +1022,111 @@ async def get_stock_info(request: StockRequest):
     
     return response
 
-def fetch_stock_history(stock_ticker, period, interval):
-    # Pull the data for the first security
-    stock_data = yf.Ticker(stock_ticker)
+# Local OHLC store; only bars newer than the last stored one are downloaded
+market_store = OhlcStore(
+    os.getenv("MARKET_DATA_DIR", "market_data"),
+    get_provider(os.getenv("MARKET_DATA_PROVIDER", "yfinance"), os.getenv("MARKET_DATA_FIXTURES")),
+    refresh_seconds=float(os.getenv("MARKET_DATA_REFRESH_SECONDS", "300")),
+)
 
+def fetch_stock_history(stock_ticker, period, interval):
     # Extract full of the stock
-    stock_data_history = stock_data.history(period=period, interval=interval)[
-        ["Open", "High", "Low", "Close"]
-    ]
-
-    # Return the stock data
-    return stock_data_history
-
-def fetch_stock_news(stock_ticker, stock_name, max_articles=10):
+    return market_store.history(stock_ticker, interval, period)[["Open", "High", "Low", "Close"]]
+
+# Fitted AR states per ticker, reused until a new daily bar arrives
+AR_LAGS = 250
+AR_BACKEND = os.getenv("AR_BACKEND", "normal")
+ar_cache = ArModelCache(
+    max_entries=int(os.getenv("AR_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("AR_CACHE_MAX_MB", "64")) * 1024 * 1024,
+)
+
+# Sentiment scaling with time decay, and the first-day and daily move limits
+forecast_adjustment = AdjustmentParams(
+    sentiment_scale=float(os.getenv("FORECAST_SENTIMENT_SCALE", "0.015")),
+    decay_days=float(os.getenv("FORECAST_DECAY_DAYS", "90")),
+    min_decay=float(os.getenv("FORECAST_MIN_DECAY", "0.3")),
+    first_day_limit=float(os.getenv("FORECAST_FIRST_DAY_LIMIT", "0.01")),
+    daily_limit=float(os.getenv("FORECAST_DAILY_LIMIT", "0.05")),
+)
+
+# Predictions of the most requested tickers, precomputed after the close (or on
+# PRECOMPUTE_CRON) and served while younger than PRECOMPUTE_MAX_AGE_SECONDS
+PREDICTION_CONFIG = json.dumps(
+    {"lags": AR_LAGS, "backend": AR_BACKEND, "horizon": 90, "adjustment": vars(forecast_adjustment), "sentiment": model_size},
+    sort_keys=True,
+)
+PRECOMPUTE_MAX_AGE_SECONDS = float(os.getenv("PRECOMPUTE_MAX_AGE_SECONDS", "64800"))
+prediction_store = PredictionStore(
+    os.getenv("PREDICTION_STORE_PATH", "predictions.db"),
+    keep_versions=int(os.getenv("PRECOMPUTE_KEEP_VERSIONS", "3")),
+)
+prediction_counter = RequestCounter(prediction_store, float(os.getenv("PRECOMPUTE_COUNT_FLUSH_SECONDS", "60")))
+# Off by default: every worker it is enabled on runs the whole precompute
+precompute_enabled = os.getenv("PRECOMPUTE_ENABLED", "0") == "1"
+
+async def precompute_predictions(entries):
+    """Yield (ticker, encode_prediction record or exception) for [(ticker, name)] as each finishes."""
+    tickers = [ticker for ticker, _ in entries]
+    histories = await run_io(market_store.history_many, tickers, "1d", "2y") if tickers else {}
+
+    async def predict(ticker, name):
+        try:
+            history = histories[ticker]
+            if isinstance(history, Exception):
+                return ticker, history
+            return ticker, encode_prediction(await predict_from_history(ticker, name, history))
+        except Exception as e:
+            return ticker, e
+
+    tasks = [asyncio.create_task(predict(ticker, name)) for ticker, name in entries]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+precompute_scheduler = PrecomputeScheduler(
+    prediction_store,
+    prediction_counter,
+    precompute_predictions,
+    PREDICTION_CONFIG,
+    CronSchedule(os.getenv("PRECOMPUTE_CRON") or after_close_cron(int(os.getenv("PRECOMPUTE_AFTER_CLOSE_MINUTES", "15")))),
+    top_n=int(os.getenv("PRECOMPUTE_TOP_N", "50")),
+    decay=float(os.getenv("PRECOMPUTE_DECAY", "0.5")),
+    # Without the model every result would carry a neutral sentiment
+    ready=lambda: sentiment_loader.ready,
+)
+
+def load_precomputed(stock_ticker):
+    """The stored generate_stock_prediction tuple for `stock_ticker` if fresh, else None."""
+    precomputed = prediction_store.get(stock_ticker, PREDICTION_CONFIG, PRECOMPUTE_MAX_AGE_SECONDS)
+    return decode_prediction(precomputed[0]) if precomputed is not None else None
+
+def fetch_daily_history(stock_ticker):
+    return market_store.history(stock_ticker, "1d", "2y")
+
+def fetch_news_items(stock_ticker, max_articles):
+    import yfinance as yf
+
+    # Use yfinance to get news
+    return yf.Ticker(stock_ticker).news[:max_articles]
+
+async def fetch_stock_news(stock_ticker, stock_name, max_articles=10):
     """
     Fetch recent financial news articles for a stock and analyze sentiment.
     Returns average sentiment score (-1 to 1, where -1 is negative, 0 is neutral, 1 is positive)
     """
     try:
-        # Use yfinance to get news
-        stock = yf.Ticker(stock_ticker)
-        news_list = stock.news[:max_articles]  # Get recent news
+        news_list = await run_io(fetch_news_items, stock_ticker, max_articles)  # Get recent news
         
         if not news_list:
             return 0.0, []  # Neutral sentiment if no news
         
         sentiments = []
         news_with_sentiment = []
+        articles = []
         
         for news_item in news_list:
             # Handle both old and new yfinance news formats
@@ -628,97 +1143,104 @@ def fetch_stock_news(stock_ticker, stock_name, max_articles=10):
             text_to_analyze = f"{title} {summary}".strip()
             
             if text_to_analyze:
-                try:
-                    # Analyze sentiment using pyfin-sentiment model
-                    sentiment_result = sentiment_model.predict([text_to_analyze])[0]
-                    
-                    # Convert sentiment to numeric score
-                    # pyfin-sentiment returns numpy array with string labels: '1' (positive), '-1' (negative), '0' (neutral)
+                articles.append((news_item, title, text_to_analyze))
+        
+        # Analyze sentiment of all articles in one batched pyfin-sentiment call
+        try:
+            predictions = await cached_sentiment.predict([text for _, _, text in articles])
+        except ModelNotReadyError as e:
+            # Like analyze_sentiment: without the model the score would look neutral
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        for (news_item, title, text_to_analyze), sentiment_result in zip(articles, predictions):
+            try:
+                # Convert sentiment to numeric score
+                # pyfin-sentiment returns numpy array with string labels: '1' (positive), '-1' (negative), '0' (neutral)
+                sentiment_score = 0.0
+                sentiment_label = 'neutral'
+                
+                # Convert result to string for processing
+                sentiment_str = str(sentiment_result).strip()
+                
+                # pyfin-sentiment mapping: '1' = positive, '3' = negative, '0' or '2' = neutral
+                if sentiment_str == '1' or sentiment_str == '1.0':
+                    # Positive sentiment
+                    sentiment_score = 0.5
+                    sentiment_label = 'positive'
+                elif sentiment_str == '3' or sentiment_str == '3.0' or sentiment_str == '-1' or sentiment_str == '-1.0':
+                    # Negative sentiment
+                    sentiment_score = -0.5
+                    sentiment_label = 'negative'
+                elif sentiment_str == '0' or sentiment_str == '0.0' or sentiment_str == '2' or sentiment_str == '2.0':
+                    # Neutral sentiment
                     sentiment_score = 0.0
                     sentiment_label = 'neutral'
-                    
-                    # Convert result to string for processing
-                    sentiment_str = str(sentiment_result).strip()
-                    
-                    # pyfin-sentiment mapping: '1' = positive, '3' = negative, '0' or '2' = neutral
-                    if sentiment_str == '1' or sentiment_str == '1.0':
-                        # Positive sentiment
+                elif isinstance(sentiment_result, dict):
+                    # If it's a dict, extract score and label
+                    sentiment_label = sentiment_result.get('label', 'neutral').lower()
+                    score_val = sentiment_result.get('score', 0.0)
+                    sentiment_score = float(score_val) if score_val is not None else 0.0
+                elif isinstance(sentiment_result, str):
+                    # If it's a string label, map to numeric score
+                    sentiment_label = sentiment_result.lower()
+                    if 'positive' in sentiment_label or 'bullish' in sentiment_label or sentiment_label == '1':
                         sentiment_score = 0.5
                         sentiment_label = 'positive'
-                    elif sentiment_str == '3' or sentiment_str == '3.0' or sentiment_str == '-1' or sentiment_str == '-1.0':
-                        # Negative sentiment
+                    elif 'negative' in sentiment_label or 'bearish' in sentiment_label or sentiment_label == '-1':
                         sentiment_score = -0.5
                         sentiment_label = 'negative'
-                    elif sentiment_str == '0' or sentiment_str == '0.0' or sentiment_str == '2' or sentiment_str == '2.0':
-                        # Neutral sentiment
+                    else:
                         sentiment_score = 0.0
                         sentiment_label = 'neutral'
-                    elif isinstance(sentiment_result, dict):
-                        # If it's a dict, extract score and label
-                        sentiment_label = sentiment_result.get('label', 'neutral').lower()
-                        score_val = sentiment_result.get('score', 0.0)
-                        sentiment_score = float(score_val) if score_val is not None else 0.0
-                    elif isinstance(sentiment_result, str):
-                        # If it's a string label, map to numeric score
-                        sentiment_label = sentiment_result.lower()
-                        if 'positive' in sentiment_label or 'bullish' in sentiment_label or sentiment_label == '1':
-                            sentiment_score = 0.5
-                            sentiment_label = 'positive'
-                        elif 'negative' in sentiment_label or 'bearish' in sentiment_label or sentiment_label == '-1':
-                            sentiment_score = -0.5
-                            sentiment_label = 'negative'
-                        else:
-                            sentiment_score = 0.0
-                            sentiment_label = 'neutral'
-                    elif isinstance(sentiment_result, (int, float)):
-                        # If it's a numeric value directly
-                        sentiment_score = float(sentiment_result)
-                        sentiment_score = max(-1.0, min(1.0, sentiment_score))  # Clamp to [-1, 1]
-                        sentiment_label = 'positive' if sentiment_score > 0.1 else ('negative' if sentiment_score < -0.1 else 'neutral')
-                    else:
-                        # Fallback: Use keyword-based sentiment analysis
-                        text_lower = text_to_analyze.lower()
-                        positive_words = ['surge', 'rise', 'gain', 'profit', 'growth', 'strong', 'up', 'bullish', 'positive', 'beat', 'outperform', 'increase', 'higher', 'success', 'exceed', 'soar', 'jump', 'rally']
-                        negative_words = ['fall', 'drop', 'decline', 'loss', 'weak', 'down', 'bearish', 'negative', 'miss', 'underperform', 'crash', 'decrease', 'lower', 'fail', 'plunge', 'sink', 'tumble']
-                        
-                        pos_count = sum(1 for word in positive_words if word in text_lower)
-                        neg_count = sum(1 for word in negative_words if word in text_lower)
-                        
-                        if pos_count > neg_count:
-                            sentiment_score = 0.4
-                            sentiment_label = 'positive'
-                        elif neg_count > pos_count:
-                            sentiment_score = -0.4
-                            sentiment_label = 'negative'
-                        else:
-                            sentiment_score = 0.0
-                            sentiment_label = 'neutral'
+                elif isinstance(sentiment_result, (int, float)):
+                    # If it's a numeric value directly
+                    sentiment_score = float(sentiment_result)
+                    sentiment_score = max(-1.0, min(1.0, sentiment_score))  # Clamp to [-1, 1]
+                    sentiment_label = 'positive' if sentiment_score > 0.1 else ('negative' if sentiment_score < -0.1 else 'neutral')
+                else:
+                    # Fallback: Use keyword-based sentiment analysis
+                    text_lower = text_to_analyze.lower()
+                    positive_words = ['surge', 'rise', 'gain', 'profit', 'growth', 'strong', 'up', 'bullish', 'positive', 'beat', 'outperform', 'increase', 'higher', 'success', 'exceed', 'soar', 'jump', 'rally']
+                    negative_words = ['fall', 'drop', 'decline', 'loss', 'weak', 'down', 'bearish', 'negative', 'miss', 'underperform', 'crash', 'decrease', 'lower', 'fail', 'plunge', 'sink', 'tumble']
                     
-                    # Ensure sentiment score is in valid range
-                    sentiment_score = max(-1.0, min(1.0, sentiment_score))
+                    pos_count = sum(1 for word in positive_words if word in text_lower)
+                    neg_count = sum(1 for word in negative_words if word in text_lower)
                     
-                    # Get link - check both new and old formats
-                    link = ''
-                    if 'canonicalUrl' in news_item and isinstance(news_item['canonicalUrl'], dict):
-                        link = news_item['canonicalUrl'].get('url', '')
-                    elif 'clickThroughUrl' in news_item and isinstance(news_item['clickThroughUrl'], dict):
-                        link = news_item['clickThroughUrl'].get('url', '')
+                    if pos_count > neg_count:
+                        sentiment_score = 0.4
+                        sentiment_label = 'positive'
+                    elif neg_count > pos_count:
+                        sentiment_score = -0.4
+                        sentiment_label = 'negative'
                     else:
-                        link = news_item.get('link', '') or news_item.get('url', '')
-                    
-                    sentiments.append(sentiment_score)
-                    news_with_sentiment.append({
-                        'title': title,
-                        'link': link,
-                        'sentiment_score': round(sentiment_score, 3),
-                        'sentiment_label': sentiment_label
-                    })
-                except Exception as e:
-                    print(f"Error analyzing sentiment for news: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # Continue with next article
-                    continue
+                        sentiment_score = 0.0
+                        sentiment_label = 'neutral'
+                
+                # Ensure sentiment score is in valid range
+                sentiment_score = max(-1.0, min(1.0, sentiment_score))
+                
+                # Get link - check both new and old formats
+                link = ''
+                if 'canonicalUrl' in news_item and isinstance(news_item['canonicalUrl'], dict):
+                    link = news_item['canonicalUrl'].get('url', '')
+                elif 'clickThroughUrl' in news_item and isinstance(news_item['clickThroughUrl'], dict):
+                    link = news_item['clickThroughUrl'].get('url', '')
+                else:
+                    link = news_item.get('link', '') or news_item.get('url', '')
+                
+                sentiments.append(sentiment_score)
+                news_with_sentiment.append({
+                    'title': title,
+                    'link': link,
+                    'sentiment_score': round(sentiment_score, 3),
+                    'sentiment_label': sentiment_label
+                })
+            except Exception as e:
+                print(f"Error analyzing sentiment for news: {e}")
+                import traceback
+                traceback.print_exc()
+                # Continue with next article
+                continue
         
         # Calculate average sentiment
         avg_sentiment = float(np.mean(sentiments)) if sentiments else 0.0
@@ -726,6 +1248,8 @@ def fetch_stock_news(stock_ticker, stock_name, max_articles=10):
         
         return avg_sentiment, news_with_sentiment
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching news: {e}")
         import traceback
@@ -742,136 +1266,110 @@ def apply_sentiment_adjustment(base_forecast, sentiment_score, volatility_factor
     adjusted_forecast = base_forecast * (1 + adjustment_factor)
     return adjusted_forecast
 
-def generate_stock_prediction(stock_ticker, stock_name=None):
+async def generate_stock_prediction(stock_ticker, stock_name=None):
     # Try to generate the predictions
     try:
-        # Pull the data for the first security
-        stock_data = yf.Ticker(stock_ticker)
+        # Extract the data for last 2yr with 1d interval
+        stock_data_hist = await run_io(fetch_daily_history, stock_ticker)
+        return await predict_from_history(stock_ticker, stock_name, stock_data_hist)
 
-        # Extract the data for last 1yr with 1d interval
-        stock_data_hist = stock_data.history(period="2y", interval="1d")
-
-        # Clean the data for to keep only the required columns
-        stock_data_close = stock_data_hist[["Close"]]
-
-        # Change frequency to day
-        stock_data_close = stock_data_close.asfreq("D", method="ffill")
+    # If error occurs
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in generate_stock_prediction: {e}")
+        return None, None, None, None, None, None
 
-        # Fill missing values
-        stock_data_close = stock_data_close.ffill()
+async def predict_from_history(stock_ticker, stock_name, stock_data_hist):
+    """Fit, forecast and sentiment-adjust 2y of daily bars; returns the generate_stock_prediction tuple."""
+    # Clean the data for to keep only the required columns
+    stock_data_close = stock_data_hist[["Close"]]
 
-        # Define training and testing area
-        train_df = stock_data_close.iloc[: int(len(stock_data_close) * 0.9) + 1]  # 90%
-        test_df = stock_data_close.iloc[int(len(stock_data_close) * 0.9) :]  # 10%
+    # Change frequency to day
+    stock_data_close = stock_data_close.asfreq("D", method="ffill")
 
-        # Define training model
-        ar_model = AutoReg(train_df["Close"], 250).fit(cov_type="HC0")
+    # Fill missing values
+    stock_data_close = stock_data_close.ffill()
 
-        # Predict data for test data
-        predictions = ar_model.predict(
-            start=test_df.index[0], end=test_df.index[-1], dynamic=True
-        )
+    # Fit the AR model in the process pool and predict 90 days into the future,
+    # reusing or carrying forward the last fit for this ticker
+    last_bar = stock_data_close.index[-1].isoformat()
+    started = time.perf_counter()
+    train_df, test_df, base_forecast, predictions, ar_state, ar_mode = await run_cpu(
+        fit_ar_forecast, stock_data_close, AR_LAGS, 90, ar_cache.state_for(stock_ticker, AR_LAGS, last_bar), AR_BACKEND
+    )
+    ar_cache.record(stock_ticker, AR_LAGS, last_bar, ar_state, ar_mode, time.perf_counter() - started)
+    
+    # Fetch news and analyze sentiment
+    if stock_name:
+        sentiment_score, news_articles = await fetch_stock_news(stock_ticker, stock_name)
+    else:
+        sentiment_score = 0.0
+        news_articles = []
+    
+    # Apply sentiment adjustment and volatility clamps to the days after the test period
+    test_end_date = test_df.index[-1]
+    last_historical_price = test_df["Close"].iloc[-1]
+    adjusted_forecast = adjust_forecast_series(
+        base_forecast, test_end_date, sentiment_score, last_historical_price, forecast_adjustment
+    )
 
-        # Predict 90 days into the future (base forecast)
-        base_forecast = ar_model.predict(
-            start=test_df.index[0],
-            end=test_df.index[-1] + dt.timedelta(days=90),
-            dynamic=True,
-        )
-        
-        # Fetch news and analyze sentiment
-        if stock_name:
-            sentiment_score, news_articles = fetch_stock_news(stock_ticker, stock_name)
-        else:
-            sentiment_score = 0.0
-            news_articles = []
-        
-        # Apply sentiment adjustment to forecast
-        # Only adjust future predictions (after test period ends)
-        test_end_date = test_df.index[-1]
-        
-        # Find indices where forecast dates are after test period
-        adjusted_forecast = base_forecast.copy()
-        forecast_dates = adjusted_forecast.index
-        
-        # Get the last historical price for volatility constraints
-        last_historical_price = test_df["Close"].iloc[-1]
-        
-        # Track if this is the first forecast day to apply stricter constraints
-        first_forecast_index = None
-        
-        for i, date in enumerate(forecast_dates):
-            # Only adjust future dates (strictly after test period)
-            if date > test_end_date:
-                # Check if this is the first forecast day
-                if first_forecast_index is None:
-                    first_forecast_index = i
-                
-                # Calculate days ahead into the future
-                days_ahead = (date - test_end_date).days
-                
-                # Apply sentiment with time decay (diminishing effect over 90 days)
-                time_decay = max(0.3, 1.0 - (days_ahead / 90.0))  # Decay from 1.0 to 0.3
-                adjusted_sentiment = sentiment_score * time_decay
-                
-                # Apply sentiment adjustment (max 1.5% per day, with diminishing effect)
-                adjustment_factor = adjusted_sentiment * 0.015  # 1.5% max adjustment
-                raw_forecast = base_forecast.iloc[i] * (1 + adjustment_factor)
-                
-                # Apply volatility constraints to make predictions realistic
-                # Maximum daily change: 3% for first day, 5% for subsequent days
-                if i == first_forecast_index:
-                    # For first forecast day, limit change from last historical price (more conservative)
-                    max_first_day_change = last_historical_price * 0.01  # 1% max first day change
-                    min_first_day_change = last_historical_price * -0.01  # -1% max first day drop
-                    
-                    if raw_forecast > last_historical_price + max_first_day_change:
-                        raw_forecast = last_historical_price + max_first_day_change
-                    elif raw_forecast < last_historical_price + min_first_day_change:
-                        raw_forecast = last_historical_price + min_first_day_change
-                else:
-                    # For subsequent days, limit change from previous forecast day
-                    previous_forecast = adjusted_forecast.iloc[i-1]
-                    max_change = previous_forecast * 0.05  # 5% max daily change
-                    min_change = previous_forecast * -0.05  # -5% max daily drop
-                    
-                    # Clamp the forecast to within daily volatility limits
-                    if raw_forecast > previous_forecast + max_change:
-                        raw_forecast = previous_forecast + max_change
-                    elif raw_forecast < previous_forecast + min_change:
-                        raw_forecast = previous_forecast + min_change
-                
-                adjusted_forecast.iloc[i] = raw_forecast
+    # Return the required data with sentiment info
+    return train_df, test_df, adjusted_forecast, predictions, sentiment_score, news_articles
 
-        # Return the required data with sentiment info
-        return train_df, test_df, adjusted_forecast, predictions, sentiment_score, news_articles
+def sentiment_section(sentiment_score, news_articles):
+    return {
+        "overall_sentiment_score": float(sentiment_score) if sentiment_score is not None else 0.0,
+        "sentiment_label": "positive" if (sentiment_score and sentiment_score > 0.1) else ("negative" if (sentiment_score and sentiment_score < -0.1) else "neutral"),
+        "news_count": len(news_articles) if news_articles else 0,
+        "recent_news": news_articles[:5] if news_articles else []  # Top 5 news items
+    }
 
-    # If error occurs
-    except Exception as e:
-        print(f"Error in generate_stock_prediction: {e}")
-        return None, None, None, None, None, None
+def prediction_sections(train_df, test_df, forecast, predictions, sentiment_score, news_articles, compact=False):
+    """The stock_prediction and sentiment_analysis parts of a prediction response."""
+    if compact:
+        return compact_prediction(train_df, test_df, forecast, predictions, sentiment_section(sentiment_score, news_articles))
+    return {
+        "stock_prediction": {
+            "train_dates": train_df.index.tolist(),
+            "train_close": train_df["Close"].tolist(),
+            "test_dates": test_df.index.tolist(),
+            "test_close": test_df["Close"].tolist(),
+            "forecast_dates": forecast.index.tolist(),
+            "forecast": forecast.tolist(),
+            "test_predictions_dates": test_df.index.tolist(),
+            "test_predictions": predictions.tolist(),
+        },
+        "sentiment_analysis": sentiment_section(sentiment_score, news_articles),
+    }
 
 class StockRequest(BaseModel):
     stock: str
     stock_exchange: str
     period: str
     interval: str
+    # Dates as descriptors, float32 values, no duplicated arrays (see serialization.py)
+    compact: bool = False
+
+# Compact responses at least this large are gzipped for clients that accept it
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
 
 # Endpoint to get stock data and predictions
 @app.post("/get_stock_prediction", response_model=dict)
-async def get_stock_prediction(request: StockRequest):
-    stock_dict = fetch_stocks()
-    
-    # Check if the stock exists in the available list
-    if request.stock not in stock_dict:
-        raise HTTPException(status_code=400, detail="Invalid stock selected")
-    
-    # Build the stock ticker based on the exchange selected
-    stock_ticker = f"{stock_dict[request.stock]}.{'BO' if request.stock_exchange == 'BSE' else 'NS'}"
+async def get_stock_prediction(
+    request: StockRequest,
+    http_response: Response,
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    # Check the stock exists and build its ticker for the exchange selected
+    issuer, stock_ticker = resolve_stock_ticker(request.stock, request.stock_exchange)
     
     # Fetch stock data (historical)
     try:
-        stock_data = fetch_stock_history(stock_ticker, request.period, request.interval)
+        stock_data = await run_io(fetch_stock_history, stock_ticker, request.period, request.interval)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stock data: {str(e)}")
     
@@ -879,16 +1377,33 @@ async def get_stock_prediction(request: StockRequest):
         raise HTTPException(status_code=404, detail="No data found for the selected stock")
     
     # Get stock name for news fetching
-    stock_info = yf.Ticker(stock_ticker)
-    stock_name = stock_info.info.get('longName', request.stock)
+    stock_name = issuer["name"]
     
-    # Fetch stock prediction (train, test, forecast, predictions) with sentiment
-    train_df, test_df, forecast, predictions, sentiment_score, news_articles = generate_stock_prediction(stock_ticker, stock_name)
+    # Fetch stock prediction (train, test, forecast, predictions) with sentiment,
+    # precomputed for popular tickers when a fresh result exists
+    prediction_counter.record(stock_ticker, stock_name)
+    precomputed = await run_io(load_precomputed, stock_ticker)
+    if precomputed is not None:
+        prediction_counter.served["precomputed"] += 1
+        train_df, test_df, forecast, predictions, sentiment_score, news_articles = precomputed
+    else:
+        prediction_counter.served["on_demand"] += 1
+        train_df, test_df, forecast, predictions, sentiment_score, news_articles = await generate_stock_prediction(stock_ticker, stock_name)
 
     # Check if predictions are valid
     if train_df is None or (forecast is None) or (predictions is None):
         raise HTTPException(status_code=500, detail="Error generating stock predictions")
 
+    # Compact mode, also chosen by asking for msgpack
+    if request.compact or wants_msgpack(accept):
+        payload = compact_prediction(
+            train_df, test_df, forecast, predictions, sentiment_section(sentiment_score, news_articles), stock_data
+        )
+        try:
+            return render(payload, accept, accept_encoding, RESPONSE_GZIP_MIN_BYTES)
+        except ValueError as e:
+            raise HTTPException(status_code=406, detail=str(e), headers={"Vary": VARY})
+
     # Prepare the response structure
     response = {
         "historical_data": {
@@ -898,33 +1413,84 @@ async def get_stock_prediction(request: StockRequest):
             "low": stock_data["Low"].tolist(),
             "close": stock_data["Close"].tolist(),
         },
-        "stock_prediction": {
-            "train_dates": train_df.index.tolist(),
-            "train_close": train_df["Close"].tolist(),
-            "test_dates": test_df.index.tolist(),
-            "test_close": test_df["Close"].tolist(),
-            "forecast_dates": forecast.index.tolist(),
-            "forecast": forecast.tolist(),
-            "test_predictions_dates": test_df.index.tolist(),
-            "test_predictions": predictions.tolist(),
-        },
-        "sentiment_analysis": {
-            "overall_sentiment_score": float(sentiment_score) if sentiment_score is not None else 0.0,
-            "sentiment_label": "positive" if (sentiment_score and sentiment_score > 0.1) else ("negative" if (sentiment_score and sentiment_score < -0.1) else "neutral"),
-            "news_count": len(news_articles) if news_articles else 0,
-            "recent_news": news_articles[:5] if news_articles else []  # Top 5 news items
-        }
+        **prediction_sections(train_df, test_df, forecast, predictions, sentiment_score, news_articles),
     }
 
+    # The Accept header chose this encoding too (msgpack would be compact)
+    http_response.headers["Vary"] = VARY
+    return response
 
+class WatchlistRequest(BaseModel):
+    stocks: List[str]
+    stock_exchange: str
+    compact: bool = False
 
-    
-    return response
+# Most stocks accepted by one /predict_watchlist/ call
+WATCHLIST_MAX_STOCKS = int(os.getenv("WATCHLIST_MAX_STOCKS", "50"))
+
+@app.post("/predict_watchlist/")
+async def predict_watchlist(request: WatchlistRequest):
+    """
+    Predictions for several stocks, streamed as NDJSON in the order they
+    finish. Histories are refreshed with one bulk download and the fits run
+    in parallel in the process pool; a stock that fails gets an "error" line.
+    """
+    stocks = list(dict.fromkeys(stock.strip() for stock in request.stocks))
+    if not stocks:
+        raise HTTPException(status_code=400, detail="No stocks provided.")
+    if len(stocks) > WATCHLIST_MAX_STOCKS:
+        raise HTTPException(status_code=400, detail=f"At most {WATCHLIST_MAX_STOCKS} stocks per request.")
+
+    resolved = {}
+    errors = []
+    for stock in stocks:
+        try:
+            resolved[stock] = resolve_stock_ticker(stock, request.stock_exchange)
+        except HTTPException as e:
+            errors.append({"stock": stock, "error": e.detail})
+    tickers = [ticker for _, ticker in resolved.values()]
+    histories = await run_io(market_store.history_many, tickers, "1d", "2y") if tickers else {}
+
+    async def predict(stock, issuer, stock_ticker):
+        line = {"stock": stock, "ticker": stock_ticker, "name": issuer["name"]}
+        try:
+            history = histories[stock_ticker]
+            if isinstance(history, Exception):
+                return dict(line, error=f"Error fetching stock data: {history}")
+            if history.empty:
+                return dict(line, error="No data found for the selected stock")
+            result = await predict_from_history(stock_ticker, issuer["name"], history)
+            return dict(line, **prediction_sections(*result, compact=request.compact))
+        except HTTPException as e:
+            return dict(line, error=e.detail)
+        except Exception as e:
+            print(f"Error predicting {stock_ticker}: {e}")
+            return dict(line, error="Error generating stock predictions")
+
+    async def generate():
+        for error in errors:
+            yield json.dumps(error) + "\n"
+        tasks = [asyncio.create_task(predict(stock, issuer, ticker)) for stock, (issuer, ticker) in resolved.items()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                if request.compact:
+                    yield encode_json(line) + b"\n"
+                else:
+                    yield json.dumps(jsonable_encoder(line)) + "\n"
+        finally:
+            # Client went away: stop the remaining fits
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @app.post("/get_stocks", response_model=dict)
 async def get_stocks():
-    stock_dict = fetch_stocks()
-    stocks = list(stock_dict.keys())
+    # Issuer names, as the stock pickers list them and send them back
+    stocks = issuer_registry.index().names()
     output = {
         "stocks": stocks}
     return output
+
+startup_report.mark("app_setup")
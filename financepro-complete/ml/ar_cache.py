@@ -0,0 +1,78 @@
+"""
+Fitted AR model states for stock predictions, kept in the API process.
+
+One state per (ticker, lag order), tagged with the date of the last bar it
+was fitted for. While no new bar has arrived only the parameters are sent to
+the process pool (a "hit", no refit); once one has, the full state goes along
+so forecasting.fit_ar can carry X'X forward instead of refitting. Entries are
+evicted least recently used past `max_entries` or `max_bytes`.
+"""
+import threading
+from collections import OrderedDict
+
+# State keys needed to reuse the parameters without refitting
+LIGHT_KEYS = ("backend", "lags", "start_day", "digest", "params")
+
+
+def state_bytes(state):
+    return sum(value.nbytes for value in state.values() if hasattr(value, "nbytes"))
+
+
+class ArModelCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (ticker, lags) -> (last_bar, state)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.modes = {"hit": 0, "incremental": 0, "full": 0}
+        self.evictions = 0
+        self.fit_seconds = {"hit": 0.0, "incremental": 0.0, "full": 0.0}
+
+    def state_for(self, ticker, lags, last_bar):
+        """State to pass to fit_ar_forecast: parameters only if `last_bar` is unchanged, else everything."""
+        with self._lock:
+            entry = self._entries.get((ticker, lags))
+            if entry is None:
+                return None
+            self._entries.move_to_end((ticker, lags))
+        cached_bar, state = entry
+        if cached_bar == last_bar:
+            return {key: state[key] for key in LIGHT_KEYS}
+        return state
+
+    def record(self, ticker, lags, last_bar, state, mode, seconds=0.0):
+        """Count a fit and keep its state (a hit leaves the stored state as is)."""
+        self.modes[mode] = self.modes.get(mode, 0) + 1
+        self.fit_seconds[mode] = self.fit_seconds.get(mode, 0.0) + seconds
+        if mode == "hit" or self.max_entries <= 0:
+            return
+        size = state_bytes(state)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((ticker, lags), None)
+            if old is not None:
+                self._bytes -= state_bytes(old[1])
+            self._entries[(ticker, lags)] = (last_bar, state)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= state_bytes(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        fits = sum(self.modes.values())
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "fits": dict(self.modes),
+            "avg_ms": {
+                mode: round(self.fit_seconds[mode] / count * 1000, 2) if count else 0.0
+                for mode, count in self.modes.items()
+            },
+            "hit_rate": round(self.modes["hit"] / fits, 4) if fits else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,106 @@
+"""
+Speed and forecast parity of the AR backends against statsmodels AutoReg:
+
+    python bench/bench_ar_backends.py --repeat 5
+    python bench/bench_ar_backends.py --fixtures fixtures/   # also <TICKER>_1d.csv files
+
+Each series is prepared like generate_stock_prediction does (daily frequency,
+forward filled, last two years), then fitted with 250 lags on the first 90%
+and forecast through the test period plus 90 days. "original" is the AutoReg
+fit and predict that api.py used before the backends existed. Differences are
+the largest absolute forecast difference relative to the largest reference
+value.
+"""
+import argparse
+import datetime as dt
+import glob
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from forecasting import AR_BACKENDS, fit_ar_forecast  # noqa: E402
+
+
+def synthetic_series(rng, days=520):
+    index = pd.bdate_range("2023-01-02", periods=days, tz="Asia/Kolkata")
+    walk = 3000 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+    trend = 500 + np.arange(days) * 2.0 + rng.normal(0, 15, days)
+    ar = np.zeros(days)
+    for t in range(3, days):
+        ar[t] = 0.5 * ar[t - 1] + 0.2 * ar[t - 2] - 0.1 * ar[t - 3] + rng.normal(0, 1)
+    return {
+        "random_walk": pd.DataFrame({"Close": walk}, index=index),
+        "trend": pd.DataFrame({"Close": trend}, index=index),
+        "stationary_ar3": pd.DataFrame({"Close": 100 + ar}, index=index),
+    }
+
+
+def fixture_series(directory):
+    series = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*_1d.csv"))):
+        frame = pd.read_csv(path)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("Date"), utc=True))
+        series[os.path.basename(path)[: -len("_1d.csv")]] = frame[["Close"]]
+    return series
+
+
+def prepare(frame):
+    close = frame[["Close"]].asfreq("D", method="ffill").ffill()
+    return close[close.index >= close.index[-1] - pd.Timedelta(days=730)]
+
+
+def original_forecast(close, lags, horizon_days):
+    from statsmodels.tsa.ar_model import AutoReg
+
+    train_df = close.iloc[: int(len(close) * 0.9) + 1]
+    test_df = close.iloc[int(len(close) * 0.9) :]
+    model = AutoReg(train_df["Close"], lags).fit(cov_type="HC0")
+    return model.predict(start=test_df.index[0], end=test_df.index[-1] + dt.timedelta(days=horizon_days), dynamic=True)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="directory of <TICKER>_1d.csv files (Date, Close, ...)")
+    parser.add_argument("--lags", type=int, default=250)
+    parser.add_argument("--horizon", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    series = synthetic_series(np.random.default_rng(args.seed))
+    if args.fixtures:
+        series.update(fixture_series(args.fixtures))
+
+    print(f"{'series':<16}{'backend':<13}{'best ms':>9}{'speedup':>9}{'max rel diff':>14}")
+    for name, frame in series.items():
+        close = prepare(frame)
+        reference, original_seconds = timed(lambda: original_forecast(close, args.lags, args.horizon), args.repeat)
+        scale = np.abs(reference.to_numpy()).max()
+        print(f"{name:<16}{'original':<13}{original_seconds * 1000:9.2f}{1.0:9.1f}{0.0:14.2e}")
+        for backend in AR_BACKENDS:
+            result, seconds = timed(lambda: fit_ar_forecast(close, args.lags, args.horizon, None, backend), args.repeat)
+            forecast = result[2]
+            if not forecast.index.equals(reference.index):
+                raise SystemExit(f"{name} {backend}: forecast dates differ from AutoReg")
+            diff = np.abs(forecast.to_numpy() - reference.to_numpy()).max() / scale
+            print(f"{name:<16}{backend:<13}{seconds * 1000:9.2f}{original_seconds / seconds:9.1f}{diff:14.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Equivalence and speed of the vectorized forecast adjustment against the
+original per-day pandas loop from generate_stock_prediction:
+
+    python bench/bench_forecast_adjustment.py --tickers 500
+
+Exits non-zero if any adjusted value differs from the loop's.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from forecast_adjustment import adjust_forecast_series, adjust_forecasts  # noqa: E402
+
+
+def reference_adjustment(base_forecast, test_end_date, sentiment_score, last_historical_price):
+    """The adjustment loop as it was in api.py."""
+    adjusted_forecast = base_forecast.copy()
+    forecast_dates = adjusted_forecast.index
+    first_forecast_index = None
+    for i, date in enumerate(forecast_dates):
+        if date > test_end_date:
+            if first_forecast_index is None:
+                first_forecast_index = i
+            days_ahead = (date - test_end_date).days
+            time_decay = max(0.3, 1.0 - (days_ahead / 90.0))
+            adjusted_sentiment = sentiment_score * time_decay
+            adjustment_factor = adjusted_sentiment * 0.015
+            raw_forecast = base_forecast.iloc[i] * (1 + adjustment_factor)
+            if i == first_forecast_index:
+                max_first_day_change = last_historical_price * 0.01
+                min_first_day_change = last_historical_price * -0.01
+                if raw_forecast > last_historical_price + max_first_day_change:
+                    raw_forecast = last_historical_price + max_first_day_change
+                elif raw_forecast < last_historical_price + min_first_day_change:
+                    raw_forecast = last_historical_price + min_first_day_change
+            else:
+                previous_forecast = adjusted_forecast.iloc[i - 1]
+                max_change = previous_forecast * 0.05
+                min_change = previous_forecast * -0.05
+                if raw_forecast > previous_forecast + max_change:
+                    raw_forecast = previous_forecast + max_change
+                elif raw_forecast < previous_forecast + min_change:
+                    raw_forecast = previous_forecast + min_change
+            adjusted_forecast.iloc[i] = raw_forecast
+    return adjusted_forecast
+
+
+def make_case(rng, test_days, horizon):
+    """A forecast Series over the test period and horizon, with jumps that trip the clamps."""
+    index = pd.date_range("2025-01-01", periods=test_days + horizon, freq="D", tz="Asia/Kolkata")
+    steps = rng.normal(0, rng.choice([0.005, 0.03, 0.08]), len(index))
+    values = 1000 * np.exp(np.cumsum(steps))
+    last_price = values[test_days - 1] * rng.choice([1.0, 1.03, 0.95])
+    return pd.Series(values, index=index), index[test_days - 1], rng.uniform(-1, 1), last_price
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--test-days", type=int, default=73)
+    parser.add_argument("--horizon", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = [make_case(rng, args.test_days, args.horizon) for _ in range(args.tickers)]
+
+    started = time.perf_counter()
+    expected = [reference_adjustment(*case) for case in cases]
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    series = [adjust_forecast_series(*case) for case in cases]
+    series_seconds = time.perf_counter() - started
+
+    # All tickers as one (tickers, horizon) batch
+    base = np.stack([case[0].to_numpy()[args.test_days:] for case in cases])
+    days_ahead = np.arange(1, args.horizon + 1)
+    started = time.perf_counter()
+    batch = adjust_forecasts(base, days_ahead, [case[2] for case in cases], [case[3] for case in cases])
+    batch_seconds = time.perf_counter() - started
+
+    mismatches = 0
+    for i, reference in enumerate(expected):
+        if not np.array_equal(reference.to_numpy(), series[i].to_numpy()) or not reference.index.equals(series[i].index):
+            mismatches += 1
+        elif not np.array_equal(reference.to_numpy()[args.test_days:], batch[i]):
+            mismatches += 1
+
+    n = args.tickers
+    print(f"{n} tickers x {args.horizon} days")
+    print(f"  pandas loop       {loop_seconds * 1000:9.2f} ms  ({loop_seconds / n * 1000:.3f} ms/ticker)")
+    print(f"  vectorized series {series_seconds * 1000:9.2f} ms  ({series_seconds / n * 1000:.3f} ms/ticker)")
+    print(f"  vectorized batch  {batch_seconds * 1000:9.2f} ms  ({batch_seconds / n * 1000:.4f} ms/ticker)")
+    print(f"  mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
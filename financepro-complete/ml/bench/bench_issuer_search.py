@@ -0,0 +1,38 @@
+"""
+Latency of stock picker searches against the issuer registry:
+
+    python bench/bench_issuer_search.py --repeat 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from issuers import IssuerRegistry  # noqa: E402
+
+QUERIES = ["reliance", "relaince", "tata cons", "tata consultncy", "hdfc", "bajaj fin", "infosys", "a", "ltd", "INE002A01018", "500325"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=os.path.join(os.path.dirname(__file__), "..", "data", "equity_issuers.csv"))
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    registry = IssuerRegistry(args.csv)
+    index = registry.index()
+    print(f"loaded {index.columns.rows} issuers in {registry.stats()['load_ms']} ms")
+    for query in QUERIES:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            results = index.search(query, args.limit)
+        per_query = (time.perf_counter() - started) / args.repeat * 1000
+        top = results[0]["symbol"] if results else "-"
+        print(f"{query!r:20} {per_query:8.3f} ms  {len(results):3d} results  top {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Size and encode time of a get_stock_prediction response, as sent before the
+compact mode (FastAPI's jsonable_encoder and json.dumps) and in compact mode
+with each encoder, plain and gzipped:
+
+    python bench/bench_prediction_payload.py --repeat 50
+    python bench/bench_prediction_payload.py --fixture fixtures/TCS.NS_1d.csv
+
+The response is built from two years of daily bars (synthetic unless a
+<TICKER>_1d.csv fixture is given) with the default 250 lag fit. Encode time
+covers building the payload from the frames too. Exits non-zero if the
+compact payload does not decode to the same dates and float32 values.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import serialization  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from forecasting import fit_ar_forecast  # noqa: E402
+from serialization import compact_prediction, expand_index  # noqa: E402
+
+SENTIMENT = {"overall_sentiment_score": 0.12, "sentiment_label": "positive", "news_count": 0, "recent_news": []}
+
+
+def history(args):
+    if args.fixture:
+        frame = pd.read_csv(args.fixture)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("Date"), utc=True)).tz_convert("Asia/Kolkata")
+        return frame
+    rng = np.random.default_rng(args.seed)
+    index = pd.bdate_range("2023-01-02", periods=520, tz="Asia/Kolkata")
+    close = 3000 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(index))))
+    spread = close * rng.uniform(0, 0.01, len(index))
+    return pd.DataFrame(
+        {"Open": close + spread / 2, "High": close + spread, "Low": close - spread, "Close": close}, index=index
+    )
+
+
+def prediction(stock_data):
+    close = stock_data[["Close"]].asfreq("D", method="ffill").ffill()
+    close = close[close.index >= close.index[-1] - pd.Timedelta(days=730)]
+    train_df, test_df, forecast, predictions, _, _ = fit_ar_forecast(close)
+    return train_df, test_df, forecast, predictions
+
+
+def legacy(stock_data, train_df, test_df, forecast, predictions):
+    """The response dict as get_stock_prediction returns it, encoded like FastAPI's JSONResponse."""
+    response = {
+        "historical_data": {
+            "dates": stock_data.index.tolist(),
+            "open": stock_data["Open"].tolist(),
+            "high": stock_data["High"].tolist(),
+            "low": stock_data["Low"].tolist(),
+            "close": stock_data["Close"].tolist(),
+        },
+        "stock_prediction": {
+            "train_dates": train_df.index.tolist(),
+            "train_close": train_df["Close"].tolist(),
+            "test_dates": test_df.index.tolist(),
+            "test_close": test_df["Close"].tolist(),
+            "forecast_dates": forecast.index.tolist(),
+            "forecast": forecast.tolist(),
+            "test_predictions_dates": test_df.index.tolist(),
+            "test_predictions": predictions.tolist(),
+        },
+        "sentiment_analysis": SENTIMENT,
+    }
+    return json.dumps(jsonable_encoder(response), separators=(",", ":")).encode()
+
+
+def check(decoded, stock_data, train_df, test_df, forecast, predictions):
+    pairs = [
+        (decoded["historical_data"]["dates"], decoded["historical_data"]["close"], stock_data.index, stock_data["Close"]),
+        (decoded["stock_prediction"]["train_dates"], decoded["stock_prediction"]["train_close"], train_df.index, train_df["Close"]),
+        (decoded["stock_prediction"]["test_dates"], decoded["stock_prediction"]["test_predictions"], test_df.index, predictions),
+        (decoded["stock_prediction"]["forecast_dates"], decoded["stock_prediction"]["forecast"], forecast.index, forecast),
+    ]
+    for dates, values, expected_dates, expected_values in pairs:
+        if not expand_index(dates).equals(expected_dates):
+            raise SystemExit(f"Dates differ: {dates}")
+        if not np.array_equal(np.asarray(values, dtype="f4"), np.asarray(expected_values, dtype="f4")):
+            raise SystemExit("Values differ from float32")
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="<TICKER>_1d.csv file (Date, Open, High, Low, Close, ...)")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stock_data = history(args)
+    frames = prediction(stock_data)
+    build = lambda: compact_prediction(*frames, SENTIMENT, stock_data)  # noqa: E731
+
+    encoders = {"legacy json": lambda: legacy(stock_data, *frames)}
+    encoders["compact " + ("orjson" if serialization.orjson else "json")] = lambda: serialization.encode_json(build())
+    if serialization.msgpack:
+        encoders["compact msgpack"] = lambda: serialization.encode_msgpack(build())
+
+    check(json.loads(serialization.encode_json(build())), stock_data, *frames)
+    if serialization.msgpack:
+        check(serialization.msgpack.unpackb(serialization.encode_msgpack(build())), stock_data, *frames)
+
+    print(f"{'encoding':<20}{'bytes':>9}{'gzip bytes':>12}{'encode ms':>11}{'+gzip ms':>10}")
+    for name, encode in encoders.items():
+        body, seconds = timed(encode, args.repeat)
+        zipped, gzip_seconds = timed(lambda: gzip.compress(body, compresslevel=5), args.repeat)
+        print(f"{name:<20}{len(body):9d}{len(zipped):12d}{seconds * 1000:11.2f}{(seconds + gzip_seconds) * 1000:10.2f}")
+    if not serialization.msgpack:
+        print("msgpack is not installed, skipped")
+
+
+if __name__ == "__main__":
+    main()
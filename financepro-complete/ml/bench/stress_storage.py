@@ -0,0 +1,104 @@
+"""
+Concurrency stress test for the user data storage.
+
+Runs hundreds of parallel writers that follow the same read-modify-write
+pattern as the api.py handlers (per-user lock, load, modify, commit) and
+checks that no update was lost:
+
+    python bench/stress_storage.py --backend sqlite --writers 400 --group-commit-ms 2
+
+tests/test_storage.py runs a small version of it with pytest.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import GroupCommitter, UserLocks, get_backend  # noqa: E402
+from user_cache import CachingBackend  # noqa: E402
+
+
+def new_user():
+    return {"password": "", "transactions": [], "recurring_transactions": [], "budget": {}, "budget_periods": {}, "savings_goal": 0.0, "savings": 0.0, "bills": []}
+
+
+async def writer(store, commits, locks, user, writer_id, rounds, use_locks):
+    for i in range(rounds):
+        lock = locks(user) if use_locks else asyncio.Lock()
+        async with lock:
+            # Same shape as set_budget: load, modify, save
+            user_data = store.load_profile(user, ("budget", "budget_periods"))
+            user_data["budget"][f"w{writer_id}-{i}"] = float(i)
+            await commits.submit(("save", user, user_data))
+        async with lock:
+            # Same shape as add_transaction: append to the log
+            transaction = {"amount": 1.0, "description": f"w{writer_id}-{i}", "category": "stress", "date": "2026-01-01"}
+            await commits.submit(("append", user, [transaction]))
+
+
+async def run(args, directory):
+    store = get_backend(
+        args.backend,
+        json_path=os.path.join(directory, "users_data.json"),
+        sqlite_path=os.path.join(directory, "users_data.db"),
+    )
+    if args.cache_entries:
+        store = CachingBackend(store, max_entries=args.cache_entries, flush_interval=1.0)
+    commits = GroupCommitter(store, args.group_commit_ms / 1000.0)
+    locks = UserLocks()
+
+    users = [f"user{u}" for u in range(args.users)]
+    for user in users:
+        store.save_user(user, new_user())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        writer(store, commits, locks, users[w % len(users)], w, args.rounds, not args.no_locks)
+        for w in range(args.writers)
+    ])
+    elapsed = time.perf_counter() - start
+
+    if args.cache_entries:
+        # Check what reached the persistent backend, not the cached copies
+        store.flush()
+        store = store.inner
+
+    lost = 0
+    for u, user in enumerate(users):
+        writers = len(range(u, args.writers, len(users)))
+        expected = writers * args.rounds
+        user_data = store.load_user(user)
+        aggregates = store.get_aggregates(user)
+        lost += expected - len(user_data["budget"])
+        lost += expected - len(user_data["transactions"])
+        if store.verify_aggregates(user) or aggregates["count"] != expected:
+            print(f"{user}: aggregates do not match the transaction log")
+            lost += 1
+
+    operations = args.writers * args.rounds * 2
+    stats = commits.stats()
+    print(
+        f"{args.backend}: {operations} writes from {args.writers} writers in {elapsed:.2f}s "
+        f"({operations / elapsed:.0f} writes/s, {stats['batches']} commits), lost updates: {lost}"
+    )
+    return lost
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--writers", type=int, default=400)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--group-commit-ms", type=float, default=2.0)
+    parser.add_argument("--cache-entries", type=int, default=0, help="Put a write-behind user cache in front")
+    parser.add_argument("--no-locks", action="store_true", help="Skip the per-user locks to show lost updates")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        lost = asyncio.run(run(args, directory))
+    sys.exit(1 if lost else 0)
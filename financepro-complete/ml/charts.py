@@ -0,0 +1,104 @@
+"""
+Analytics chart data and server-side chart rendering.
+
+`render_pie_chart` runs in the process pool (see executors.py), so it only
+takes plain lists and returns image bytes; matplotlib is imported there, not
+in the API process. `ChartCache` keeps rendered images keyed by a hash of the
+chart inputs so repeat views of unchanged data are not re-rendered.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+CHART_FORMATS = ("png", "svg")
+
+
+def render_pie_chart(labels, amounts, title, image_format="png"):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(8, 8))
+    try:
+        ax.pie(amounts, labels=labels, autopct='%1.1f%%', startangle=90, colors=sns.color_palette('coolwarm', len(amounts)))
+        ax.set_title(title)
+        img = BytesIO()
+        fig.savefig(img, format=image_format)
+        return img.getvalue()
+    finally:
+        # Figures are global pyplot state; close them or a long-lived worker leaks memory
+        plt.close(fig)
+
+
+def chart_key(*inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ChartCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(image) for image in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def analytics_data(rollups):
+    """
+    Category totals split by sign and net monthly savings, as plain lists,
+    from the monthly rollups ({month: {category: [income, expenditure]}}).
+    """
+    income = {}
+    expenditure = {}
+    months = {}
+    for month, categories in rollups.items():
+        for category, (month_income, month_expenditure) in categories.items():
+            if month_income:
+                income[category] = income.get(category, 0.0) + month_income
+            if month_expenditure:
+                expenditure[category] = expenditure.get(category, 0.0) + month_expenditure
+            if month:
+                months[month] = months.get(month, 0.0) + month_income + month_expenditure
+
+    def series(totals):
+        labels = sorted(totals)
+        return {"labels": labels, "values": [round(totals[label], 2) for label in labels]}
+
+    monthly = sorted(months)
+    return {
+        "income_by_category": series(income),
+        "expenditure_by_category": series(expenditure),
+        "monthly_savings": {"months": monthly, "values": [round(months[m], 2) for m in monthly]},
+    }
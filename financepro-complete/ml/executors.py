@@ -0,0 +1,113 @@
+"""
+Bounded executor pools for blocking work called from async handlers.
+
+`io_pool` is a thread pool for network calls (yfinance), file reads and model
+inference that releases the GIL. `cpu_pool` is a process pool for pure CPU
+work such as AutoReg fits and chart rendering; functions sent to it must be
+module level and picklable. Each pool caps how many jobs run at once and how
+many may wait for a slot, and reports its queue depth through `stats()`.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when a pool's wait queue is full."""
+
+
+class BoundedExecutor:
+    def __init__(self, name, executor, max_concurrency, max_queue=0):
+        self.name = name
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = None
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_queued = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in the pool once a slot is free and return its result."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.max_queue and self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise PoolBusyError(f"{self.name} pool is busy, try again later")
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        enqueued = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started = time.perf_counter()
+        self.wait_seconds += started - enqueued
+        self.running += 1
+        try:
+            call = functools.partial(fn, *args, **kwargs) if kwargs else functools.partial(fn, *args)
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.run_seconds += time.perf_counter() - started
+            self._semaphore.release()
+        self.completed += 1
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        finished = self.completed + self.failed
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_seconds / finished * 1000, 2) if finished else 0.0,
+            "avg_run_ms": round(self.run_seconds / finished * 1000, 2) if finished else 0.0,
+        }
+
+
+def make_io_pool():
+    workers = int(os.getenv("IO_POOL_WORKERS", "16"))
+    return BoundedExecutor(
+        "io",
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="io-pool"),
+        max_concurrency=int(os.getenv("IO_POOL_MAX_CONCURRENCY", str(workers))),
+        max_queue=int(os.getenv("IO_POOL_MAX_QUEUE", "0")),
+    )
+
+
+def make_cpu_pool():
+    workers = int(os.getenv("CPU_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    if workers > 0:
+        # spawn: forking a process that already runs threads is not safe
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        # 0 keeps CPU work in threads, for small deployments and debugging
+        workers = 1
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu-pool")
+    return BoundedExecutor(
+        "cpu",
+        executor,
+        max_concurrency=int(os.getenv("CPU_POOL_MAX_CONCURRENCY", str(workers))),
+        max_queue=int(os.getenv("CPU_POOL_MAX_QUEUE", "0")),
+    )
@@ -0,0 +1,58 @@
+"""
+Sentiment adjustment and volatility clamps for AR forecasts, on NumPy arrays.
+
+Works on a batch of forecasts at once: `base` is (tickers, horizon) holding
+the forecast for the days after the last known price, `days_ahead` the
+calendar days of each column past that price. Each value is scaled by the
+ticker's sentiment with a linear time decay, then clamped to within
+`first_day_limit` of the last price on the first day and `daily_limit` of the
+previous adjusted value after that. The clamp chains day to day, so the
+horizon is walked column by column with every ticker handled in one step.
+"""
+import numpy as np
+
+
+class AdjustmentParams:
+    def __init__(self, sentiment_scale=0.015, decay_days=90.0, min_decay=0.3, first_day_limit=0.01, daily_limit=0.05):
+        self.sentiment_scale = sentiment_scale  # largest adjustment at full sentiment and no decay
+        self.decay_days = decay_days  # days over which the sentiment effect decays
+        self.min_decay = min_decay  # floor of the decay factor
+        self.first_day_limit = first_day_limit  # largest first-day move from the last price
+        self.daily_limit = daily_limit  # largest move from the previous forecast day
+
+
+def _clamp(value, reference, limit):
+    # Same comparisons as an if/elif on the upper then lower bound, so NaNs pass through
+    upper = reference + reference * limit
+    lower = reference + reference * -limit
+    return np.where(value > upper, upper, np.where(value < lower, lower, value))
+
+
+def adjust_forecasts(base, days_ahead, sentiment, last_price, params=None):
+    """Adjusted copy of `base` (tickers, horizon) for per-ticker `sentiment` and `last_price`."""
+    params = params or AdjustmentParams()
+    base = np.atleast_2d(np.asarray(base, dtype="f8"))
+    days_ahead = np.asarray(days_ahead, dtype="f8")
+    sentiment = np.asarray(sentiment, dtype="f8").reshape(-1, 1)
+    last_price = np.asarray(last_price, dtype="f8").reshape(-1)
+
+    time_decay = np.maximum(params.min_decay, 1.0 - days_ahead / params.decay_days)
+    raw = base * (1 + (sentiment * time_decay) * params.sentiment_scale)
+
+    adjusted = np.empty_like(raw)
+    if raw.shape[1]:
+        adjusted[:, 0] = _clamp(raw[:, 0], last_price, params.first_day_limit)
+    for i in range(1, raw.shape[1]):
+        adjusted[:, i] = _clamp(raw[:, i], adjusted[:, i - 1], params.daily_limit)
+    return adjusted
+
+
+def adjust_forecast_series(base_forecast, test_end_date, sentiment, last_price, params=None):
+    """Adjust the dates of a forecast Series after `test_end_date`, leaving earlier ones as they are."""
+    adjusted_forecast = base_forecast.copy()
+    future = np.asarray(base_forecast.index > test_end_date)
+    if future.any():
+        days_ahead = (base_forecast.index[future] - test_end_date).days
+        adjusted = adjust_forecasts(base_forecast.to_numpy()[future], days_ahead, [sentiment], [last_price], params)
+        adjusted_forecast.iloc[np.flatnonzero(future)] = adjusted[0]
+    return adjusted_forecast
@@ -0,0 +1,206 @@
+"""
+CPU-bound forecasting steps, kept free of FastAPI state so they can run in the
+process pool (see executors.py).
+
+By default ("normal" backend) the AR(p) model is fitted by ordinary least
+squares through the normal equations X'X b = X'y, which gives the same
+parameters as statsmodels AutoReg but lets a fit be carried forward: `fit_ar`
+takes the state of the previous fit for the same ticker and, when the
+training window has only moved by a few days, subtracts the design rows that
+left it and adds the new ones instead of rebuilding X'X from scratch. States are kept by ar_cache.ArModelCache
+in the API process.
+
+Other backends ("lstsq", "yule_walker" and "statsmodels" as the reference)
+are selected with AR_BACKEND; bench/bench_ar_backends.py compares their speed
+and forecasts.
+"""
+import hashlib
+
+import numpy as np
+
+# Carried-forward fits are redone from scratch after this many updates so
+# rounding errors in X'X cannot pile up
+MAX_INCREMENTAL_UPDATES = 20
+
+
+def _design(y, targets, lags):
+    """Rows [1, y[t-1], ..., y[t-lags]] and y[t] for each target index t."""
+    windows = np.lib.stride_tricks.sliding_window_view(y, lags + 1)[targets - lags]
+    X = np.empty((len(targets), lags + 1))
+    X[:, 0] = 1.0
+    X[:, 1:] = windows[:, -2::-1] if lags else windows[:, :0]
+    return X, windows[:, -1]
+
+
+def _digest(y):
+    return hashlib.sha1(np.ascontiguousarray(y, dtype="f8").tobytes()).hexdigest()
+
+
+def _solve(xtx, xty, y, lags):
+    try:
+        return np.linalg.solve(xtx, xty)
+    except np.linalg.LinAlgError:
+        # Singular (e.g. a constant series): minimum norm least squares on the design
+        X, target = _design(y, np.arange(lags, len(y)), lags)
+        return np.linalg.lstsq(X, target, rcond=None)[0]
+
+
+def _carry_forward(state, y, start_day, lags):
+    """Update X'X and X'y of `state` to the window `y` starting at `start_day`, or None if a full fit is cheaper."""
+    old = state["y"]
+    offset = start_day - state["start_day"]
+    overlap = min(len(old) - offset, len(y)) if offset >= 0 else 0
+    if overlap <= lags:
+        return None
+
+    # A row is unchanged when its target and all its lags are identical in both windows
+    changed = old[offset:offset + overlap] != y[:overlap]
+    changed_before = np.concatenate([[0], np.cumsum(changed)])
+    targets = np.arange(lags, overlap)
+    unchanged = targets[changed_before[targets + 1] - changed_before[targets - lags] == 0]
+
+    added = np.setdiff1d(np.arange(lags, len(y)), unchanged, assume_unique=True)
+    removed = np.setdiff1d(np.arange(lags, len(old)), unchanged + offset, assume_unique=True)
+    if len(added) + len(removed) >= len(y) - lags:
+        return None
+
+    xtx = state["xtx"].copy()
+    xty = state["xty"].copy()
+    X, target = _design(y, added, lags)
+    xtx += X.T @ X
+    xty += X.T @ target
+    X, target = _design(old, removed, lags)
+    xtx -= X.T @ X
+    xty -= X.T @ target
+    return xtx, xty
+
+
+def _fit_normal(y, lags):
+    X, target = _design(y, np.arange(lags, len(y)), lags)
+    xtx = X.T @ X
+    xty = X.T @ target
+    return _solve(xtx, xty, y, lags), xtx, xty
+
+
+def fit_lstsq(y, lags):
+    """Least squares on the lagged design directly (QR/SVD, no normal equations)."""
+    X, target = _design(y, np.arange(lags, len(y)), lags)
+    return np.linalg.lstsq(X, target, rcond=None)[0]
+
+
+def fit_yule_walker(y, lags):
+    """
+    Yule-Walker estimate through Levinson-Durbin on the biased autocovariances
+    of the demeaned series. Always stationary, so long horizons revert to the
+    mean instead of following the trend like the least squares fits.
+    """
+    mean = y.mean()
+    centered = y - mean
+    n = len(y)
+    spectrum = np.fft.rfft(centered, 2 * n)
+    acov = np.fft.irfft(spectrum * np.conj(spectrum))[: lags + 1] / n
+    phi = np.zeros(lags)
+    error = acov[0]
+    for k in range(lags):
+        if error <= 0:
+            break
+        reflection = (acov[k + 1] - phi[:k] @ acov[k:0:-1]) / error
+        phi[:k] = phi[:k] - reflection * phi[:k][::-1]
+        phi[k] = reflection
+        error *= 1 - reflection**2
+    return np.concatenate([[mean * (1 - phi.sum())], phi])
+
+
+def fit_statsmodels(y, lags):
+    """Reference: statsmodels AutoReg (same estimator as the normal equations, much slower)."""
+    from statsmodels.tsa.ar_model import AutoReg
+
+    return np.asarray(AutoReg(y, lags).fit().params)
+
+
+# Estimators selectable by AR_BACKEND; only "normal" can carry a fit forward
+AR_BACKENDS = {
+    "normal": lambda y, lags: _fit_normal(y, lags)[0],
+    "lstsq": fit_lstsq,
+    "yule_walker": fit_yule_walker,
+    "statsmodels": fit_statsmodels,
+}
+
+
+def fit_ar(y, start_day, lags, state=None, backend="normal"):
+    """
+    Fit AR(lags) with a constant on the values `y` (one per day from epoch day
+    `start_day`). Returns (params, state, mode) where mode is "hit" (same
+    window and backend as `state`), "incremental" or "full".
+    """
+    if backend not in AR_BACKENDS:
+        raise ValueError(f"Unknown AR backend: {backend}")
+    y = np.asarray(y, dtype="f8")
+    if len(y) <= lags + 1:
+        raise ValueError(f"Need more than {lags + 1} observations to fit {lags} lags, got {len(y)}")
+    digest = _digest(y)
+    if state is not None and state.get("lags") == lags and state.get("backend") == backend:
+        if state["start_day"] == start_day and state["digest"] == digest:
+            return state["params"], state, "hit"
+        if "xtx" in state and state["updates"] < MAX_INCREMENTAL_UPDATES:
+            carried = _carry_forward(state, y, start_day, lags)
+            if carried is not None:
+                xtx, xty = carried
+                params = _solve(xtx, xty, y, lags)
+                new_state = dict(
+                    backend=backend, lags=lags, start_day=start_day, y=y, digest=digest,
+                    xtx=xtx, xty=xty, params=params, updates=state["updates"] + 1,
+                )
+                return params, new_state, "incremental"
+
+    if backend != "normal":
+        params = AR_BACKENDS[backend](y, lags)
+        return params, dict(backend=backend, lags=lags, start_day=start_day, digest=digest, params=params), "full"
+    params, xtx, xty = _fit_normal(y, lags)
+    new_state = dict(
+        backend=backend, lags=lags, start_day=start_day, y=y, digest=digest,
+        xtx=xtx, xty=xty, params=params, updates=0,
+    )
+    return params, new_state, "full"
+
+
+def predict_ar(params, history, steps):
+    """Dynamic forecast: `steps` values after `history`, each fed back as a lag of the next."""
+    lags = len(params) - 1
+    buffer = np.empty(lags + steps)
+    buffer[:lags] = np.asarray(history, dtype="f8")[len(history) - lags:] if lags else []
+    coefficients = params[:0:-1]  # oldest lag first, to line up with the buffer
+    for i in range(steps):
+        buffer[lags + i] = params[0] + coefficients @ buffer[i:lags + i]
+    return buffer[lags:]
+
+
+def fit_ar_forecast(stock_data_close, lags=250, horizon_days=90, state=None, backend="normal"):
+    """
+    Fit AR(lags) on the first 90% of a daily close frame and predict the last
+    10% plus `horizon_days` beyond it, carrying forward `state` from an
+    earlier fit of the same ticker when possible.
+    Returns (train_df, test_df, base_forecast, predictions, state, mode).
+    """
+    import pandas as pd
+
+    # Define training and testing area
+    train_df = stock_data_close.iloc[: int(len(stock_data_close) * 0.9) + 1]  # 90%
+    test_df = stock_data_close.iloc[int(len(stock_data_close) * 0.9) :]  # 10%
+
+    # Fit on consecutive daily values, indexed by epoch day for carrying fits forward
+    start_day = int(train_df.index[0].timestamp() // 86400)
+    params, state, mode = fit_ar(train_df["Close"].to_numpy(), start_day, lags, state, backend)
+
+    # Dynamic prediction from the first test day (the last training day) through the horizon
+    steps = len(test_df) + horizon_days
+    values = predict_ar(params, train_df["Close"].to_numpy()[:-1], steps)
+    base_forecast = pd.Series(values, index=pd.date_range(test_df.index[0], periods=steps, freq="D"))
+    predictions = base_forecast.iloc[: len(test_df)].copy()
+    predictions.index = test_df.index
+    return train_df, test_df, base_forecast, predictions, state, mode
+
+
+def warm_up():
+    """Import the fitting libraries in a pool worker ahead of the first request."""
+    import pandas
@@ -0,0 +1,152 @@
+"""
+Incremental parsers for bank statement uploads (CSV and OFX).
+
+Both parsers read the file line by line and yield raw transaction dicts with
+amount, description, category and a normalized "YYYY-MM-DD HH:MM:SS" date, so
+a 50k-row statement never has to be held in memory as a whole.
+"""
+import csv
+import hashlib
+import re
+from datetime import datetime
+
+DEFAULT_CATEGORY = "Uncategorized"
+
+# Accepted spellings of the CSV columns, compared lowercased
+CSV_COLUMNS = {
+    "date": ["date", "transaction date", "txn date", "posted date", "posting date", "value date", "value dt"],
+    "description": ["description", "narration", "details", "particulars", "memo", "remarks", "payee", "name"],
+    "amount": ["amount", "transaction amount", "amt"],
+    "debit": ["debit", "debit amount", "withdrawal", "withdrawal amt.", "withdrawal amount", "dr"],
+    "credit": ["credit", "credit amount", "deposit", "deposit amt.", "deposit amount", "cr"],
+    "category": ["category"],
+}
+
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d/%m/%y",
+    "%d-%m-%y",
+    "%d %b %Y",
+    "%d-%b-%Y",
+    "%d %b %y",
+    "%d-%b-%y",
+]
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def parse_date(value, date_format=None):
+    value = value.strip()
+    formats = [date_format] if date_format else DATE_FORMATS
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ImportRowError(f"Unrecognized date: {value!r}")
+
+
+def parse_amount(value):
+    value = (value or "").strip()
+    if not value:
+        return 0.0
+    negative = value.startswith("(") and value.endswith(")")
+    cleaned = re.sub(r"[^0-9.\-]", "", value)
+    try:
+        amount = float(cleaned)
+    except ValueError:
+        raise ImportRowError(f"Unrecognized amount: {value!r}")
+    return -abs(amount) if negative else amount
+
+
+def transaction_hash(transaction):
+    """Dedupe key of an imported transaction: its day, amount and description."""
+    key = f"{transaction['date'][:10]}|{transaction['amount']:.2f}|{transaction['description'].strip().lower()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def iter_csv_transactions(text_stream, default_category=DEFAULT_CATEGORY, date_format=None):
+    """Yield (line_number, transaction or ImportRowError) for every CSV data row."""
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    lowered = [h.strip().lower() for h in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in lowered:
+                columns[field] = lowered.index(alias)
+                break
+    if "date" not in columns or "description" not in columns:
+        raise ImportRowError("CSV needs a date and a description column")
+    if "amount" not in columns and not ("debit" in columns or "credit" in columns):
+        raise ImportRowError("CSV needs an amount column or debit/credit columns")
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else ""
+
+    for row in reader:
+        if not any(c.strip() for c in row):
+            continue
+        try:
+            if "amount" in columns:
+                amount = parse_amount(cell(row, "amount"))
+            else:
+                amount = parse_amount(cell(row, "credit")) - abs(parse_amount(cell(row, "debit")))
+            yield reader.line_num, {
+                "amount": amount,
+                "description": cell(row, "description").strip(),
+                "category": cell(row, "category").strip() or default_category,
+                "date": parse_date(cell(row, "date"), date_format),
+            }
+        except ImportRowError as e:
+            yield reader.line_num, e
+
+
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def iter_ofx_transactions(text_stream, default_category=DEFAULT_CATEGORY):
+    """
+    Yield (line_number, transaction or ImportRowError) for every <STMTTRN>.
+    Handles both SGML style OFX 1.x (no closing tags) and XML style OFX 2.x.
+    """
+    current = None
+    start_line = 0
+    for line_number, line in enumerate(text_stream, start=1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and current is not None:
+                    yield start_line, ofx_transaction(current, default_category)
+                    current = None
+                elif not closing:
+                    current = {}
+                    start_line = line_number
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+
+
+def ofx_transaction(fields, default_category):
+    try:
+        posted = fields.get("DTPOSTED", "")
+        if len(posted) < 8:
+            raise ImportRowError(f"Unrecognized date: {posted!r}")
+        date = datetime.strptime(posted[:8], "%Y%m%d").strftime("%Y-%m-%d %H:%M:%S")
+        description = fields.get("NAME") or fields.get("MEMO") or fields.get("PAYEE") or ""
+        return {
+            "amount": parse_amount(fields.get("TRNAMT")),
+            "description": description,
+            "category": default_category,
+            "date": date,
+        }
+    except ImportRowError as e:
+        return e
@@ -0,0 +1,218 @@
+"""
+Columnar, memory-mapped copy of the issuer metadata.
+
+Categorical columns (sector, industry, ...) are dictionary encoded: each row
+stores a small integer code and the distinct values are kept once in the file
+header. Text columns share one UTF-8 blob addressed by an offsets array. The
+file is built from the CSV once and then mapped read-only, so every uvicorn
+worker shares the same page cache instead of holding its own parsed copy.
+Callers can store more arrays in the same file (the search index of
+issuers.py), built once with the columns.
+
+File layout: MAGIC, an 8 byte header length, a JSON header (source mtime and
+size, dictionaries, array offsets/dtypes/shapes), then the raw arrays.
+"""
+import csv
+import json
+import os
+import tempfile
+
+import numpy as np
+
+MAGIC = b"ISSUERS3"
+
+# Text columns: API name -> CSV column
+TEXT_COLUMNS = {
+    "code": "Security Code",
+    "name": "Issuer Name",
+    "symbol": "Security Id",
+    "isin": "ISIN No",
+}
+
+# Dictionary encoded columns: API name -> CSV column
+CATEGORY_COLUMNS = {
+    "sector": "Sector Name",
+    "industry": "Industry",
+    "industry_group": "Igroup Name",
+    "group": "Group",
+    "status": "Status",
+}
+
+ALIGNMENT = 64
+
+
+class IssuerColumns:
+    def __init__(self, header, arrays):
+        self.header = header
+        self.dictionaries = header["dictionaries"]
+        self._lookup = {
+            column: {value: code for code, value in enumerate(values)}
+            for column, values in self.dictionaries.items()
+        }
+        self.arrays = arrays
+        self.categories = arrays["categories"]  # uint16 [rows, len(CATEGORY_COLUMNS)]
+        self.offsets = arrays["offsets"]  # int64 [rows * len(TEXT_COLUMNS) + 1]
+        self.blob = arrays["blob"]  # uint8 [total text bytes]
+        self.rows = len(self.categories)
+
+    @classmethod
+    def from_rows(cls, rows, source=None):
+        """Encode CSV rows (dicts keyed by CSV column) into in-memory columns."""
+        dictionaries = {column: [] for column in CATEGORY_COLUMNS}
+        codes = {column: {} for column in CATEGORY_COLUMNS}
+        categories = []
+        offsets = [0]
+        blob = bytearray()
+        for row in rows:
+            code = (row.get(TEXT_COLUMNS["code"]) or "").strip()
+            if not code:
+                continue
+            for column, csv_column in TEXT_COLUMNS.items():
+                value = (row.get(csv_column) or "").strip()
+                if column == "symbol" and not value:
+                    value = code
+                blob += value.encode("utf-8")
+                offsets.append(len(blob))
+            encoded = []
+            for column, csv_column in CATEGORY_COLUMNS.items():
+                value = (row.get(csv_column) or "").strip()
+                if value not in codes[column]:
+                    codes[column][value] = len(dictionaries[column])
+                    dictionaries[column].append(value)
+                encoded.append(codes[column][value])
+            categories.append(encoded)
+
+        header = {"source": source or {}, "dictionaries": dictionaries}
+        arrays = {
+            "categories": np.array(categories, dtype=np.uint16).reshape(-1, len(CATEGORY_COLUMNS)),
+            "offsets": np.array(offsets, dtype=np.int64),
+            "blob": np.frombuffer(bytes(blob), dtype=np.uint8),
+        }
+        return cls(header, arrays)
+
+    @classmethod
+    def from_csv(cls, path, source=None):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls.from_rows(csv.DictReader(f), source)
+
+    def save(self, path):
+        """Write the columns to `path` atomically."""
+        arrays = self.arrays
+        specs = {}
+        position = 0
+        for name, array in arrays.items():
+            specs[name] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+            position += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        header = dict(self.header, arrays=specs)
+        header_bytes = json.dumps(header).encode()
+        start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".issuers-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC + len(header_bytes).to_bytes(8, "little") + header_bytes)
+                for name, array in arrays.items():
+                    f.seek(start + specs[name]["offset"])
+                    f.write(np.ascontiguousarray(array).tobytes())
+                f.truncate(start + position)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def open(cls, path):
+        """Map a file written by `save` read-only."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an issuer cache file")
+            length = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(length))
+        start = -(-(len(MAGIC) + 8 + length) // ALIGNMENT) * ALIGNMENT
+        arrays = {}
+        for name, spec in header.pop("arrays").items():
+            shape = tuple(spec["shape"])
+            if not np.prod(shape):
+                arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+                continue
+            array = np.memmap(path, dtype=spec["dtype"], mode="r", offset=start + spec["offset"], shape=shape)
+            # Plain ndarray views of the mapping: memmap indexing is several times slower
+            arrays[name] = array.view(np.ndarray)
+        return cls(header, arrays)
+
+    def text_column(self, column):
+        """One text column of every row, as a list."""
+        j = list(TEXT_COLUMNS).index(column)
+        width = len(TEXT_COLUMNS)
+        starts = self.offsets[j:-1:width]
+        ends = self.offsets[j + 1::width]
+        return [self.blob[start:end].tobytes().decode("utf-8") for start, end in zip(starts, ends)]
+
+    def row(self, row, include_categories=False):
+        offsets = self.offsets[row * len(TEXT_COLUMNS):(row + 1) * len(TEXT_COLUMNS) + 1].tolist()
+        # One copy out of the blob per row, then plain bytes slicing
+        text = self.blob[offsets[0]:offsets[-1]].tobytes()
+        data = {
+            column: text[offsets[j] - offsets[0]:offsets[j + 1] - offsets[0]].decode("utf-8")
+            for j, column in enumerate(TEXT_COLUMNS)
+        }
+        if include_categories:
+            codes = self.categories[row]
+            for j, column in enumerate(CATEGORY_COLUMNS):
+                data[column] = self.dictionaries[column][codes[j]]
+        return data
+
+    def mask(self, **filters):
+        """Boolean row mask for column=value filters on categorical columns (None = any)."""
+        mask = np.ones(self.rows, dtype=bool)
+        for j, column in enumerate(CATEGORY_COLUMNS):
+            value = filters.get(column)
+            if value is None:
+                continue
+            code = self._lookup[column].get(value.strip())
+            if code is None:
+                return np.zeros(self.rows, dtype=bool)
+            mask &= self.categories[:, j] == code
+        return mask
+
+    def facets(self, mask, columns=None):
+        """{column: {value: count}} over the rows selected by `mask`, largest first."""
+        facets = {}
+        for j, column in enumerate(CATEGORY_COLUMNS):
+            if columns is not None and column not in columns:
+                continue
+            counts = np.bincount(self.categories[mask, j], minlength=len(self.dictionaries[column]))
+            values = self.dictionaries[column]
+            facets[column] = {
+                values[code]: int(counts[code]) for code in np.argsort(-counts, kind="stable") if counts[code]
+            }
+        return facets
+
+
+def load_columns(csv_path, cache_path, build_arrays=None):
+    """
+    Map the cache file if it was built from the current CSV, otherwise rebuild
+    it from the CSV, with the extra arrays `build_arrays(columns)` returns.
+    Falls back to in-memory columns if the cache can't be written.
+    """
+    stat = os.stat(csv_path)
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        columns = IssuerColumns.open(cache_path)
+        if columns.header.get("source") == source:
+            return columns
+    except (OSError, ValueError, KeyError):
+        pass
+
+    columns = IssuerColumns.from_csv(csv_path, source)
+    if build_arrays is not None:
+        columns.arrays.update(build_arrays(columns))
+    try:
+        columns.save(cache_path)
+        return IssuerColumns.open(cache_path)
+    except OSError as e:
+        print(f"Warning: could not write issuer cache {cache_path}: {e}")
+        return columns
@@ -0,0 +1,323 @@
+"""
+In-memory registry of listed issuers from data/equity_issuers.csv.
+
+The file is read once and re-read only when its mtime changes. Issuers are
+indexed by Security Code, Security Id (the exchange symbol) and ISIN, and
+`search` answers stock picker queries over names and symbols: word prefixes
+first, then words within one typo (a SymSpell style delete index), so a lookup
+is a few binary searches instead of a scan.
+
+The issuer metadata and these indexes live in a memory-mapped columnar cache
+file (see issuer_columns.py) that also answers the sector/industry/status
+filters and facet counts. It is a runtime file, by default under
+$XDG_CACHE_HOME/financepro (~/.cache/financepro).
+"""
+import csv
+import hashlib
+import heapq
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from issuer_columns import TEXT_COLUMNS, IssuerColumns, load_columns
+
+# Used when the CSV is missing or unreadable
+DEFAULT_STOCKS = {
+    "RELIANCE": "Reliance Industries Ltd",
+    "TCS": "Tata Consultancy Services Ltd",
+    "HDFCBANK": "HDFC Bank Ltd",
+    "INFY": "Infosys Ltd",
+    "ICICIBANK": "ICICI Bank Ltd",
+    "HINDUNILVR": "Hindustan Unilever Ltd",
+    "SBIN": "State Bank of India",
+    "BHARTIARTL": "Bharti Airtel Ltd",
+    "ITC": "ITC Ltd",
+    "KOTAKBANK": "Kotak Mahindra Bank Ltd",
+    "LT": "Larsen & Toubro Ltd",
+    "AXISBANK": "Axis Bank Ltd",
+    "HCLTECH": "HCL Technologies Ltd",
+    "ASIANPAINT": "Asian Paints Ltd",
+    "MARUTI": "Maruti Suzuki India Ltd",
+    "TITAN": "Titan Company Ltd",
+    "SUNPHARMA": "Sun Pharmaceutical Industries Ltd",
+    "BAJFINANCE": "Bajaj Finance Ltd",
+    "WIPRO": "Wipro Ltd",
+    "NESTLEIND": "Nestle India Ltd",
+}
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Words this short only match by prefix; longer ones also match with one typo
+MIN_TYPO_LENGTH = 4
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def deletes(word):
+    """The word itself and every string one deletion away from it."""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def sorted_keys(pairs):
+    """(keys, rows) arrays of (key, row) pairs, sorted by key for np.searchsorted."""
+    pairs = sorted(pairs)
+    keys = np.array([key for key, _ in pairs], dtype="S") if pairs else np.zeros(0, dtype="S1")
+    return keys, np.array([row for _, row in pairs], dtype=np.int32)
+
+
+def postings(ids_by_key):
+    """(keys, pointers, ids) arrays of a {key: ids} dict: key k holds ids[pointers[k]:pointers[k + 1]]."""
+    keys = sorted(ids_by_key)
+    pointers = np.zeros(len(keys) + 1, dtype=np.int64)
+    pointers[1:] = np.cumsum([len(ids_by_key[key]) for key in keys])
+    ids = np.array([i for key in keys for i in sorted(ids_by_key[key])], dtype=np.int32)
+    return np.array(keys, dtype="S") if keys else np.zeros(0, dtype="S1"), pointers, ids
+
+
+def search_arrays(columns):
+    """
+    The lookup and search structures of IssuerIndex as arrays, built once with
+    the issuer cache file and stored in it.
+    """
+    rows = [columns.row(i) for i in range(columns.rows)]
+    names = [" ".join(words(row["name"])) for row in rows]
+    arrays = {}
+    # Later rows win, as in a dict
+    tables = {
+        "code": {row["code"].encode(): i for i, row in enumerate(rows)},
+        "symbol": {row["symbol"].upper().encode(): i for i, row in enumerate(rows)},
+        "isin": {row["isin"].upper().encode(): i for i, row in enumerate(rows) if row["isin"]},
+        # What get_stocks lists and clients send back
+        "name": {row["name"].upper().encode(): i for i, row in enumerate(rows) if row["name"]},
+    }
+    for table, ids in tables.items():
+        arrays[f"{table}_keys"], arrays[f"{table}_rows"] = sorted_keys(ids.items())
+    # Sorted names and symbols find "starts with the query" matches
+    arrays["name_prefix_keys"], arrays["name_prefix_rows"] = sorted_keys((name.encode(), i) for i, name in enumerate(names))
+    arrays["symbol_prefix_keys"], arrays["symbol_prefix_rows"] = sorted_keys((row["symbol"].lower().encode(), i) for i, row in enumerate(rows))
+    # Tie-break between equally good matches: shorter names first
+    order = np.zeros(len(rows), dtype=np.int32)
+    order[sorted(range(len(rows)), key=lambda i: (len(names[i]), names[i]))] = np.arange(len(rows))
+    arrays["order"] = order
+
+    # Sorted vocabulary for prefix ranges, delete index for one-typo matches
+    word_ids = {}
+    for i, row in enumerate(rows):
+        for word in set(words(row["name"])) | set(words(row["symbol"])):
+            word_ids.setdefault(word, set()).add(i)
+    arrays["word_keys"], arrays["word_pointers"], arrays["word_rows"] = postings(word_ids)
+    typo_words = {}
+    for w, word in enumerate(sorted(word_ids)):
+        if len(word) >= MIN_TYPO_LENGTH:
+            for variant in deletes(word):
+                typo_words.setdefault(variant, set()).add(w)
+    arrays["typo_keys"], arrays["typo_pointers"], arrays["typo_words"] = postings(typo_words)
+    return arrays
+
+
+def prefix_range(keys, prefix):
+    # A key longer than the array's width would make numpy cast the whole array
+    if len(prefix) > keys.itemsize:
+        return 0, 0
+    # Bytes starting with `prefix` sort between it and prefix padded with 0xff (never part of UTF-8)
+    return int(keys.searchsorted(prefix)), int(keys.searchsorted(prefix.ljust(keys.itemsize, b"\xff"), side="right"))
+
+
+class IssuerIndex:
+    """
+    Immutable snapshot of the issuer list. The lookup and search structures are
+    arrays of the memory-mapped cache file (see search_arrays), queried by
+    binary search, so workers share them instead of each building its own.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.arrays = columns.arrays
+        self.order = self.arrays["order"]
+
+    def _find(self, table, key):
+        keys = self.arrays[f"{table}_keys"]
+        if len(key) > keys.itemsize:
+            return None
+        i = int(keys.searchsorted(key))
+        if i < len(keys) and keys[i] == key:
+            return int(self.arrays[f"{table}_rows"][i])
+        return None
+
+    def _lookup_row(self, key):
+        key = str(key).strip()
+        if not key:
+            return None
+        i = self._find("code", key.encode())
+        if i is None:
+            i = self._find("symbol", key.upper().encode())
+        if i is None:
+            i = self._find("isin", key.upper().encode())
+        if i is None:
+            i = self._find("name", key.upper().encode())
+        return i
+
+    def lookup(self, key):
+        """Resolve a Security Code, Security Id, ISIN or Issuer Name to an issuer, or None."""
+        i = self._lookup_row(key)
+        return self.columns.row(i) if i is not None else None
+
+    def names(self):
+        return self.columns.text_column("name")
+
+    def _words_ids(self, start, stop):
+        # Issuers of the vocabulary words start..stop, one contiguous slice of the postings
+        pointers = self.arrays["word_pointers"]
+        return self.arrays["word_rows"][pointers[start]:pointers[stop]]
+
+    def _prefix_ids(self, prefix):
+        return set(self._words_ids(*prefix_range(self.arrays["word_keys"], prefix.encode())).tolist())
+
+    def _starts_with(self, table, prefix):
+        start, stop = prefix_range(self.arrays[f"{table}_keys"], prefix.encode())
+        return set(self.arrays[f"{table}_rows"][start:stop].tolist())
+
+    def _typo_ids(self, word):
+        keys = self.arrays["typo_keys"]
+        if len(word) < MIN_TYPO_LENGTH or not len(keys):
+            return set()
+        # All deletes of the word in one binary search, then the words they index
+        variants = np.array(sorted(v for v in deletes(word) if len(v) <= keys.itemsize), dtype=keys.dtype)
+        positions = np.minimum(keys.searchsorted(variants), len(keys) - 1)
+        positions = positions[keys[positions] == variants].tolist()
+        if not positions:
+            return set()
+        pointers = self.arrays["typo_pointers"]
+        typo_words = self.arrays["typo_words"]
+        candidates = np.unique(np.concatenate([typo_words[pointers[i]:pointers[i + 1]] for i in positions]))
+        return set(np.concatenate([self._words_ids(w, w + 1) for w in candidates.tolist()]).tolist())
+
+    def search(self, query, limit=10):
+        """Issuers matching every word of the query, best matches first."""
+        # Exact Security Code, Security Id or ISIN comes first
+        exact = self._lookup_row(query)
+        results = [self.columns.row(exact)] if exact is not None else []
+        query_words = words(query)
+        if not query_words:
+            return results
+
+        matched = None
+        typos = {}
+        for word in query_words:
+            ids = self._prefix_ids(word)
+            typo_ids = self._typo_ids(word) - ids
+            for i in typo_ids:
+                typos[i] = typos.get(i, 0) + 1
+            ids |= typo_ids
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return results
+
+        # Best first: no typos and the name or symbol starts with the query, then
+        # other typo-free matches, then typo matches; shorter names first within each
+        normalized = " ".join(query_words)
+        starts = self._starts_with("name_prefix", normalized) | self._starts_with("symbol_prefix", normalized)
+        clean = matched - typos.keys()
+        tiers = [clean & starts, clean - starts]
+        by_typos = {}
+        for i in matched & typos.keys():
+            by_typos.setdefault(typos[i], set()).add(i)
+        tiers += [by_typos[count] for count in sorted(by_typos)]
+
+        ranked = []
+        for tier in tiers:
+            ranked += heapq.nsmallest(limit + 1 - len(ranked), tier, key=self.order.__getitem__)
+            if len(ranked) > limit:
+                break
+        results += [self.columns.row(i) for i in ranked if i != exact]
+        return results[:limit]
+
+    def filter(self, offset=0, limit=50, **filters):
+        """Return (total, page) of issuers with their categories, filtered by categorical columns."""
+        rows = np.flatnonzero(self.columns.mask(**filters))
+        page = [self.columns.row(int(i), include_categories=True) for i in rows[offset:offset + limit]]
+        return len(rows), page
+
+    def facets(self, columns=None, **filters):
+        """Return (total, {column: {value: count}}) for the filtered issuers."""
+        mask = self.columns.mask(**filters)
+        return int(mask.sum()), self.columns.facets(mask, columns)
+
+
+def default_cache_path(path):
+    # One cache file per CSV, outside the source tree
+    root = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    name = f"{os.path.splitext(os.path.basename(path))[0]}-{digest}.cache"
+    return os.path.join(root, "financepro", name)
+
+
+def yfinance_ticker(issuer, stock_exchange):
+    """Yahoo Finance ticker of an issuer: its Security Id with the exchange suffix."""
+    return f"{issuer['symbol']}.{'BO' if stock_exchange == 'BSE' else 'NS'}"
+
+
+class IssuerRegistry:
+    """Thread-safe holder of the current IssuerIndex, reloaded when the CSV changes."""
+
+    def __init__(self, path, cache_path=None, check_interval=1.0):
+        self.path = path
+        self.cache_path = cache_path or default_cache_path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+        self._checked = 0.0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def _load(self, mtime):
+        started = time.perf_counter()
+        try:
+            columns = load_columns(self.path, self.cache_path, search_arrays)
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            print(f"Error loading stocks: {e}")
+            columns = None
+        if columns is None or not columns.rows:
+            if self._index is not None:
+                # Keep serving the last good copy
+                return
+            print(f"Warning: {self.path} not found. Using default stock list.")
+            columns = IssuerColumns.from_rows(
+                {TEXT_COLUMNS["code"]: s, TEXT_COLUMNS["name"]: n, TEXT_COLUMNS["symbol"]: s}
+                for s, n in DEFAULT_STOCKS.items()
+            )
+            columns.arrays.update(search_arrays(columns))
+        self._index = IssuerIndex(columns)
+        self._mtime = mtime
+        self.loads += 1
+        self.load_seconds = time.perf_counter() - started
+
+    def index(self):
+        """Current IssuerIndex, re-reading the CSV if its mtime changed."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked < self.check_interval:
+            return self._index
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if self._index is None or mtime != self._mtime:
+                self._load(mtime)
+            return self._index
+
+    def stats(self):
+        index = self._index
+        return {
+            "issuers": index.columns.rows if index else 0,
+            "loads": self.loads,
+            "load_ms": round(self.load_seconds * 1000, 2),
+            "mapped_bytes": sum(int(array.nbytes) for array in index.arrays.values()) if index else 0,
+        }
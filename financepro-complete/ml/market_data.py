@@ -0,0 +1,420 @@
+"""
+Local OHLC store in front of a pluggable market data provider.
+
+Bars are kept per ticker and interval as a NumPy structured array on disk
+(`<root>/<ticker>/<interval>.npy`, memory-mapped on read) with a small JSON
+sidecar recording how far back the data is complete and when the tail was
+last checked. A request is answered from the store; only the bars after the
+last stored one are fetched from the provider (or a backfill when a longer
+period than ever stored is asked for).
+
+Providers return prices adjusted for splits and dividends, which shifts every
+bar before a new split or ex-dividend date. So a tail that brings a corporate
+action newer than the last one recorded refetches the whole stored window
+instead of merging, and the store never mixes adjustment bases.
+
+Providers implement `fetch(ticker, interval, start, end)` returning a frame of
+Open/High/Low/Close/Volume (and Dividends/Stock Splits when known) indexed by
+timestamp, and `fetch_many` returning
+{ticker: frame} for `OhlcStore.history_many`, which refreshes a whole
+watchlist with one bulk download. YFinanceProvider is the live source,
+FixtureProvider reads CSV files for tests and air-gapped setups:
+
+    MARKET_DATA_PROVIDER=fixture MARKET_DATA_FIXTURES=fixtures/ uvicorn api:app
+
+pandas is imported on first use so importing this module stays cheap.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+BAR_DTYPE = np.dtype(
+    [("ts", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"), ("volume", "<f8")]
+)
+COLUMNS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+# Corporate actions: a non-zero value on a bar changes the adjustment of every earlier bar
+ACTION_COLUMNS = ("Dividends", "Stock Splits")
+
+# Calendar days covered by each yfinance period; "1d" and "5d" count trading sessions
+PERIOD_DAYS = {"1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653}
+SESSION_PERIODS = {"1d": 1, "5d": 5}
+
+# How far back a "max" request goes
+MAX_HISTORY_DAYS = 365 * 40
+
+
+# NSE/BSE regular session, Monday to Friday (exchange holidays not included)
+MARKET_TZ = "Asia/Kolkata"
+MARKET_OPEN = (9, 15)
+MARKET_CLOSE = (15, 30)
+
+
+class MarketDataError(RuntimeError):
+    pass
+
+
+def market_is_open(now=None):
+    local = (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(MARKET_TZ))
+    if local.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= (local.hour, local.minute) < MARKET_CLOSE
+
+
+class YFinanceProvider:
+    """Live bars from Yahoo Finance."""
+
+    def fetch(self, ticker, interval, start, end=None):
+        import yfinance as yf
+
+        history = yf.Ticker(ticker).history(start=start, end=end, interval=interval, actions=True)
+        return history[[c for c in (*COLUMNS, *ACTION_COLUMNS) if c in history.columns]]
+
+    def fetch_many(self, tickers, interval, start, end=None):
+        """{ticker: frame} from one multi-ticker download; tickers without data are left out."""
+        import yfinance as yf
+
+        if len(tickers) == 1:
+            return {tickers[0]: self.fetch(tickers[0], interval, start, end)}
+        data = yf.download(
+            list(tickers), start=start, end=end, interval=interval, group_by="ticker",
+            auto_adjust=True, actions=True, ignore_tz=False, progress=False, threads=True,
+        )
+        frames = {}
+        for ticker in tickers:
+            if data is None or ticker not in data.columns.get_level_values(0):
+                continue
+            frame = data[ticker].dropna(how="all", subset=[c for c in COLUMNS if c in data[ticker].columns])
+            frames[ticker] = frame[[c for c in (*COLUMNS, *ACTION_COLUMNS) if c in frame.columns]]
+        return frames
+
+
+class FixtureProvider:
+    """
+    Bars from `<directory>/<TICKER>_<interval>.csv` files (Date, Open, High,
+    Low, Close[, Volume][, Dividends, Stock Splits]).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, ticker, interval, start, end=None):
+        import pandas as pd
+
+        path = os.path.join(self.directory, f"{ticker}_{interval}.csv")
+        if not os.path.exists(path):
+            raise MarketDataError(f"No fixture for {ticker} {interval}")
+        frame = pd.read_csv(path)
+        index = pd.to_datetime(frame.pop("Date"), utc=True)
+        frame.index = pd.DatetimeIndex(index)
+        frame = frame[frame.index >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame.index < pd.Timestamp(end)]
+        return frame[[c for c in (*COLUMNS, *ACTION_COLUMNS) if c in frame.columns]]
+
+    def fetch_many(self, tickers, interval, start, end=None):
+        frames = {}
+        for ticker in tickers:
+            try:
+                frames[ticker] = self.fetch(ticker, interval, start, end)
+            except MarketDataError:
+                continue
+        return frames
+
+
+def get_provider(kind, fixtures_dir=None):
+    if kind == "yfinance":
+        return YFinanceProvider()
+    if kind == "fixture":
+        return FixtureProvider(fixtures_dir or "fixtures")
+    raise ValueError(f"Unknown market data provider: {kind}")
+
+
+def to_bars(frame):
+    import pandas as pd
+
+    bars = np.zeros(len(frame), dtype=BAR_DTYPE)
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    # Epoch seconds, whatever the index resolution
+    bars["ts"] = np.asarray((index - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1), dtype="i8")
+    for column, field in COLUMNS.items():
+        bars[field] = frame[column].to_numpy(dtype="f8") if column in frame.columns else np.nan
+    return bars
+
+
+def last_action(frame):
+    """Epoch seconds of the latest bar with a split or dividend in `frame`, or None."""
+    import pandas as pd
+
+    flags = [frame[c].fillna(0).to_numpy() != 0 for c in ACTION_COLUMNS if c in frame.columns]
+    actions = np.logical_or.reduce(flags) if flags else np.zeros(len(frame), dtype=bool)
+    if not actions.any():
+        return None
+    index = pd.DatetimeIndex(frame.index[actions])
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    return int(index[-1].timestamp())
+
+
+def to_frame(bars, tz):
+    import pandas as pd
+
+    index = pd.to_datetime(bars["ts"], unit="s", utc=True).tz_convert(tz)
+    return pd.DataFrame({column: bars[field] for column, field in COLUMNS.items()}, index=index)
+
+
+def merge_bars(stored, fetched):
+    """Union of two bar arrays ordered by time, fetched bars winning on equal timestamps."""
+    if not len(stored):
+        merged = fetched
+    elif not len(fetched):
+        return stored
+    else:
+        merged = np.concatenate([stored[stored["ts"] < fetched["ts"][0]], fetched, stored[stored["ts"] > fetched["ts"][-1]]])
+    order = np.argsort(merged["ts"], kind="stable")
+    merged = merged[order]
+    # Keep the last of duplicate timestamps
+    keep = np.append(merged["ts"][1:] != merged["ts"][:-1], True)
+    return merged[keep]
+
+
+class OhlcStore:
+    def __init__(self, root, provider, refresh_seconds=300):
+        self.root = root
+        self.provider = provider
+        self.refresh_seconds = refresh_seconds
+        # Locks disappear once no thread holds or waits on them
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_lock = threading.Lock()
+        self.hits = 0
+        self.tail_fetches = 0
+        self.backfills = 0
+        self.refetches = 0
+        self.fetched_bars = 0
+        self.errors = 0
+
+    def _lock(self, key):
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[key] = lock
+            return lock
+
+    def _paths(self, ticker, interval):
+        directory = os.path.join(self.root, ticker.replace("/", "_"))
+        return os.path.join(directory, f"{interval}.npy"), os.path.join(directory, f"{interval}.json")
+
+    def _read(self, ticker, interval):
+        bars_path, meta_path = self._paths(ticker, interval)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            bars = np.load(bars_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return np.zeros(0, dtype=BAR_DTYPE), {}
+        return bars, meta
+
+    def _write(self, ticker, interval, bars, meta):
+        bars_path, meta_path = self._paths(ticker, interval)
+        directory = os.path.dirname(bars_path)
+        os.makedirs(directory, exist_ok=True)
+        for path, write in (
+            (bars_path, lambda f: np.save(f, np.ascontiguousarray(bars))),
+            (meta_path, lambda f: f.write(json.dumps(meta).encode())),
+        ):
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ohlc-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    write(f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    @staticmethod
+    def period_start(period, now):
+        """Earliest time a request for `period` needs data from."""
+        if period == "max":
+            return now - timedelta(days=MAX_HISTORY_DAYS)
+        if period == "ytd":
+            return now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        if period in SESSION_PERIODS:
+            # Enough calendar days to contain the sessions across weekends and holidays
+            return now - timedelta(days=SESSION_PERIODS[period] * 2 + 4)
+        if period in PERIOD_DAYS:
+            return now - timedelta(days=PERIOD_DAYS[period])
+        raise MarketDataError(f"Unsupported period: {period}")
+
+    def _fetch(self, ticker, interval, start, end=None):
+        return self._converted(self.provider.fetch(ticker, interval, start, end))
+
+    def _converted(self, frame):
+        bars = to_bars(frame)
+        self.fetched_bars += len(bars)
+        tz = str(frame.index.tz) if getattr(frame.index, "tz", None) is not None else None
+        return bars, tz, last_action(frame)
+
+    @staticmethod
+    def _refetch_from(meta, needed, action):
+        """
+        Where to refetch the whole stored window from when a tail brings a
+        split or dividend not seen before (stored bars use the old adjustment).
+        """
+        if needed[0] != "tail" or action is None or action <= meta.get("last_action", -1):
+            return None
+        return ("refetch", datetime.fromtimestamp(meta["covered_from"], timezone.utc))
+
+    def _needed_from(self, bars, meta, start):
+        """Where a refresh has to fetch from: ("backfill" | "tail", since), or None to serve the store."""
+        covered_from = meta.get("covered_from")
+        if not len(bars) or covered_from is None or start.timestamp() < covered_from:
+            # Nothing stored for this far back yet: fetch the whole window once
+            return "backfill", start
+        if time.time() - meta.get("checked_at", 0) >= self.refresh_seconds:
+            # Only the tail since the last stored bar (re-fetched, it may have been partial)
+            return "tail", datetime.fromtimestamp(int(bars["ts"][-1]), timezone.utc)
+        return None
+
+    def _frame(self, bars, tz, start, period):
+        frame = to_frame(bars[bars["ts"] >= int(start.timestamp())], tz)
+        if period in SESSION_PERIODS and len(frame):
+            sessions = frame.index.normalize().unique()[-SESSION_PERIODS[period]:]
+            frame = frame[frame.index.normalize().isin(sessions)]
+        return frame
+
+    def history(self, ticker, interval, period):
+        """OHLC frame for `period` of `interval` bars, served from the store where possible."""
+        now = datetime.now(timezone.utc)
+        start = self.period_start(period, now)
+        key = (ticker, interval)
+        with self._lock(key):
+            bars, meta = self._read(ticker, interval)
+            tz = meta.get("tz") or "UTC"
+            changed = False
+            needed = self._needed_from(bars, meta, start)
+            try:
+                if needed is not None:
+                    fetched, fetched_tz, action = self._fetch(ticker, interval, needed[1])
+                    refetch = self._refetch_from(meta, needed, action)
+                    if refetch is not None:
+                        needed = refetch
+                        fetched, fetched_tz, action = self._fetch(ticker, interval, needed[1])
+                    bars, tz, changed = self._merge(bars, meta, tz, fetched, fetched_tz, action, needed, start)
+                else:
+                    self.hits += 1
+            except Exception:
+                self.errors += 1
+                if not len(bars):
+                    raise
+                # Serve what is stored when the provider is unavailable
+                print(f"Error refreshing {ticker} {interval}, serving stored bars")
+
+            if changed:
+                self._commit(ticker, interval, bars, meta, tz)
+
+        return self._frame(bars, tz, start, period)
+
+    def _merge(self, bars, meta, tz, fetched, fetched_tz, action, needed, start):
+        if action is not None:
+            meta["last_action"] = max(action, meta.get("last_action", -1))
+        if needed[0] == "refetch":
+            # The whole window in the new adjustment replaces the stored bars
+            self.refetches += 1
+            return fetched, fetched_tz or tz, True
+        if needed[0] == "backfill":
+            self.backfills += 1
+            meta["covered_from"] = start.timestamp()
+        else:
+            self.tail_fetches += 1
+        return merge_bars(np.array(bars), fetched), fetched_tz or tz, True
+
+    def _commit(self, ticker, interval, bars, meta, tz):
+        meta["tz"] = tz
+        meta["checked_at"] = time.time()
+        self._write(ticker, interval, bars, meta)
+
+    def history_many(self, tickers, interval, period):
+        """
+        {ticker: frame or exception} for several tickers, refreshing every
+        ticker that needs it with one bulk provider download from the earliest
+        point any of them needs.
+        """
+        now = datetime.now(timezone.utc)
+        start = self.period_start(period, now)
+        tickers = list(dict.fromkeys(tickers))
+        # Lock in a fixed order so concurrent batches can't deadlock
+        locks = [self._lock((ticker, interval)) for ticker in sorted(tickers)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            stored = {ticker: self._read(ticker, interval) for ticker in tickers}
+            needed = {}
+            for ticker, (bars, meta) in stored.items():
+                plan = self._needed_from(bars, meta, start)
+                if plan is None:
+                    self.hits += 1
+                else:
+                    needed[ticker] = plan
+
+            fetched = {}
+            fetch_error = None
+            if needed:
+                since = min(plan[1] for plan in needed.values())
+                try:
+                    fetched = self.provider.fetch_many(list(needed), interval, since)
+                except Exception as e:
+                    fetch_error = e
+
+            results = {}
+            for ticker, (bars, meta) in stored.items():
+                tz = meta.get("tz") or "UTC"
+                if ticker in needed:
+                    if ticker in fetched:
+                        new_bars, fetched_tz, action = self._converted(fetched[ticker])
+                        plan = needed[ticker]
+                        refetch = self._refetch_from(meta, plan, action)
+                        if refetch is not None:
+                            try:
+                                plan = refetch
+                                new_bars, fetched_tz, action = self._fetch(ticker, interval, plan[1])
+                            except Exception:
+                                # Keep the stored bars until the window can be refetched
+                                self.errors += 1
+                                print(f"Error refetching {ticker} {interval}, serving stored bars")
+                                results[ticker] = self._frame(bars, tz, start, period)
+                                continue
+                        bars, tz, _ = self._merge(bars, meta, tz, new_bars, fetched_tz, action, plan, start)
+                        self._commit(ticker, interval, bars, meta, tz)
+                    else:
+                        self.errors += 1
+                        if not len(bars):
+                            results[ticker] = fetch_error or MarketDataError(f"No data for {ticker} {interval}")
+                            continue
+                        print(f"Error refreshing {ticker} {interval}, serving stored bars")
+                results[ticker] = self._frame(bars, tz, start, period)
+            return results
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def stats(self):
+        requests = self.hits + self.tail_fetches + self.backfills + self.refetches
+        return {
+            "hits": self.hits,
+            "tail_fetches": self.tail_fetches,
+            "backfills": self.backfills,
+            "refetches": self.refetches,
+            "fetched_bars": self.fetched_bars,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+        }
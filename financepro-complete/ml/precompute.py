@@ -0,0 +1,290 @@
+"""
+Precomputed stock predictions for the most requested tickers.
+
+Every worker counts prediction requests per ticker and adds the counts to a
+shared SQLite file now and then (RequestCounter). On one worker
+PrecomputeScheduler wakes on a cron schedule (by default shortly after the
+NSE close on weekdays), takes the top N tickers by request count, computes
+their predictions and stores each as a new version in PredictionStore;
+counts are then decayed so the ranking follows recent demand.
+get_stock_prediction serves a stored result while it is younger than the
+freshness window and was computed with the current model configuration.
+
+Results are stored as JSON documents, never pickles: the file is shared, and
+unpickling runs whatever code the bytes ask for. A scheduled run waits until
+`ready()` (the sentiment model is loaded) so no result carries the neutral
+sentiment served while it loads.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from market_data import MARKET_CLOSE, MARKET_TZ
+
+# Upper bound on a single sleep so wall clock changes are picked up
+MAX_SLEEP_SECONDS = 3600
+
+# How often a due run checks whether the app became ready
+READY_POLL_SECONDS = 5
+
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def parse_cron_field(field, low, high):
+    """Values matched by one cron field: *, n, a-b, lists and /step."""
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(v) for v in spec.split("-", 1))
+        else:
+            start = int(spec)
+            end = high if step else start
+        if start < low or end > high or start > end or (step and int(step) < 1):
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, int(step or 1)))
+    return values
+
+
+class CronSchedule:
+    """Minute hour day-of-month month day-of-week, evaluated in `tz`."""
+
+    def __init__(self, expression, tz=MARKET_TZ):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.tz = ZoneInfo(tz)
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            sorted(parse_cron_field(field, *bounds)) for field, bounds in zip(fields, CRON_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}  # 0 and 7 are both Sunday
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        # Both restricted: cron matches either
+        return in_days or in_weekdays
+
+    def next_after(self, now):
+        """First matching time strictly after `now` (aware datetime), or None within a year."""
+        local = now.astimezone(self.tz)
+        day = local.date()
+        for _ in range(366):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=self.tz)
+                        if candidate > local:
+                            return candidate
+            day += timedelta(days=1)
+        return None
+
+
+def after_close_cron(minutes_after):
+    """Cron expression for `minutes_after` the market close on weekdays."""
+    close = datetime(2000, 1, 1, *MARKET_CLOSE) + timedelta(minutes=minutes_after)
+    return f"{close.minute} {close.hour} * * 1-5"
+
+
+class PredictionStore:
+    """Versioned prediction results and request counts in one SQLite file."""
+
+    def __init__(self, path, keep_versions=3):
+        self.path = path
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " ticker TEXT NOT NULL, version INTEGER NOT NULL, config TEXT NOT NULL,"
+            " created_at REAL NOT NULL, payload BLOB NOT NULL, PRIMARY KEY (ticker, version))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS requests (ticker TEXT PRIMARY KEY, name TEXT, count REAL NOT NULL)"
+        )
+
+    def add_requests(self, counts):
+        """Add {ticker: (count, name)} to the shared request counts."""
+        if not counts:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany(
+                "INSERT INTO requests (ticker, name, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (ticker) DO UPDATE SET count = count + excluded.count, name = excluded.name",
+                [(ticker, name, count) for ticker, (count, name) in counts.items()],
+            )
+            self._db.execute("COMMIT")
+
+    def top_requested(self, n):
+        with self._lock:
+            return self._db.execute(
+                "SELECT ticker, name FROM requests ORDER BY count DESC, ticker LIMIT ?", (n,)
+            ).fetchall()
+
+    def decay_requests(self, factor, min_count=0.01):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("UPDATE requests SET count = count * ?", (factor,))
+            self._db.execute("DELETE FROM requests WHERE count < ?", (min_count,))
+            self._db.execute("COMMIT")
+
+    def put(self, ticker, config, result):
+        """Store `result` (JSON-serializable) as the next version for `ticker`, keeping the last `keep_versions`."""
+        payload = json.dumps(result).encode()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            (latest,) = self._db.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM results WHERE ticker = ?", (ticker,)
+            ).fetchone()
+            version = latest + 1
+            self._db.execute(
+                "INSERT INTO results (ticker, version, config, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+                (ticker, version, config, time.time(), payload),
+            )
+            self._db.execute(
+                "DELETE FROM results WHERE ticker = ? AND version <= ?", (ticker, version - self.keep_versions)
+            )
+            self._db.execute("COMMIT")
+        return version
+
+    def get(self, ticker, config, max_age):
+        """(result, version, created_at) of the newest version if fresh and built with `config`, else None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, config, created_at, payload FROM results WHERE ticker = ? "
+                "ORDER BY version DESC LIMIT 1",
+                (ticker,),
+            ).fetchone()
+        if row is None:
+            return None
+        version, stored_config, created_at, payload = row
+        if stored_config != config or time.time() - created_at > max_age:
+            return None
+        try:
+            result = json.loads(payload)
+        except ValueError:
+            # Not a JSON result (a file from an older version): recompute rather than decode it
+            return None
+        return result, version, created_at
+
+    def close(self):
+        self._db.close()
+
+
+class RequestCounter:
+    """Per-worker request counts, added to the store every `flush_interval` seconds."""
+
+    def __init__(self, store, flush_interval=60.0):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._counts = {}
+        self.recorded = 0
+        self.served = {"precomputed": 0, "on_demand": 0}
+
+    def record(self, ticker, name):
+        count, _ = self._counts.get(ticker, (0, name))
+        self._counts[ticker] = (count + 1, name)
+        self.recorded += 1
+
+    async def flush(self, run):
+        """Add the counts so far to the store, `run` executing the blocking write."""
+        counts, self._counts = self._counts, {}
+        try:
+            await run(self.store.add_requests, counts)
+        except Exception as e:
+            print(f"Error saving prediction request counts: {e}")
+            for ticker, (count, name) in counts.items():
+                pending, _ = self._counts.get(ticker, (0, name))
+                self._counts[ticker] = (pending + count, name)
+
+    async def run_flusher(self, run):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(run)
+
+    def stats(self):
+        return {"recorded": self.recorded, "pending": len(self._counts), "served": dict(self.served)}
+
+
+class PrecomputeScheduler:
+    def __init__(self, store, counter, compute, config, schedule, top_n=50, decay=0.5, ready=None):
+        self.store = store
+        self.counter = counter
+        self.compute = compute  # async [(ticker, name)] -> async iterator of (ticker, result or exception)
+        self.config = config  # model configuration the results are valid for
+        self.schedule = schedule
+        self.top_n = top_n
+        self.decay = decay
+        self.ready = ready  # () -> bool, a due run waits until it is true
+        self.waiting_ready = False
+        self.next_run = None
+        self.runs = 0
+        self.computed = 0
+        self.failed = 0
+        self.last_run_seconds = 0.0
+        self.last_run_at = None
+
+    async def run(self, run):
+        """Sleep until each scheduled time and precompute; `run` executes blocking store calls."""
+        while True:
+            self.next_run = self.schedule.next_after(datetime.now(timezone.utc))
+            if self.next_run is None:
+                return
+            while True:
+                remaining = (self.next_run - datetime.now(timezone.utc)).total_seconds()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, MAX_SLEEP_SECONDS))
+            self.waiting_ready = self.ready is not None and not self.ready()
+            while self.waiting_ready:
+                await asyncio.sleep(READY_POLL_SECONDS)
+                self.waiting_ready = not self.ready()
+            try:
+                await self.run_once(run)
+            except Exception as e:
+                print(f"Error precomputing predictions: {e}")
+
+    async def run_once(self, run):
+        started = time.perf_counter()
+        await self.counter.flush(run)
+        top = await run(self.store.top_requested, self.top_n)
+        async for ticker, result in self.compute(top):
+            if isinstance(result, Exception):
+                self.failed += 1
+                print(f"Error precomputing {ticker}: {result}")
+                continue
+            await run(self.store.put, ticker, self.config, result)
+            self.computed += 1
+        await run(self.store.decay_requests, self.decay)
+        self.runs += 1
+        self.last_run_seconds = time.perf_counter() - started
+        self.last_run_at = datetime.now(timezone.utc).isoformat()
+
+    def stats(self):
+        return {
+            "schedule": self.schedule.expression,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "waiting_ready": self.waiting_ready,
+            "top_n": self.top_n,
+            "runs": self.runs,
+            "computed": self.computed,
+            "failed": self.failed,
+            "last_run_at": self.last_run_at,
+            "last_run_ms": round(self.last_run_seconds * 1000, 1),
+        }
@@ -0,0 +1,88 @@
+"""
+TTL cache with single-flight loading for upstream quote/fundamentals calls.
+
+Concurrent misses for the same key share one upstream call. While the market
+is open, an entry past its TTL but within `stale_seconds` is returned at once
+and refreshed in the background (stale-while-revalidate); outside market hours
+quotes do not move, so entries live for `closed_ttl` instead.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class SingleFlightCache:
+    def __init__(self, loader, ttl=60.0, stale_seconds=300.0, closed_ttl=3600.0, max_entries=1000, is_open=None):
+        self.loader = loader  # async callable: key -> value
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self.closed_ttl = closed_ttl
+        self.max_entries = max_entries
+        self.is_open = is_open or (lambda: True)
+        self._entries = OrderedDict()  # key -> (value, loaded_at)
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    async def get(self, key):
+        open_now = self.is_open()
+        ttl = self.ttl if open_now else self.closed_ttl
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, loaded_at = entry
+            age = time.monotonic() - loaded_at
+            if age < ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if open_now and age < ttl + self.stale_seconds:
+                self.stale_hits += 1
+                self._load(key)
+                return value
+
+        self.misses += 1
+        if key in self._inflight:
+            self.coalesced += 1
+        # shield: a cancelled request must not cancel the load other requests wait on
+        return await asyncio.shield(self._load(key))
+
+    def _load(self, key):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch(self, key):
+        try:
+            self.upstream_calls += 1
+            value = await self.loader(key)
+        except Exception:
+            self.upstream_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
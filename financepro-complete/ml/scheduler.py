@@ -0,0 +1,147 @@
+"""
+Background scheduler that turns recurring transactions into real ones.
+
+A single min-heap holds (next_date, user, recurring_id) for every recurring
+transaction of every user. The scheduler sleeps until the earliest entry is
+due, posts everything that is due grouped per user (one storage batch per
+user), advances `next_date` and pushes the entry back. Missed intervals, e.g.
+after downtime, are caught up with one transaction per interval.
+
+The heap is rebuilt from storage every `rescan_interval` seconds, so entries
+added through other workers are picked up. Storage only advances a
+`next_date` that is still the one the transactions were computed from, in the
+same commit as the append, so two schedulers never post an interval twice.
+"""
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Upper bound on a single sleep so wall clock changes are picked up
+MAX_SLEEP_SECONDS = 3600
+
+# How often the heap is rebuilt from storage
+RESCAN_SECONDS = 300
+
+# Delay before retrying a user whose recurring transactions failed to post
+RETRY_SECONDS = 60
+
+
+class RecurringScheduler:
+    def __init__(self, store, locks, run=None, batch_size=500, rescan_interval=RESCAN_SECONDS):
+        self.store = store
+        self.locks = locks
+        # async callable(fn, *args) running the blocking storage calls off the event loop
+        self.run_blocking = run or asyncio.to_thread
+        self.batch_size = batch_size
+        self.rescan_interval = rescan_interval
+        self._rescan_at = None
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self.posted = 0
+        self.runs = 0
+
+    async def load(self):
+        """Fill the heap from storage, at startup and then every rescan_interval."""
+        rows = await self.run_blocking(self._recurring_rows)
+        self._heap = [
+            (datetime.strptime(next_date, DATE_FORMAT), user, recurring_id)
+            for user, recurring_id, next_date in rows
+        ]
+        heapq.heapify(self._heap)
+        self._rescan_at = datetime.now() + timedelta(seconds=self.rescan_interval)
+
+    def _recurring_rows(self):
+        return list(self.store.iter_recurring())
+
+    def schedule(self, user, entry):
+        """Register a new or changed recurring transaction."""
+        due = datetime.strptime(entry["next_date"], DATE_FORMAT)
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, user, entry["id"]))
+        if earliest is None or due < earliest:
+            self._wakeup.set()
+
+    async def run(self):
+        while True:
+            now = datetime.now()
+            if self._rescan_at is None or self._rescan_at <= now:
+                await self.load()
+            if self._heap and self._heap[0][0] <= now:
+                await self.post_due(now)
+                continue
+
+            timeout = min(MAX_SLEEP_SECONDS, (self._rescan_at - now).total_seconds())
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def post_due(self, now):
+        # Pop up to batch_size due entries and group them per user
+        due = {}
+        popped = 0
+        while self._heap and self._heap[0][0] <= now and popped < self.batch_size:
+            _, user, recurring_id = heapq.heappop(self._heap)
+            due.setdefault(user, set()).add(recurring_id)
+            popped += 1
+
+        self.runs += 1
+        for user, recurring_ids in due.items():
+            async with self.locks(user):
+                try:
+                    await self._post_user(user, recurring_ids, now)
+                except Exception as e:
+                    print(f"Error posting recurring transactions for {user}: {e}")
+                    retry = now + timedelta(seconds=RETRY_SECONDS)
+                    for recurring_id in recurring_ids:
+                        heapq.heappush(self._heap, (retry, user, recurring_id))
+            # Let request handlers run between users
+            await asyncio.sleep(0)
+
+    async def _post_user(self, user, recurring_ids, now):
+        user_data = await self.run_blocking(self.store.load_profile, user, ("recurring_transactions",))
+        if not user_data:
+            return
+
+        postings = []
+        for entry in user_data["recurring_transactions"]:
+            if entry.get("id") not in recurring_ids:
+                continue
+            next_date = datetime.strptime(entry["next_date"], DATE_FORMAT)
+            interval = timedelta(days=entry["interval_days"])
+            # Entries that are not due (anymore) already have their own heap item
+            if next_date <= now and interval.days > 0:
+                # One transaction per elapsed interval, dated when it was due
+                transactions = []
+                while next_date <= now:
+                    transactions.append({
+                        "amount": entry["amount"],
+                        "description": entry["description"],
+                        "category": entry["category"],
+                        "date": next_date.strftime(DATE_FORMAT),
+                    })
+                    next_date += interval
+                postings.append({
+                    "id": entry["id"],
+                    "next_date": entry["next_date"],
+                    "advance_to": next_date.strftime(DATE_FORMAT),
+                    "transactions": transactions,
+                })
+                heapq.heappush(self._heap, (next_date, user, entry["id"]))
+
+        if postings:
+            # Entries another worker advanced meanwhile are skipped by storage
+            self.posted += await self.run_blocking(self.store.post_recurring, user, postings)
+
+    def stats(self):
+        return {
+            "scheduled": len(self._heap),
+            "next_due": self._heap[0][0].strftime(DATE_FORMAT) if self._heap else None,
+            "runs": self.runs,
+            "posted": self.posted,
+        }
@@ -0,0 +1,290 @@
+"""
+Micro-batching front end for the sentiment model.
+
+Callers `await batcher.predict(texts)`. Texts arriving within `max_wait`
+seconds of each other (or until `max_batch` texts are queued) are scored with
+a single `predict` call in the executor pool and the labels are handed back
+to each caller in order.
+
+SentimentModelLoader downloads and loads the pyfin-sentiment model in the
+background after startup; until it is ready `predict` raises
+ModelNotReadyError. CachedSentiment puts a SentimentCache in front of the batcher so headlines
+that were already scored (syndicated news shows up under many tickers) skip
+the model entirely.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when the sentiment model has not finished loading."""
+
+
+class SentimentModelLoader:
+    def __init__(self, model_size, report):
+        self.model_size = model_size
+        self.report = report  # StartupReport receiving the load phases
+        self.model = None
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    def load(self):
+        """Download, load and warm up the model. Blocking."""
+        with self.report.phase("sentiment_import"):
+            from pyfin_sentiment.model import SentimentModel
+        with self.report.phase("sentiment_download"):
+            SentimentModel.download(self.model_size)
+        with self.report.phase("sentiment_load"):
+            model = SentimentModel(self.model_size)
+        with self.report.phase("sentiment_warmup"):
+            model.predict(["warm up"])
+        self.model = model
+
+    async def run(self, run, retry_seconds=30.0):
+        """Load in the background via `run`, retrying until it succeeds (e.g. no network yet)."""
+        while self.model is None:
+            self.attempts += 1
+            try:
+                await run(self.load)
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error loading sentiment model ({self.model_size}): {e}, retrying in {retry_seconds}s")
+                await asyncio.sleep(retry_seconds)
+        self.error = None
+
+    def predict(self, texts):
+        if self.model is None:
+            raise ModelNotReadyError("Sentiment model is still loading, try again later")
+        return self.model.predict(texts)
+
+    def status(self):
+        return {
+            "model_size": self.model_size,
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+class MicroBatcher:
+    def __init__(self, predict, run, max_batch=64, max_wait=0.005):
+        self.predict_fn = predict  # list of texts -> sequence of labels
+        self.run = run  # async callable(fn, *args) running fn off the event loop
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []  # (texts, future)
+        self._pending_texts = 0
+        self._flush_handle = None
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+
+    async def predict(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_texts += len(texts)
+        if self._pending_texts >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        self._pending_texts = 0
+        if pending:
+            asyncio.ensure_future(self._run_batch(pending))
+
+    async def _run_batch(self, pending):
+        texts = [text for batch, _ in pending for text in batch]
+        self.batches += 1
+        self.texts += len(texts)
+        self.largest_batch = max(self.largest_batch, len(texts))
+        try:
+            labels = list(await self.run(self.predict_fn, texts))
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        position = 0
+        for batch, future in pending:
+            if not future.done():
+                future.set_result(labels[position:position + len(batch)])
+            position += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._pending_texts,
+        }
+
+
+def normalize_text(text):
+    """Canonical form of a text for cache keys: NFKC, single spaces, trimmed."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class SentimentCache:
+    """
+    Sentiment labels keyed by sha256(model size + normalized text).
+
+    An in-memory LRU sits in front of an optional SQLite file that survives
+    restarts. The file records the model size it was filled by and is cleared
+    when opened with a different one.
+    """
+
+    def __init__(self, model_size, path=None, max_entries=10000, max_disk_entries=1000000):
+        self.model_size = model_size
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS labels (key TEXT PRIMARY KEY, label TEXT NOT NULL)")
+        row = db.execute("SELECT value FROM meta WHERE key = 'model_size'").fetchone()
+        if row is None or row[0] != self.model_size:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM labels")
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model_size', ?)", (self.model_size,))
+            db.execute("COMMIT")
+        self._db = db
+
+    def key(self, text):
+        data = f"{self.model_size}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def _remember(self, key, label):
+        self._entries[key] = label
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, keys):
+        """{key: label} for the keys held in memory."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                label = self._entries.get(key)
+                if label is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = label
+        self.hits += len(found)
+        return found
+
+    def load(self, keys):
+        """{key: label} for the keys found on disk; they are promoted to memory. Blocking."""
+        found = {}
+        if self._db is not None and keys:
+            keys = list(keys)
+            with self._lock:
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    found.update(self._db.execute(
+                        f"SELECT key, label FROM labels WHERE key IN ({placeholders})", chunk
+                    ).fetchall())
+                for key, label in found.items():
+                    self._remember(key, label)
+        self.disk_hits += len(found)
+        return found
+
+    def store(self, labels):
+        """Remember {key: label} in memory and on disk. Blocking."""
+        with self._lock:
+            for key, label in labels.items():
+                self._remember(key, label)
+            if self._db is not None and labels:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany("INSERT OR REPLACE INTO labels (key, label) VALUES (?, ?)", labels.items())
+                # Rowids grow with inserts, so this drops the oldest rows past the limit
+                self._db.execute(
+                    "DELETE FROM labels WHERE rowid <= (SELECT MAX(rowid) FROM labels) - ?",
+                    (self.max_disk_entries,),
+                )
+                self._db.execute("COMMIT")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedSentiment:
+    """Serves labels from a SentimentCache and sends only unseen texts to the batcher."""
+
+    def __init__(self, batcher, cache, run):
+        self.batcher = batcher
+        self.cache = cache
+        self.run = run  # async callable(fn, *args) for the blocking disk tier
+
+    async def predict(self, texts):
+        texts = list(texts)
+        keys = [self.cache.key(text) for text in texts]
+        labels = self.cache.lookup(keys)
+        missing = {key for key in keys if key not in labels}
+        if missing and self.cache.path:
+            labels.update(await self.run(self.cache.load, missing))
+
+        # Score each distinct unseen text once, even if it repeats within the call
+        unseen = {}
+        for key, text in zip(keys, texts):
+            if key not in labels and key not in unseen:
+                unseen[key] = text
+        if unseen:
+            self.cache.misses += len(unseen)
+            scored = await self.batcher.predict(list(unseen.values()))
+            fresh = {key: str(label) for key, label in zip(unseen, scored)}
+            labels.update(fresh)
+            if self.cache.path:
+                await self.run(self.cache.store, fresh)
+            else:
+                self.cache.store(fresh)
+        return [labels[key] for key in keys]
@@ -0,0 +1,223 @@
+"""
+Compact encoding of time series responses.
+
+In compact mode a date index is sent as a descriptor instead of a list of
+timestamps: {"start", "step_seconds", "count", "tz"} when the spacing is constant
+(the forecast and the forward-filled train/test series), {"epoch_days", "tz"}
+for local-midnight dates with gaps (trading days), or {"epoch_seconds"}
+otherwise. Values are float32 and each array is sent once (the test
+predictions share the test dates).
+
+Precomputed predictions are stored with the same index descriptors but
+float64 values (encode_prediction), so a stored result reads back exactly.
+
+The encoder follows the Accept header: msgpack when application/msgpack or
+application/x-msgpack is accepted at least as much as JSON (needs the optional
+msgpack package), JSON otherwise, through orjson when it is installed. Bodies
+of at least `gzip_min_bytes` are gzipped when Accept-Encoding allows it. Both
+headers are read with their q-values, and every response carries
+`Vary: Accept, Accept-Encoding`.
+"""
+import gzip
+import json
+import math
+
+import numpy as np
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: plain json is used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: msgpack responses are refused with 406
+    msgpack = None
+
+COMPACT_FORMAT = "compact-v1"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+# Most specific first: the first one listed in Accept gives the JSON quality
+JSON_TYPES = ("application/json", "application/*", "*/*")
+VARY = "Accept, Accept-Encoding"
+OHLC = ("Open", "High", "Low", "Close")
+
+
+def compact_index(index):
+    """Descriptor for a DatetimeIndex (see the module docstring)."""
+    import pandas as pd
+
+    tz = str(index.tz) if index.tz is not None else None
+    epoch = pd.Timestamp(0, tz="UTC") if tz else pd.Timestamp(0)
+    seconds = np.asarray((index - epoch) // pd.Timedelta(seconds=1), dtype="i8")
+    if len(index) >= 2:
+        steps = np.diff(seconds)
+        if steps[0] > 0 and (steps == steps[0]).all():
+            return {"start": index[0].isoformat(), "step_seconds": int(steps[0]), "count": len(index), "tz": tz}
+    local = index.tz_localize(None) if tz else index
+    if (local == local.normalize()).all():
+        days = (local - pd.Timestamp(0)) // pd.Timedelta(days=1)
+        return {"epoch_days": np.asarray(days, dtype="i8").tolist(), "tz": tz}
+    return {"epoch_seconds": seconds.tolist(), "tz": tz}
+
+
+def expand_index(descriptor):
+    """DatetimeIndex back from a compact_index descriptor."""
+    import pandas as pd
+
+    if "start" in descriptor:
+        start = pd.Timestamp(descriptor["start"])
+        start = start.tz_convert(descriptor["tz"]) if descriptor["tz"] else start
+        return pd.DatetimeIndex(start + pd.to_timedelta(np.arange(descriptor["count"]) * descriptor["step_seconds"], unit="s"))
+    if "epoch_days" in descriptor:
+        index = pd.DatetimeIndex(pd.to_datetime(descriptor["epoch_days"], unit="D"))
+        return index.tz_localize(descriptor["tz"]) if descriptor["tz"] else index
+    index = pd.DatetimeIndex(pd.to_datetime(descriptor["epoch_seconds"], unit="s", utc=True))
+    return index.tz_convert(descriptor["tz"]) if descriptor["tz"] else index.tz_localize(None)
+
+
+def compact_values(values):
+    return np.asarray(values, dtype="f4")
+
+
+def compact_prediction(train_df, test_df, forecast, predictions, sentiment_analysis, stock_data=None):
+    """Compact form of a get_stock_prediction response (historical_data only if `stock_data` is given)."""
+    payload = {"format": COMPACT_FORMAT}
+    if stock_data is not None:
+        payload["historical_data"] = {"dates": compact_index(stock_data.index)}
+        for column in OHLC:
+            payload["historical_data"][column.lower()] = compact_values(stock_data[column])
+    payload["stock_prediction"] = {
+        "train_dates": compact_index(train_df.index),
+        "train_close": compact_values(train_df["Close"]),
+        "test_dates": compact_index(test_df.index),
+        "test_close": compact_values(test_df["Close"]),
+        "forecast_dates": compact_index(forecast.index),
+        "forecast": compact_values(forecast),
+        # Same dates as test_close
+        "test_predictions": compact_values(predictions),
+    }
+    payload["sentiment_analysis"] = sentiment_analysis
+    return payload
+
+
+def encode_prediction(result):
+    """JSON-ready record of a generate_stock_prediction tuple, for the prediction store."""
+    train_df, test_df, forecast, predictions, sentiment_score, news_articles = result
+
+    def series(values):
+        return {"index": compact_index(values.index), "values": values.to_numpy(dtype="f8").tolist()}
+
+    return {
+        "train_close": series(train_df["Close"]),
+        "test_close": series(test_df["Close"]),
+        "forecast": series(forecast),
+        "predictions": series(predictions),
+        "sentiment_score": float(sentiment_score),
+        "news_articles": news_articles,
+    }
+
+
+def decode_prediction(record):
+    """The generate_stock_prediction tuple back from an encode_prediction record."""
+    import pandas as pd
+
+    def series(data, name=None):
+        return pd.Series(data["values"], index=expand_index(data["index"]), dtype="f8", name=name)
+
+    return (
+        series(record["train_close"], "Close").to_frame(),
+        series(record["test_close"], "Close").to_frame(),
+        series(record["forecast"]),
+        series(record["predictions"]),
+        record["sentiment_score"],
+        record["news_articles"],
+    )
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def _plain(value):
+    """Python builtins for the json module: float32 arrays as short floats, NaN as null."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.ndarray):
+        # str of a float32 is its shortest round-tripping form
+        return [None if math.isnan(v) else float(str(v)) for v in value]
+    return value
+
+
+def encode_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_plain(payload), default=_default, separators=(",", ":")).encode()
+
+
+def encode_msgpack(payload):
+    if msgpack is None:
+        raise ValueError("msgpack responses are not available on this server")
+
+    def arrays(value):
+        if isinstance(value, dict):
+            return {key: arrays(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [arrays(item) for item in value]
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return value
+
+    return msgpack.packb(arrays(payload), default=_default, use_single_float=True)
+
+
+def qualities(header):
+    """{token: q} of an Accept or Accept-Encoding header, tokens lowercased, q=1 when not given."""
+    parsed = {}
+    for item in (header or "").split(","):
+        token, *params = [part.strip() for part in item.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        parsed.setdefault(token.lower(), q)
+    return parsed
+
+
+def wants_msgpack(accept):
+    """True if msgpack is acceptable and not less preferred than JSON; wildcards count for JSON only."""
+    accepted = qualities(accept)
+    msgpack_q = max(accepted.get(media_type, 0.0) for media_type in MSGPACK_TYPES)
+    json_q = next((accepted[media_type] for media_type in JSON_TYPES if media_type in accepted), 0.0)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def accepts_gzip(accept_encoding):
+    accepted = qualities(accept_encoding)
+    q = next((accepted[coding] for coding in ("gzip", "x-gzip", "*") if coding in accepted), 0.0)
+    return q > 0
+
+
+def render(payload, accept=None, accept_encoding=None, gzip_min_bytes=1024):
+    """Response with `payload` encoded for the Accept header, gzipped when large and accepted."""
+    if wants_msgpack(accept):
+        body, media_type = encode_msgpack(payload), "application/msgpack"
+    else:
+        body, media_type = encode_json(payload), "application/json"
+    headers = {"Vary": VARY}
+    if len(body) >= gzip_min_bytes and accepts_gzip(accept_encoding):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=media_type, headers=headers)
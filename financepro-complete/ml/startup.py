@@ -0,0 +1,42 @@
+"""
+Startup timing report.
+
+Sequential phases of the module import are recorded with `mark` (time since
+the previous mark); background work after startup, which may overlap, uses
+the `phase` context manager. `ready()` stamps the time from process start to
+the point the app can serve every endpoint.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    def __init__(self, started=None):
+        self.started = started or time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+        self.ready_seconds = None
+
+    def mark(self, name):
+        """Record the time since the previous mark as phase `name`."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def ready(self):
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self.started
+
+    def report(self):
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "ready_ms": round(self.ready_seconds * 1000, 1) if self.ready_seconds is not None else None,
+        }
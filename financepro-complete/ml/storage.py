@@ -0,0 +1,1211 @@
+"""
+User data storage backends.
+
+`load_user_data` / `save_user_data` in api.py go through one of these backends.
+JsonFileBackend keeps the original users_data.json layout, SqliteBackend keeps
+every user's rows in indexed tables so one user's write only touches that user.
+
+Transactions are an append-only log per user. Running aggregates (total,
+per-category and per-month sums) are updated on every append and can be
+checked or rebuilt by replaying the log. Monthly rollups by category and sign
+(income / expenditure) are kept the same way for analytics:
+
+    python storage.py verify [--user USER] [--rebuild]
+
+Bills are indexed by id and due date; reminder jobs can sweep every user's
+pending bills without loading user records:
+
+    python storage.py due-bills --days 3
+
+Writes are described as operations, ("save", user, record) or
+("append", user, transactions), so a GroupCommitter can merge the writes that
+arrive within a short window into a single commit.
+"""
+import argparse
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+import weakref
+
+
+# Bump when a new aggregate is added so existing databases get one replay
+AGGREGATES_VERSION = "3"
+
+BUDGET_PERIODS = ("all", "monthly", "weekly")
+
+# Keys of a user record kept beside the transaction log
+LOG_KEYS = ("transactions", "aggregates")
+
+# Everything else: what load_profile returns
+PROFILE_FIELDS = ("password", "recurring_transactions", "budget", "budget_periods", "savings_goal", "savings", "bills")
+
+
+def new_record_id():
+    """Stable id for recurring transactions and bills."""
+    return uuid.uuid4().hex
+
+
+def backfill_ids(data):
+    # Records created before entries had ids get one; returns True if anything changed
+    changed = False
+    for entry in data.get("recurring_transactions", []) + data.get("bills", []):
+        if not entry.get("id"):
+            entry["id"] = new_record_id()
+            changed = True
+    return changed
+
+
+def encode_cursor(date, transaction_id):
+    """Opaque keyset cursor pointing just after (date, id)."""
+    return base64.urlsafe_b64encode(json.dumps([date, transaction_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return date, int(transaction_id)
+
+
+def bill_sort_key(bill):
+    # Bills without a due date sort last
+    return (bill.get("due_date") or "9999-12-31", bill.get("date_added") or "")
+
+
+def empty_aggregates():
+    return {"total": 0.0, "count": 0, "categories": {}, "months": {}, "category_periods": {}, "rollups": {}}
+
+
+def apply_to_aggregates(aggregates, transaction):
+    """Fold one transaction into the running aggregates in O(1)."""
+    amount = transaction["amount"]
+    aggregates["total"] += amount
+    aggregates["count"] += 1
+    category = transaction["category"]
+    aggregates["categories"][category] = aggregates["categories"].get(category, 0.0) + amount
+    month = month_key(transaction.get("date"))
+
+    # Monthly rollup by category and sign; undated transactions roll up under ""
+    if amount:
+        rollup = aggregates["rollups"].setdefault(month or "", {}).setdefault(category, [0.0, 0.0])
+        rollup[0 if amount > 0 else 1] += amount
+    if month:
+        aggregates["months"][month] = aggregates["months"].get(month, 0.0) + amount
+
+        # Per-category totals for each budget window the transaction falls in
+        periods = aggregates["category_periods"].setdefault(category, {})
+        for key in (month, week_key(transaction["date"])):
+            periods[key] = periods.get(key, 0.0) + amount
+    return aggregates
+
+
+def replay_aggregates(transactions):
+    aggregates = empty_aggregates()
+    for transaction in transactions:
+        apply_to_aggregates(aggregates, transaction)
+    return aggregates
+
+
+def month_key(date):
+    # Dates are stored as "YYYY-MM-DD[ HH:MM:SS]"
+    return date[:7] if date else None
+
+
+def week_key(date):
+    year, week, _ = datetime.strptime(date[:10], "%Y-%m-%d").isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def period_key(period, date):
+    """Key of the budget window ("all", "monthly" or "weekly") containing `date`."""
+    if period == "monthly":
+        return month_key(date)
+    if period == "weekly":
+        return week_key(date)
+    return "all"
+
+
+def profile_of(record):
+    """The user record without its transaction log: what the handlers read and save."""
+    return {key: value for key, value in record.items() if key not in LOG_KEYS}
+
+
+def merge_record(stored, record):
+    # Fields missing from a saved record keep their stored values; a new log drops the old aggregates
+    merged = dict(stored or {})
+    if "transactions" in record:
+        merged.pop("aggregates", None)
+    merged.update(record)
+    merged.setdefault("transactions", [])
+    return merged
+
+
+def record_aggregates(data):
+    # Records written before an aggregate was added are replayed once
+    aggregates = data.get("aggregates")
+    if not aggregates or set(empty_aggregates()) - set(aggregates):
+        aggregates = replay_aggregates(data.get("transactions", []))
+    return aggregates
+
+
+def running_total(aggregates):
+    """What an append returns: the user's running total and transaction count."""
+    return {"total": aggregates["total"], "count": aggregates["count"]}
+
+
+def append_to_record(data, transactions):
+    """Append transactions to a full user record, keeping its aggregates in step."""
+    aggregates = record_aggregates(data)
+    for transaction in transactions:
+        data["transactions"].append(transaction)
+        apply_to_aggregates(aggregates, transaction)
+    data["aggregates"] = aggregates
+    data["savings"] = max(0, aggregates["total"])
+    return running_total(aggregates)
+
+
+def post_recurring_to_record(data, postings):
+    """
+    Advance the recurring transactions of a full user record whose next_date
+    is still the one a posting was computed from, append their transactions
+    and return how many were posted.
+    """
+    entries = {entry.get("id"): entry for entry in data.get("recurring_transactions", [])}
+    transactions = []
+    for posting in postings:
+        entry = entries.get(posting["id"])
+        # Already posted by another worker, or changed since
+        if entry is None or entry["next_date"] != posting["next_date"]:
+            continue
+        entry["next_date"] = posting["advance_to"]
+        transactions.extend(posting["transactions"])
+    if transactions:
+        append_to_record(data, transactions)
+    return len(transactions)
+
+
+def compare_aggregates(stored, replayed, tolerance=1e-6):
+    """Return a list of human readable differences between two aggregates."""
+    problems = []
+    if stored["count"] != replayed["count"]:
+        problems.append(f"count: stored {stored['count']}, log {replayed['count']}")
+    if abs(stored["total"] - replayed["total"]) > tolerance:
+        problems.append(f"total: stored {stored['total']}, log {replayed['total']}")
+    for section in ("categories", "months"):
+        for key in set(stored[section]) | set(replayed[section]):
+            a = stored[section].get(key, 0.0)
+            b = replayed[section].get(key, 0.0)
+            if abs(a - b) > tolerance:
+                problems.append(f"{section}[{key}]: stored {a}, log {b}")
+    for month in set(stored["rollups"]) | set(replayed["rollups"]):
+        a_month = stored["rollups"].get(month, {})
+        b_month = replayed["rollups"].get(month, {})
+        for category in set(a_month) | set(b_month):
+            a = a_month.get(category, [0.0, 0.0])
+            b = b_month.get(category, [0.0, 0.0])
+            if abs(a[0] - b[0]) > tolerance or abs(a[1] - b[1]) > tolerance:
+                problems.append(f"rollups[{month}][{category}]: stored {a}, log {b}")
+    for category in set(stored["category_periods"]) | set(replayed["category_periods"]):
+        a_periods = stored["category_periods"].get(category, {})
+        b_periods = replayed["category_periods"].get(category, {})
+        for key in set(a_periods) | set(b_periods):
+            a = a_periods.get(key, 0.0)
+            b = b_periods.get(key, 0.0)
+            if abs(a - b) > tolerance:
+                problems.append(f"category_periods[{category}][{key}]: stored {a}, log {b}")
+    return problems
+
+
+class StorageBackend:
+    """Interface implemented by every user data backend."""
+
+    def load_user(self, user):
+        """Return the user's record, or {} if the user does not exist."""
+        raise NotImplementedError
+
+    def load_profile(self, user, fields=None):
+        """
+        Return the user's record without the transaction log, or only the
+        profile `fields` asked for, or {} if the user does not exist.
+        """
+        record = self.load_user(user)
+        return {field: record[field] for field in fields or PROFILE_FIELDS if field in record}
+
+    def save_user(self, user, data):
+        """
+        Persist the record of a single user. Fields missing from `data`
+        (including "transactions") keep their stored values; transactions
+        past the stored log are appended.
+        """
+        raise NotImplementedError
+
+    def list_users(self):
+        raise NotImplementedError
+
+    def user_exists(self, user):
+        return bool(self.load_user(user))
+
+    # Transaction log. The defaults keep the aggregates inside the user record,
+    # backends with cheaper appends override them.
+
+    def append_transactions(self, user, transactions):
+        """
+        Append transactions to the user's log and return its running total as
+        {"total", "count"}; callers that need more ask for the aggregates.
+        """
+        data = self.load_user(user)
+        total = append_to_record(data, transactions)
+        self.save_user(user, data)
+        return total
+
+    def append_transaction(self, user, transaction):
+        return self.append_transactions(user, [transaction])
+
+    def post_recurring(self, user, postings):
+        """
+        Post due recurring transactions: each posting is {"id", "next_date",
+        "advance_to", "transactions"} and is only applied while the entry's
+        stored next_date is still "next_date". Returns the number posted.
+        """
+        data = self.load_user(user)
+        posted = post_recurring_to_record(data, postings)
+        if posted:
+            self.save_user(user, data)
+        return posted
+
+    def get_aggregates(self, user):
+        return record_aggregates(self.load_user(user))
+
+    def iter_recurring(self):
+        """Yield (user, recurring_id, next_date) for every recurring transaction."""
+        for user in self.list_users():
+            for entry in self.load_user(user).get("recurring_transactions", []):
+                yield user, entry["id"], entry["next_date"]
+
+    def query_transactions(self, user, after=None, date_from=None, date_to=None, category=None, limit=100):
+        """
+        One page of the user's transactions ordered by (date, id), starting
+        after the (date, id) key `after`. `date_from` is inclusive and
+        `date_to` exclusive. Every row carries its log id.
+        """
+        rows = [
+            {"id": i, **t, "date": t.get("date") or ""}
+            for i, t in enumerate(self.load_user(user).get("transactions", []), start=1)
+        ]
+        rows = [
+            t for t in rows
+            if (after is None or (t["date"], t["id"]) > tuple(after))
+            and (date_from is None or t["date"] >= date_from)
+            and (date_to is None or t["date"] < date_to)
+            and (category is None or t["category"] == category)
+        ]
+        rows.sort(key=lambda t: (t["date"], t["id"]))
+        return rows[:limit]
+
+    def existing_hashes(self, user, hashes):
+        """Return the subset of import dedupe hashes already in the user's log."""
+        known = {t["hash"] for t in self.load_user(user).get("transactions", []) if t.get("hash")}
+        return known & set(hashes)
+
+    # Bills
+
+    def query_bills(self, user, due_from=None, due_to=None, status=None, limit=None, offset=0):
+        """
+        Return the user's bills ordered by due date, optionally limited to a
+        due date range (inclusive, "YYYY-MM-DD") and a status.
+        """
+        bills = [
+            bill for bill in self.load_user(user).get("bills", [])
+            if (status is None or bill.get("status") == status)
+            and (due_from is None or (bill.get("due_date") or "") >= due_from)
+            and (due_to is None or (bill.get("due_date") and bill["due_date"] <= due_to))
+        ]
+        bills.sort(key=bill_sort_key)
+        return bills[offset:offset + limit] if limit is not None else bills[offset:]
+
+    def find_bill_id(self, user, title):
+        for bill in self.load_user(user).get("bills", []):
+            if bill["title"] == title:
+                return bill["id"]
+        return None
+
+    def update_bill_status(self, user, bill_id, status):
+        """Set the status of one bill, returns False if the bill does not exist."""
+        data = self.load_user(user)
+        for bill in data.get("bills", []):
+            if bill.get("id") == bill_id:
+                bill["status"] = status
+                self.save_user(user, data)
+                return True
+        return False
+
+    def iter_due_bills(self, due_to, status="Pending"):
+        """Yield (user, bill) for every user's bills due on or before `due_to`."""
+        for user in self.list_users():
+            for bill in self.query_bills(user, due_to=due_to, status=status):
+                yield user, bill
+
+    def get_category_totals(self, user, period_keys):
+        """
+        Return {category: {period_key: total}} for the requested period keys,
+        "all" meaning the all-time total of the category.
+        """
+        aggregates = self.get_aggregates(user)
+        totals = {}
+        for category, total in aggregates["categories"].items():
+            periods = aggregates["category_periods"].get(category, {})
+            totals[category] = {
+                key: total if key == "all" else periods.get(key, 0.0) for key in period_keys
+            }
+        return totals
+
+    def get_rollups(self, user, month_from=None, month_to=None):
+        """
+        Return {month: {category: [income, expenditure]}} for months in
+        [month_from, month_to] ("YYYY-MM"); without a range undated
+        transactions are included under the month "".
+        """
+        rollups = self.get_aggregates(user)["rollups"]
+        if month_from is None and month_to is None:
+            return rollups
+        return {
+            month: categories
+            for month, categories in rollups.items()
+            if month and (month_from is None or month >= month_from) and (month_to is None or month <= month_to)
+        }
+
+    def verify_aggregates(self, user):
+        data = self.load_user(user)
+        stored = data.get("aggregates") or empty_aggregates()
+        return compare_aggregates(stored, replay_aggregates(data.get("transactions", [])))
+
+    def rebuild_aggregates(self, user):
+        data = self.load_user(user)
+        data["aggregates"] = replay_aggregates(data["transactions"])
+        data["savings"] = max(0, data["aggregates"]["total"])
+        self.save_user(user, data)
+        return data["aggregates"]
+
+    def apply_batch(self, ops):
+        """
+        Apply a list of write operations and return one result per operation.
+        Backends override this to commit the whole batch at once.
+        """
+        results = []
+        for kind, user, payload in ops:
+            if kind == "save":
+                results.append(self.save_user(user, payload))
+            elif kind == "append":
+                results.append(self.append_transactions(user, payload))
+            elif kind == "post_recurring":
+                results.append(self.post_recurring(user, payload))
+            else:
+                raise ValueError(f"Unknown storage operation: {kind}")
+        return results
+
+    def close(self):
+        pass
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file, fsync it and rename it over the target."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Persist the rename itself
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class JsonFileBackend(StorageBackend):
+    """Legacy backend: every user lives in one JSON document."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        with self._lock:
+            all_data = self._read_all()
+            changed = [backfill_ids(data) for data in all_data.values()]
+            if any(changed):
+                atomic_write_json(self.path, all_data)
+
+    def _read_all(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                return json.load(f)
+        return {}
+
+    def load_user(self, user):
+        return self._read_all().get(user, {})
+
+    def save_user(self, user, data):
+        self.apply_batch([("save", user, data)])
+
+    def append_transactions(self, user, transactions):
+        return self.apply_batch([("append", user, transactions)])[0]
+
+    def post_recurring(self, user, postings):
+        return self.apply_batch([("post_recurring", user, postings)])[0]
+
+    def apply_batch(self, ops):
+        # One read and one atomic rewrite of the file for the whole batch
+        with self._lock:
+            all_data = self._read_all()
+            results = []
+            for kind, user, payload in ops:
+                if kind == "save":
+                    all_data[user] = merge_record(all_data.get(user), payload)
+                    results.append(None)
+                elif kind == "append":
+                    results.append(append_to_record(all_data[user], payload))
+                elif kind == "post_recurring":
+                    results.append(post_recurring_to_record(all_data.get(user, {}), payload))
+                else:
+                    raise ValueError(f"Unknown storage operation: {kind}")
+            atomic_write_json(self.path, all_data)
+        return results
+
+    def list_users(self):
+        return list(self._read_all().keys())
+
+
+# Columns of the users table a save may set
+USER_COLUMNS = ("password", "savings_goal", "savings")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    savings_goal REAL NOT NULL DEFAULT 0,
+    savings REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    date TEXT,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (username, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (username, date, id);
+CREATE TABLE IF NOT EXISTS user_totals (
+    username TEXT PRIMARY KEY,
+    total REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS category_totals (
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (username, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS month_totals (
+    username TEXT NOT NULL,
+    month TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (username, month)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS category_period_totals (
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    period TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (username, period, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    username TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    income REAL NOT NULL DEFAULT 0,
+    expenditure REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, month, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS budgets (
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    period TEXT NOT NULL DEFAULT 'all',
+    PRIMARY KEY (username, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS recurring_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT,
+    username TEXT NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    next_date TEXT NOT NULL,
+    interval_days INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recurring_user ON recurring_transactions (username);
+CREATE TABLE IF NOT EXISTS bills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT,
+    username TEXT NOT NULL,
+    title TEXT NOT NULL,
+    amount REAL NOT NULL,
+    due_date TEXT,
+    status TEXT NOT NULL,
+    date_added TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bills_user ON bills (username, due_date);
+CREATE INDEX IF NOT EXISTS idx_bills_title ON bills (username, title);
+CREATE INDEX IF NOT EXISTS idx_bills_due ON bills (status, due_date);
+"""
+
+
+class SqliteBackend(StorageBackend):
+    """Embedded SQLite backend (WAL mode) with one set of rows per user."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._ensure_column(conn, "budgets", "period", "TEXT NOT NULL DEFAULT 'all'")
+        self._ensure_column(conn, "transactions", "hash", "TEXT")
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_hash ON transactions (username, hash) "
+            "WHERE hash IS NOT NULL"
+        )
+        # Undated legacy transactions sort first in the (date, id) keyset order
+        conn.execute("UPDATE transactions SET date = '' WHERE date IS NULL")
+        self._ensure_column(conn, "recurring_transactions", "uid", "TEXT")
+        conn.execute("UPDATE recurring_transactions SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_recurring_uid ON recurring_transactions (uid)")
+        self._ensure_column(conn, "bills", "uid", "TEXT")
+        conn.execute("UPDATE bills SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bills_uid ON bills (uid)")
+        conn.commit()
+
+        # Databases created before the current aggregate tables existed need one replay
+        if self.get_meta("aggregates_version") != AGGREGATES_VERSION:
+            for user in self.list_users():
+                self.rebuild_aggregates(user)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates_version', ?)",
+                    (AGGREGATES_VERSION,),
+                )
+
+    @staticmethod
+    def _ensure_column(conn, table, column, definition):
+        columns = [r["name"] for r in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _conn(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_user(self, user):
+        record = self.load_profile(user)
+        if record:
+            record["transactions"] = [
+                {"amount": t["amount"], "description": t["description"], "category": t["category"], "date": t["date"] or None}
+                for t in self._conn().execute(
+                    "SELECT amount, description, category, date FROM transactions WHERE username = ? ORDER BY id",
+                    (user,),
+                )
+            ]
+        return record
+
+    def load_profile(self, user, fields=None):
+        # Only the tables of the fields asked for, never the transaction log
+        fields = fields or PROFILE_FIELDS
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT password, savings_goal, savings FROM users WHERE username = ?", (user,)
+        ).fetchone()
+        if row is None:
+            return {}
+
+        profile = {column: row[column] for column in USER_COLUMNS if column in fields}
+        if "recurring_transactions" in fields:
+            profile["recurring_transactions"] = [
+                {
+                    "id": r["uid"],
+                    "amount": r["amount"],
+                    "description": r["description"],
+                    "category": r["category"],
+                    "next_date": r["next_date"],
+                    "interval_days": r["interval_days"],
+                }
+                for r in conn.execute(
+                    "SELECT uid, amount, description, category, next_date, interval_days FROM recurring_transactions "
+                    "WHERE username = ? ORDER BY id",
+                    (user,),
+                )
+            ]
+        if "budget" in fields or "budget_periods" in fields:
+            budget = {}
+            budget_periods = {}
+            for b in conn.execute("SELECT category, amount, period FROM budgets WHERE username = ?", (user,)):
+                budget[b["category"]] = b["amount"]
+                budget_periods[b["category"]] = b["period"]
+            profile.update({key: value for key, value in (("budget", budget), ("budget_periods", budget_periods)) if key in fields})
+        if "bills" in fields:
+            profile["bills"] = [
+                self._bill(b)
+                for b in conn.execute(
+                    "SELECT uid, title, amount, due_date, status, date_added FROM bills WHERE username = ? ORDER BY id",
+                    (user,),
+                )
+            ]
+        return profile
+
+    def _transaction_count(self, conn, user):
+        row = conn.execute("SELECT count FROM user_totals WHERE username = ?", (user,)).fetchone()
+        return row["count"] if row else 0
+
+    def _append(self, conn, user, transactions):
+        # Append to the log and fold the batch into the aggregate tables
+        conn.executemany(
+            "INSERT INTO transactions (username, amount, description, category, date, hash) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (user, t["amount"], t["description"], t["category"], t.get("date") or "", t.get("hash"))
+                for t in transactions
+            ],
+        )
+        delta = replay_aggregates(transactions)
+        conn.execute(
+            "INSERT INTO user_totals (username, total, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET total = total + excluded.total, count = count + excluded.count",
+            (user, delta["total"], delta["count"]),
+        )
+        conn.executemany(
+            "INSERT INTO category_totals (username, category, total) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, category) DO UPDATE SET total = total + excluded.total",
+            [(user, category, total) for category, total in delta["categories"].items()],
+        )
+        conn.executemany(
+            "INSERT INTO month_totals (username, month, total) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, month) DO UPDATE SET total = total + excluded.total",
+            [(user, month, total) for month, total in delta["months"].items()],
+        )
+        conn.executemany(
+            "INSERT INTO category_period_totals (username, category, period, total) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(username, period, category) DO UPDATE SET total = total + excluded.total",
+            [
+                (user, category, period, total)
+                for category, periods in delta["category_periods"].items()
+                for period, total in periods.items()
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO monthly_rollups (username, month, category, income, expenditure) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(username, month, category) DO UPDATE SET "
+            "income = income + excluded.income, expenditure = expenditure + excluded.expenditure",
+            self._rollup_rows(user, delta),
+        )
+        conn.execute(
+            "UPDATE users SET savings = MAX(0, (SELECT total FROM user_totals WHERE username = ?)) "
+            "WHERE username = ?",
+            (user, user),
+        )
+        row = conn.execute("SELECT total, count FROM user_totals WHERE username = ?", (user,)).fetchone()
+        return {"total": row["total"], "count": row["count"]}
+
+    def _post_recurring(self, conn, user, postings):
+        # next_date only advances from the value the posting was computed from, in the append's transaction
+        transactions = []
+        for posting in postings:
+            advanced = conn.execute(
+                "UPDATE recurring_transactions SET next_date = ? WHERE uid = ? AND username = ? AND next_date = ?",
+                (posting["advance_to"], posting["id"], user, posting["next_date"]),
+            )
+            if advanced.rowcount:
+                transactions.extend(posting["transactions"])
+        if transactions:
+            self._append(conn, user, transactions)
+        return len(transactions)
+
+    def post_recurring(self, user, postings):
+        return self.apply_batch([("post_recurring", user, postings)])[0]
+
+    @staticmethod
+    def _rollup_rows(user, aggregates):
+        return [
+            (user, month, category, income, expenditure)
+            for month, categories in aggregates["rollups"].items()
+            for category, (income, expenditure) in categories.items()
+        ]
+
+    def append_transactions(self, user, transactions):
+        return self.apply_batch([("append", user, transactions)])[0]
+
+    def apply_batch(self, ops):
+        # The whole batch is a single SQLite transaction, i.e. one commit
+        conn = self._conn()
+        results = []
+        with conn:
+            for kind, user, payload in ops:
+                if kind == "save":
+                    self._write_user(conn, user, payload)
+                    results.append(None)
+                elif kind == "append":
+                    results.append(self._append(conn, user, payload))
+                elif kind == "post_recurring":
+                    results.append(self._post_recurring(conn, user, payload))
+                else:
+                    raise ValueError(f"Unknown storage operation: {kind}")
+        return results
+
+    def get_aggregates(self, user):
+        conn = self._conn()
+        aggregates = empty_aggregates()
+        row = conn.execute("SELECT total, count FROM user_totals WHERE username = ?", (user,)).fetchone()
+        if row:
+            aggregates["total"] = row["total"]
+            aggregates["count"] = row["count"]
+        aggregates["categories"] = {
+            r["category"]: r["total"]
+            for r in conn.execute("SELECT category, total FROM category_totals WHERE username = ?", (user,))
+        }
+        aggregates["months"] = {
+            r["month"]: r["total"]
+            for r in conn.execute("SELECT month, total FROM month_totals WHERE username = ?", (user,))
+        }
+        for r in conn.execute(
+            "SELECT category, period, total FROM category_period_totals WHERE username = ?", (user,)
+        ):
+            aggregates["category_periods"].setdefault(r["category"], {})[r["period"]] = r["total"]
+        aggregates["rollups"] = self.get_rollups(user)
+        return aggregates
+
+    def get_rollups(self, user, month_from=None, month_to=None):
+        # Primary key range scan: O(months x categories) rows, independent of the transaction count
+        query = "SELECT month, category, income, expenditure FROM monthly_rollups WHERE username = ?"
+        params = [user]
+        if month_from is not None or month_to is not None:
+            query += " AND month >= ? AND month <= ?"
+            params += [month_from or "0000-00", month_to or "9999-99"]
+        rollups = {}
+        for r in self._conn().execute(query, params):
+            rollups.setdefault(r["month"], {})[r["category"]] = [r["income"], r["expenditure"]]
+        return rollups
+
+    def get_category_totals(self, user, period_keys):
+        # Indexed lookups only: O(categories) rows, independent of the transaction count
+        conn = self._conn()
+        totals = {}
+        for r in conn.execute("SELECT category, total FROM category_totals WHERE username = ?", (user,)):
+            totals[r["category"]] = {key: r["total"] if key == "all" else 0.0 for key in period_keys}
+        keys = [key for key in period_keys if key != "all"]
+        if keys:
+            placeholders = ", ".join("?" for _ in keys)
+            for r in conn.execute(
+                f"SELECT category, period, total FROM category_period_totals "
+                f"WHERE username = ? AND period IN ({placeholders})",
+                (user, *keys),
+            ):
+                totals[r["category"]][r["period"]] = r["total"]
+        return totals
+
+    def _replay_log(self, user):
+        aggregates = empty_aggregates()
+        for t in self._conn().execute(
+            "SELECT amount, category, date FROM transactions WHERE username = ? ORDER BY id", (user,)
+        ):
+            apply_to_aggregates(aggregates, dict(t))
+        return aggregates
+
+    def verify_aggregates(self, user):
+        return compare_aggregates(self.get_aggregates(user), self._replay_log(user))
+
+    def rebuild_aggregates(self, user):
+        aggregates = self._replay_log(user)
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM category_totals WHERE username = ?", (user,))
+            conn.execute("DELETE FROM month_totals WHERE username = ?", (user,))
+            conn.execute("DELETE FROM category_period_totals WHERE username = ?", (user,))
+            conn.execute("DELETE FROM monthly_rollups WHERE username = ?", (user,))
+            conn.execute(
+                "INSERT OR REPLACE INTO user_totals (username, total, count) VALUES (?, ?, ?)",
+                (user, aggregates["total"], aggregates["count"]),
+            )
+            conn.executemany(
+                "INSERT INTO category_totals (username, category, total) VALUES (?, ?, ?)",
+                [(user, category, total) for category, total in aggregates["categories"].items()],
+            )
+            conn.executemany(
+                "INSERT INTO month_totals (username, month, total) VALUES (?, ?, ?)",
+                [(user, month, total) for month, total in aggregates["months"].items()],
+            )
+            conn.executemany(
+                "INSERT INTO category_period_totals (username, category, period, total) VALUES (?, ?, ?, ?)",
+                [
+                    (user, category, period, total)
+                    for category, periods in aggregates["category_periods"].items()
+                    for period, total in periods.items()
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO monthly_rollups (username, month, category, income, expenditure) VALUES (?, ?, ?, ?, ?)",
+                self._rollup_rows(user, aggregates),
+            )
+            conn.execute("UPDATE users SET savings = ? WHERE username = ?", (max(0, aggregates["total"]), user))
+        return aggregates
+
+    def save_user(self, user, data):
+        self.apply_batch([("save", user, data)])
+
+    def _write_user(self, conn, user, data):
+        # Only the fields present in `data` are written, the others keep their rows
+        updates = ", ".join(f"{column} = excluded.{column}" for column in USER_COLUMNS if column in data)
+        conn.execute(
+            "INSERT INTO users (username, password, savings_goal, savings) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(username) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING"),
+            (user, data.get("password", ""), data.get("savings_goal", 0.0), data.get("savings", 0.0)),
+        )
+
+        # The transaction log is append-only: only entries past the stored count are new
+        transactions = data.get("transactions", [])
+        stored_count = self._transaction_count(conn, user)
+        if len(transactions) > stored_count:
+            self._append(conn, user, transactions[stored_count:])
+
+        # Only this user's rows are replaced
+        if "budget" in data:
+            conn.execute("DELETE FROM budgets WHERE username = ?", (user,))
+            budget_periods = data.get("budget_periods", {})
+            conn.executemany(
+                "INSERT INTO budgets (username, category, amount, period) VALUES (?, ?, ?, ?)",
+                [
+                    (user, category, amount, budget_periods.get(category, "all"))
+                    for category, amount in data["budget"].items()
+                ],
+            )
+
+        if "recurring_transactions" in data:
+            self._write_recurring(conn, user, data["recurring_transactions"])
+        if "bills" in data:
+            self._write_bills(conn, user, data["bills"])
+
+    @staticmethod
+    def _write_recurring(conn, user, recurring):
+        conn.execute("DELETE FROM recurring_transactions WHERE username = ?", (user,))
+        conn.executemany(
+            "INSERT INTO recurring_transactions (uid, username, amount, description, category, next_date, interval_days) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    r.get("id") or new_record_id(), user, r["amount"], r["description"], r["category"],
+                    r["next_date"], r["interval_days"],
+                )
+                for r in recurring
+            ],
+        )
+
+    @staticmethod
+    def _write_bills(conn, user, bills):
+        conn.execute("DELETE FROM bills WHERE username = ?", (user,))
+        conn.executemany(
+            "INSERT INTO bills (uid, username, title, amount, due_date, status, date_added) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    b.get("id") or new_record_id(), user, b["title"], b["amount"], b.get("due_date"),
+                    b.get("status", "Pending"), b.get("date_added"),
+                )
+                for b in bills
+            ],
+        )
+
+    def list_users(self):
+        return [r["username"] for r in self._conn().execute("SELECT username FROM users ORDER BY username")]
+
+    def query_transactions(self, user, after=None, date_from=None, date_to=None, category=None, limit=100):
+        # Keyset pagination over the (username, date, id) index: each page is one
+        # index range scan, no matter how deep into the history it is
+        where = ["username = ?"]
+        params = [user]
+        if after is not None:
+            where.append("(date, id) > (?, ?)")
+            params += list(after)
+        if date_from is not None:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("date < ?")
+            params.append(date_to)
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+        sql = (
+            "SELECT id, amount, description, category, date FROM transactions WHERE "
+            + " AND ".join(where)
+            + " ORDER BY date, id LIMIT ?"
+        )
+        params.append(limit)
+        return [dict(t) for t in self._conn().execute(sql, params)]
+
+    def existing_hashes(self, user, hashes):
+        hashes = list(hashes)
+        found = set()
+        conn = self._conn()
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            found.update(
+                r["hash"] for r in conn.execute(
+                    f"SELECT hash FROM transactions WHERE username = ? AND hash IN ({placeholders})", (user, *chunk)
+                )
+            )
+        return found
+
+    @staticmethod
+    def _bill(row):
+        return {
+            "id": row["uid"],
+            "title": row["title"],
+            "amount": row["amount"],
+            "due_date": row["due_date"],
+            "status": row["status"],
+            "date_added": row["date_added"],
+        }
+
+    def query_bills(self, user, due_from=None, due_to=None, status=None, limit=None, offset=0):
+        # Served from the (username, due_date) index, sorted in SQL
+        where = ["username = ?"]
+        params = [user]
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if due_from is not None:
+            where.append("due_date >= ?")
+            params.append(due_from)
+        if due_to is not None:
+            where.append("due_date <= ?")
+            params.append(due_to)
+        sql = (
+            "SELECT uid, title, amount, due_date, status, date_added FROM bills WHERE "
+            + " AND ".join(where)
+            + " ORDER BY due_date IS NULL, due_date, date_added LIMIT ? OFFSET ?"
+        )
+        params += [limit if limit is not None else -1, offset]
+        return [self._bill(b) for b in self._conn().execute(sql, params)]
+
+    def find_bill_id(self, user, title):
+        row = self._conn().execute(
+            "SELECT uid FROM bills WHERE username = ? AND title = ? ORDER BY id LIMIT 1", (user, title)
+        ).fetchone()
+        return row["uid"] if row else None
+
+    def update_bill_status(self, user, bill_id, status):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE bills SET status = ? WHERE uid = ? AND username = ?", (status, bill_id, user)
+            )
+        return cursor.rowcount > 0
+
+    def iter_due_bills(self, due_to, status="Pending"):
+        # Cross-user sweep over the (status, due_date) index
+        for b in self._conn().execute(
+            "SELECT username, uid, title, amount, due_date, status, date_added FROM bills "
+            "WHERE status = ? AND due_date <= ? ORDER BY due_date",
+            (status, due_to),
+        ):
+            yield b["username"], self._bill(b)
+
+    def iter_recurring(self):
+        # One indexed scan of the recurring table, no full user records are loaded
+        for r in self._conn().execute("SELECT username, uid, next_date FROM recurring_transactions"):
+            yield r["username"], r["uid"], r["next_date"]
+
+    def user_exists(self, user):
+        row = self._conn().execute("SELECT 1 FROM users WHERE username = ?", (user,)).fetchone()
+        return row is not None
+
+    def get_meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class UserLocks:
+    """Per-user asyncio locks for read-modify-write sequences in the handlers."""
+
+    def __init__(self):
+        # Locks disappear once no coroutine holds or waits on them
+        self._locks = weakref.WeakValueDictionary()
+
+    def __call__(self, user):
+        lock = self._locks.get(user)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user] = lock
+        return lock
+
+
+class GroupCommitter:
+    """
+    Collects write operations arriving within `window` seconds and commits them
+    with one `apply_batch` call (one fsync). A window of 0 commits every write
+    immediately.
+    """
+
+    def __init__(self, backend, window=0.0, run=None):
+        self.backend = backend
+        self.window = window
+        # async callable(fn, *args) running the blocking commit off the event loop
+        self.run = run or asyncio.to_thread
+        self._pending = []
+        self._flush_handle = None
+        self.batches = 0
+        self.operations = 0
+
+    async def submit(self, op):
+        if self.window <= 0:
+            self.batches += 1
+            self.operations += 1
+            return (await self.run(self.backend.apply_batch, [op]))[0]
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            asyncio.ensure_future(self._commit(pending))
+
+    async def _commit(self, pending):
+        self.batches += 1
+        self.operations += len(pending)
+        try:
+            results = await self.run(self.backend.apply_batch, [op for op, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {"batches": self.batches, "operations": self.operations, "pending": len(self._pending)}
+
+
+def migrate_json_to_sqlite(json_path, backend):
+    """
+    One-shot import of an existing users_data.json into a SqliteBackend.
+    Returns the number of users imported (0 if already migrated or no file).
+    """
+    if backend.get_meta("json_migrated") or not os.path.exists(json_path):
+        return 0
+
+    with open(json_path, "r") as f:
+        all_data = json.load(f)
+
+    conn = backend._conn()
+    with conn:
+        for user, data in all_data.items():
+            backend._write_user(conn, user, data)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+            (os.path.abspath(json_path),),
+        )
+    return len(all_data)
+
+
+def get_backend(kind, json_path, sqlite_path):
+    """Build the configured backend ("sqlite" or "json")."""
+    if kind == "json":
+        return JsonFileBackend(json_path)
+    if kind == "sqlite":
+        backend = SqliteBackend(sqlite_path)
+        migrated = migrate_json_to_sqlite(json_path, backend)
+        if migrated:
+            print(f"Migrated {migrated} users from {json_path} to {sqlite_path}")
+        return backend
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="User data storage maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Import users_data.json into SQLite")
+    migrate_parser.add_argument("--json", default="users_data.json")
+    migrate_parser.add_argument("--db", default=os.getenv("STORAGE_SQLITE_PATH", "users_data.db"))
+
+    bills_parser = subparsers.add_parser("due-bills", help="List pending bills of all users due soon (JSON lines)")
+    bills_parser.add_argument("--backend", default=os.getenv("STORAGE_BACKEND", "sqlite"))
+    bills_parser.add_argument("--json", default="users_data.json")
+    bills_parser.add_argument("--db", default=os.getenv("STORAGE_SQLITE_PATH", "users_data.db"))
+    bills_parser.add_argument("--days", type=int, default=3, help="Include bills due within this many days")
+
+    verify_parser = subparsers.add_parser("verify", help="Replay transaction logs and check the aggregates")
+    verify_parser.add_argument("--backend", default=os.getenv("STORAGE_BACKEND", "sqlite"))
+    verify_parser.add_argument("--json", default="users_data.json")
+    verify_parser.add_argument("--db", default=os.getenv("STORAGE_SQLITE_PATH", "users_data.db"))
+    verify_parser.add_argument("--user", help="Only check this user")
+    verify_parser.add_argument("--rebuild", action="store_true", help="Rebuild aggregates that do not match")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        count = migrate_json_to_sqlite(args.json, SqliteBackend(args.db))
+        print(f"Migrated {count} users from {args.json} to {args.db}")
+    elif args.command == "due-bills":
+        backend = get_backend(args.backend, json_path=args.json, sqlite_path=args.db)
+        due_to = (datetime.now() + timedelta(days=args.days)).strftime("%Y-%m-%d")
+        for user, bill in backend.iter_due_bills(due_to):
+            print(json.dumps({"user": user, **bill}))
+    elif args.command == "verify":
+        backend = get_backend(args.backend, json_path=args.json, sqlite_path=args.db)
+        users = [args.user] if args.user else backend.list_users()
+        mismatched = 0
+        for user in users:
+            problems = backend.verify_aggregates(user)
+            if not problems:
+                continue
+            mismatched += 1
+            print(f"{user}: " + "; ".join(problems))
+            if args.rebuild:
+                backend.rebuild_aggregates(user)
+                print(f"{user}: aggregates rebuilt")
+        print(f"Checked {len(users)} users, {mismatched} mismatched")
+        raise SystemExit(1 if mismatched and not args.rebuild else 0)
@@ -0,0 +1,76 @@
+"""
+The AR backends against statsmodels (the parity check of
+bench/bench_ar_backends.py): the least squares backends must forecast like
+AutoReg did in api.py, and yule_walker must match statsmodels' Yule-Walker.
+"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import fit_ar_forecast, fit_yule_walker
+
+LAGS = 250
+HORIZON = 90
+
+
+def synthetic_series(rng, days=520):
+    index = pd.bdate_range("2023-01-02", periods=days, tz="Asia/Kolkata")
+    walk = 3000 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+    trend = 500 + np.arange(days) * 2.0 + rng.normal(0, 15, days)
+    ar = np.zeros(days)
+    for t in range(3, days):
+        ar[t] = 0.5 * ar[t - 1] + 0.2 * ar[t - 2] - 0.1 * ar[t - 3] + rng.normal(0, 1)
+    return {
+        "random_walk": pd.DataFrame({"Close": walk}, index=index),
+        "trend": pd.DataFrame({"Close": trend}, index=index),
+        "stationary_ar3": pd.DataFrame({"Close": 100 + ar}, index=index),
+    }
+
+
+def prepare(frame):
+    # Like generate_stock_prediction: daily, forward filled, the last two years
+    close = frame[["Close"]].asfreq("D", method="ffill").ffill()
+    return close[close.index >= close.index[-1] - pd.Timedelta(days=730)]
+
+
+def original_forecast(close):
+    """The AutoReg fit and predict api.py used before the backends existed."""
+    from statsmodels.tsa.ar_model import AutoReg
+
+    train_df = close.iloc[: int(len(close) * 0.9) + 1]
+    test_df = close.iloc[int(len(close) * 0.9) :]
+    model = AutoReg(train_df["Close"], LAGS).fit(cov_type="HC0")
+    return model.predict(start=test_df.index[0], end=test_df.index[-1] + dt.timedelta(days=HORIZON), dynamic=True)
+
+
+SERIES = {name: prepare(frame) for name, frame in synthetic_series(np.random.default_rng(0)).items()}
+
+
+@pytest.fixture(scope="module")
+def references():
+    return {name: original_forecast(close) for name, close in SERIES.items()}
+
+
+@pytest.mark.parametrize("name", SERIES)
+@pytest.mark.parametrize("backend", ["normal", "lstsq", "statsmodels"])
+def test_least_squares_backends_forecast_like_autoreg(references, name, backend):
+    reference = references[name]
+    forecast = fit_ar_forecast(SERIES[name], LAGS, HORIZON, None, backend)[2]
+    assert forecast.index.equals(reference.index)
+    scale = np.abs(reference.to_numpy()).max()
+    assert np.abs(forecast.to_numpy() - reference.to_numpy()).max() / scale < 1e-9
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+@pytest.mark.parametrize("name", SERIES)
+@pytest.mark.parametrize("lags", [3, LAGS])
+def test_yule_walker_matches_statsmodels(name, lags):
+    from statsmodels.regression.linear_model import yule_walker
+
+    y = SERIES[name]["Close"].to_numpy()
+    params = fit_yule_walker(y, lags)
+    rho = yule_walker(y, order=lags, method="mle", demean=True)[0]
+    np.testing.assert_allclose(params[1:], rho, rtol=0, atol=1e-9)
+    assert params[0] == pytest.approx(y.mean() * (1 - rho.sum()), rel=1e-9)
@@ -0,0 +1,76 @@
+"""
+The vectorized forecast adjustment must match the original per-day pandas loop
+from generate_stock_prediction exactly (the check in
+bench/bench_forecast_adjustment.py).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast_adjustment import adjust_forecast_series, adjust_forecasts
+
+TEST_DAYS = 73
+HORIZON = 90
+
+
+def reference_adjustment(base_forecast, test_end_date, sentiment_score, last_historical_price):
+    """The adjustment loop as it was in api.py."""
+    adjusted_forecast = base_forecast.copy()
+    forecast_dates = adjusted_forecast.index
+    first_forecast_index = None
+    for i, date in enumerate(forecast_dates):
+        if date > test_end_date:
+            if first_forecast_index is None:
+                first_forecast_index = i
+            days_ahead = (date - test_end_date).days
+            time_decay = max(0.3, 1.0 - (days_ahead / 90.0))
+            adjusted_sentiment = sentiment_score * time_decay
+            adjustment_factor = adjusted_sentiment * 0.015
+            raw_forecast = base_forecast.iloc[i] * (1 + adjustment_factor)
+            if i == first_forecast_index:
+                max_first_day_change = last_historical_price * 0.01
+                min_first_day_change = last_historical_price * -0.01
+                if raw_forecast > last_historical_price + max_first_day_change:
+                    raw_forecast = last_historical_price + max_first_day_change
+                elif raw_forecast < last_historical_price + min_first_day_change:
+                    raw_forecast = last_historical_price + min_first_day_change
+            else:
+                previous_forecast = adjusted_forecast.iloc[i - 1]
+                max_change = previous_forecast * 0.05
+                min_change = previous_forecast * -0.05
+                if raw_forecast > previous_forecast + max_change:
+                    raw_forecast = previous_forecast + max_change
+                elif raw_forecast < previous_forecast + min_change:
+                    raw_forecast = previous_forecast + min_change
+            adjusted_forecast.iloc[i] = raw_forecast
+    return adjusted_forecast
+
+
+def make_case(rng):
+    """A forecast Series over the test period and horizon, with jumps that trip the clamps."""
+    index = pd.date_range("2025-01-01", periods=TEST_DAYS + HORIZON, freq="D", tz="Asia/Kolkata")
+    steps = rng.normal(0, rng.choice([0.005, 0.03, 0.08]), len(index))
+    values = 1000 * np.exp(np.cumsum(steps))
+    last_price = values[TEST_DAYS - 1] * rng.choice([1.0, 1.03, 0.95])
+    return pd.Series(values, index=index), index[TEST_DAYS - 1], rng.uniform(-1, 1), last_price
+
+
+@pytest.fixture(scope="module")
+def cases():
+    rng = np.random.default_rng(0)
+    return [make_case(rng) for _ in range(100)]
+
+
+def test_series_matches_the_loop(cases):
+    for case in cases:
+        expected = reference_adjustment(*case)
+        adjusted = adjust_forecast_series(*case)
+        assert adjusted.index.equals(expected.index)
+        np.testing.assert_array_equal(adjusted.to_numpy(), expected.to_numpy())
+
+
+def test_batch_matches_the_loop(cases):
+    base = np.stack([case[0].to_numpy()[TEST_DAYS:] for case in cases])
+    batch = adjust_forecasts(base, np.arange(1, HORIZON + 1), [case[2] for case in cases], [case[3] for case in cases])
+    for case, adjusted in zip(cases, batch):
+        np.testing.assert_array_equal(adjusted, reference_adjustment(*case).to_numpy()[TEST_DAYS:])
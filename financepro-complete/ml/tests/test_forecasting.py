@@ -0,0 +1,60 @@
+"""
+Carried-forward AR fits must match a full refit on the new window (the
+incremental vs full-refit X'X check from the AR model cache work).
+"""
+import numpy as np
+import pytest
+
+from forecasting import MAX_INCREMENTAL_UPDATES, fit_ar
+
+LAGS = 250
+WINDOW = 650
+
+
+@pytest.fixture(scope="module")
+def y():
+    rng = np.random.default_rng(0)
+    return 3000 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, WINDOW + 60)))
+
+
+def relative_error(a, b):
+    return np.abs(a - b).max() / np.abs(b).max()
+
+
+@pytest.mark.parametrize("days", [1, 5, 30])
+def test_sliding_window_matches_full_refit(y, days):
+    _, state, mode = fit_ar(y[:WINDOW], 0, LAGS)
+    assert mode == "full"
+
+    params, carried, mode = fit_ar(y[days:WINDOW + days], days, LAGS, state)
+    assert mode == "incremental"
+    full_params, full, _ = fit_ar(y[days:WINDOW + days], days, LAGS)
+    assert relative_error(carried["xtx"], full["xtx"]) < 1e-12
+    assert relative_error(carried["xty"], full["xty"]) < 1e-12
+    assert relative_error(params, full_params) < 1e-8
+
+
+def test_revised_bars_are_replaced(y):
+    _, state, _ = fit_ar(y[:WINDOW], 0, LAGS)
+    # A new bar, and the last stored one revised
+    window = y[1:WINDOW + 1].copy()
+    window[-2] *= 1.01
+    params, carried, mode = fit_ar(window, 1, LAGS, state)
+    assert mode == "incremental"
+    full_params, full, _ = fit_ar(window, 1, LAGS)
+    assert relative_error(carried["xtx"], full["xtx"]) < 1e-12
+    assert relative_error(params, full_params) < 1e-8
+
+
+def test_hits_and_refits(y):
+    _, state, _ = fit_ar(y[:WINDOW], 0, LAGS)
+    assert fit_ar(y[:WINDOW], 0, LAGS, state)[2] == "hit"
+    # Most rows changed: a full fit is cheaper
+    assert fit_ar(y[:WINDOW] * 1.5, 0, LAGS, state)[2] == "full"
+
+    # Carried-forward updates are bounded so rounding errors cannot pile up
+    for day in range(1, MAX_INCREMENTAL_UPDATES + 1):
+        _, state, mode = fit_ar(y[day:WINDOW + day], day, LAGS, state)
+        assert mode == "incremental"
+    day = MAX_INCREMENTAL_UPDATES + 1
+    assert fit_ar(y[day:WINDOW + day], day, LAGS, state)[2] == "full"
@@ -0,0 +1,34 @@
+"""
+The stock pickers list issuer names (get_stocks) and send them back, so a name
+must resolve to the issuer's Security Id ticker.
+"""
+import os
+
+import pytest
+
+from issuers import IssuerRegistry, yfinance_ticker
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "equity_issuers.csv")
+
+
+@pytest.fixture
+def index(tmp_path):
+    return IssuerRegistry(CSV_PATH, cache_path=os.path.join(tmp_path, "issuers.cache")).index()
+
+
+@pytest.mark.parametrize("exchange, suffix", [("NSE", "NS"), ("BSE", "BO")])
+def test_issuer_name_resolves_to_security_id_ticker(index, exchange, suffix):
+    issuer = index.lookup("ABB India Limited")
+    assert issuer["symbol"] == "ABB"
+    assert yfinance_ticker(issuer, exchange) == f"ABB.{suffix}"
+
+
+def test_every_listed_name_resolves(index):
+    names = index.names()
+    assert "ABB India Limited" in names
+    assert all(index.lookup(name)["name"].upper() == name.upper() for name in names)
+
+
+def test_codes_symbols_and_isins_still_resolve(index):
+    for key in ("500002", "ABB", "abb", "INE117A01022"):
+        assert index.lookup(key)["name"] == "ABB India Limited"
@@ -0,0 +1,45 @@
+"""
+Two schedulers posting the same due recurring transaction, as two workers
+would, must post each interval once.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import DATE_FORMAT, RecurringScheduler
+from storage import UserLocks, get_backend
+from user_cache import CachingBackend
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "json"])
+@pytest.mark.parametrize("cache", [None, "write_through", "write_behind"])
+def test_two_schedulers_post_each_interval_once(tmp_path, backend, cache):
+    inner = get_backend(
+        backend,
+        json_path=os.path.join(tmp_path, "users_data.json"),
+        sqlite_path=os.path.join(tmp_path, "users_data.db"),
+    )
+    store = inner
+    if cache:
+        store = CachingBackend(inner, flush_interval=60 if cache == "write_behind" else 0)
+    due = datetime.now() - timedelta(days=2, hours=1)
+    entry = {"id": "rent", "amount": -5.0, "description": "rent", "category": "home", "next_date": due.strftime(DATE_FORMAT), "interval_days": 1}
+    store.save_user("a", {"password": "", "transactions": [], "recurring_transactions": [entry], "budget": {}, "budget_periods": {}, "savings_goal": 0.0, "savings": 0.0, "bills": []})
+
+    first, second = RecurringScheduler(store, UserLocks()), RecurringScheduler(store, UserLocks())
+    now = datetime.now()
+
+    async def post_twice():
+        await first.load()
+        await second.load()
+        await first.post_due(now)
+        await second.post_due(now)
+
+    asyncio.run(post_twice())
+
+    assert (first.posted, second.posted) == (3, 0)
+    assert len(inner.load_user("a")["transactions"]) == 3
+    next_date = store.load_profile("a", ("recurring_transactions",))["recurring_transactions"][0]["next_date"]
+    assert next_date == (due + timedelta(days=3)).strftime(DATE_FORMAT)
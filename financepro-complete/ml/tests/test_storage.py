@@ -0,0 +1,158 @@
+"""
+Concurrent writers must not lose updates and the aggregates must match the
+transaction log (the small version of bench/stress_storage.py).
+"""
+import asyncio
+import os
+import threading
+
+import pytest
+
+from storage import GroupCommitter, UserLocks, get_backend
+from user_cache import CachingBackend
+
+WRITERS = 24
+USERS = 4
+ROUNDS = 3
+
+
+def new_user():
+    return {"password": "", "transactions": [], "recurring_transactions": [], "budget": {}, "budget_periods": {}, "savings_goal": 0.0, "savings": 0.0, "bills": []}
+
+
+async def writer(store, commits, locks, user, writer_id):
+    for i in range(ROUNDS):
+        async with locks(user):
+            # Same shape as set_budget: load, modify, save
+            user_data = store.load_profile(user, ("budget", "budget_periods"))
+            user_data["budget"][f"w{writer_id}-{i}"] = float(i)
+            await commits.submit(("save", user, user_data))
+        # Give the write-behind flusher a chance to run between saves
+        await asyncio.sleep(0.001)
+    for i in range(ROUNDS):
+        async with locks(user):
+            # Same shape as add_transaction: append to the log
+            transaction = {"amount": 1.0, "description": f"w{writer_id}-{i}", "category": "stress", "date": "2026-01-01"}
+            await commits.submit(("append", user, [transaction]))
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "json"])
+@pytest.mark.parametrize("group_commit_ms", [0, 2])
+@pytest.mark.parametrize("cache", [None, "write_through", "write_behind"])
+def test_concurrent_writers_lose_no_updates(tmp_path, backend, group_commit_ms, cache):
+    store = get_backend(
+        backend,
+        json_path=os.path.join(tmp_path, "users_data.json"),
+        sqlite_path=os.path.join(tmp_path, "users_data.db"),
+    )
+    if cache:
+        # Fewer entries than users so evictions happen too
+        store = CachingBackend(store, max_entries=USERS - 1, flush_interval=0.002 if cache == "write_behind" else 0)
+    users = [f"user{u}" for u in range(USERS)]
+    for user in users:
+        store.save_user(user, new_user())
+
+    async def run():
+        commits = GroupCommitter(store, group_commit_ms / 1000.0)
+        locks = UserLocks()
+        # The flusher thread writes snapshots while the writers keep saving
+        flusher = asyncio.create_task(store.run_flusher()) if cache == "write_behind" else None
+        await asyncio.gather(*[writer(store, commits, locks, users[w % USERS], w) for w in range(WRITERS)])
+        if flusher:
+            flusher.cancel()
+
+    asyncio.run(run())
+    if cache:
+        # Check what reached the persistent backend, not the cached copies
+        store.flush()
+        store = store.inner
+
+    expected = WRITERS // USERS * ROUNDS
+    for user in users:
+        user_data = store.load_user(user)
+        assert len(user_data["budget"]) == expected
+        assert len(user_data["transactions"]) == expected
+        assert store.get_aggregates(user)["count"] == expected
+        assert store.verify_aggregates(user) == []
+
+
+def test_cache_serves_requests_while_flushing(tmp_path):
+    inner = get_backend(
+        "sqlite",
+        json_path=os.path.join(tmp_path, "users_data.json"),
+        sqlite_path=os.path.join(tmp_path, "users_data.db"),
+    )
+    store = CachingBackend(inner, flush_interval=60)
+    store.save_user("a", new_user())
+
+    writing, release = threading.Event(), threading.Event()
+    apply_batch = inner.apply_batch
+
+    def slow_apply_batch(ops):
+        writing.set()
+        release.wait(5)
+        return apply_batch(ops)
+
+    inner.apply_batch = slow_apply_batch
+    flush = threading.Thread(target=store.flush)
+    flush.start()
+    assert writing.wait(5)
+
+    # Hits and write-behind saves do not wait for the batch being written
+    profile = store.load_profile("a")
+    profile["budget"]["food"] = 10.0
+    store.save_user("a", profile)
+    assert flush.is_alive()
+
+    release.set()
+    flush.join(5)
+    store.flush()
+    assert inner.load_profile("a")["budget"] == {"food": 10.0}
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "json"])
+@pytest.mark.parametrize("cache", [None, "write_through", "write_behind"])
+def test_partial_saves_keep_other_fields(tmp_path, backend, cache):
+    store = get_backend(
+        backend,
+        json_path=os.path.join(tmp_path, "users_data.json"),
+        sqlite_path=os.path.join(tmp_path, "users_data.db"),
+    )
+    inner = store
+    if cache:
+        store = CachingBackend(store, flush_interval=60 if cache == "write_behind" else 0)
+    store.save_user("a", dict(new_user(), password="secret"))
+    store.append_transactions("a", [{"amount": 5.0, "description": "x", "category": "c", "date": "2026-01-01"}])
+
+    budget = store.load_profile("a", ("budget", "budget_periods"))
+    assert budget == {"budget": {}, "budget_periods": {}}
+    budget["budget"]["food"] = 10.0
+    budget["budget_periods"]["food"] = "monthly"
+    store.save_user("a", budget)
+    store.save_user("a", {"savings_goal": 100.0})
+
+    if cache:
+        store.flush()
+    profile = inner.load_profile("a")
+    assert profile["password"] == "secret"
+    assert profile["budget"] == {"food": 10.0}
+    assert profile["budget_periods"] == {"food": "monthly"}
+    assert profile["savings_goal"] == 100.0
+    assert profile["savings"] == 5.0
+    assert len(inner.load_user("a")["transactions"]) == 1
+
+
+def test_field_limited_loads_hit_the_cache(tmp_path):
+    inner = get_backend(
+        "json",
+        json_path=os.path.join(tmp_path, "users_data.json"),
+        sqlite_path=os.path.join(tmp_path, "users_data.db"),
+    )
+    store = CachingBackend(inner)
+    store.inner.save_user("a", new_user())
+
+    assert store.load_profile("a", ("budget", "budget_periods")) == {"budget": {}, "budget_periods": {}}
+    hits = store.stats()["hits"]
+    assert store.load_profile("a", ("budget", "budget_periods")) == {"budget": {}, "budget_periods": {}}
+    assert store.load_profile("a", ("savings",)) == {"savings": 0.0}
+    assert store.stats()["hits"] == hits + 2
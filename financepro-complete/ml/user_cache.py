@@ -0,0 +1,322 @@
+"""
+In-process cache of user profiles in front of a StorageBackend.
+
+A profile is the user record without its transaction log (password, budget,
+recurring transactions, bills, savings); the log and its aggregates are only
+ever read from and appended to the backend. Profiles are kept in LRU order and
+bounded by entry count and approximate size. A handler may load and save only
+some of the profile fields; a save updates those fields of the cached profile.
+
+Saves are written through by default. With a flush interval they are
+write-behind instead: they mark the profile dirty and `flush()` writes all
+dirty profiles to the backend in one batch, from the periodic flusher task or
+at shutdown. A save is then acknowledged before it is stored, and each process
+serves its own cached copies, so write-behind is only for a single worker.
+"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+
+from storage import PROFILE_FIELDS, StorageBackend, profile_of
+
+
+def record_size(record):
+    # Approximation of the memory a profile holds, good enough to bound the cache
+    return len(json.dumps(record, default=str))
+
+
+def copy_profile(profile, fields=None):
+    # Handlers modify what they load: copy the containers, entries hold plain values
+    copied = {}
+    for key, value in profile.items():
+        if fields is not None and key not in fields:
+            continue
+        if isinstance(value, list):
+            value = [dict(entry) if isinstance(entry, dict) else entry for entry in value]
+        elif isinstance(value, dict):
+            value = dict(value)
+        copied[key] = value
+    return copied
+
+
+class CachingBackend(StorageBackend):
+    def __init__(self, inner, max_entries=1000, max_bytes=64 * 1024 * 1024, flush_interval=0.0):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()  # user -> [profile, size]
+        self._dirty = set()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        # Users whose snapshot flush() is writing, outside the lock
+        self._flushing = set()
+        self._flushed = threading.Condition(self._lock)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_records = 0
+
+    @property
+    def write_behind(self):
+        return self.flush_interval > 0
+
+    def _put(self, user, record, dirty):
+        if user in self._entries:
+            self._bytes -= self._entries[user][1]
+        size = record_size(record)
+        self._entries[user] = [record, size]
+        self._entries.move_to_end(user)
+        self._bytes += size
+        if dirty:
+            self._dirty.add(user)
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            user = next(iter(self._entries))
+            if user in self._dirty and user in self._flushing:
+                self._wait_flushed(user)
+                continue
+            record, size = self._entries.pop(user)
+            self._bytes -= size
+            self.evictions += 1
+            if user in self._dirty:
+                # Never drop unsaved changes
+                self._dirty.discard(user)
+                self.inner.save_user(user, record)
+
+    def _drop(self, user):
+        entry = self._entries.pop(user, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        self._dirty.discard(user)
+
+    def _wait_flushed(self, user):
+        # The snapshot flush() is writing for this user must land before anything newer
+        while user in self._flushing:
+            self._flushed.wait()
+
+    def _sync(self, user):
+        # Write a dirty profile back before reading anything else of this user from the backend
+        self._wait_flushed(user)
+        if user in self._dirty:
+            self.inner.save_user(user, self._entries[user][0])
+            self._dirty.discard(user)
+
+    def load_profile(self, user, fields=None):
+        with self._lock:
+            entry = self._entries.get(user)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(user)
+                return copy_profile(entry[0], fields)
+
+            self.misses += 1
+            self._wait_flushed(user)
+            # Only full profiles are cached: a partial read loads the whole profile once
+            profile = self.inner.load_profile(user)
+            if profile:
+                self._put(user, profile, dirty=False)
+            return copy_profile(profile, fields)
+
+    def load_user(self, user):
+        # The full record with its log is not cached
+        with self._lock:
+            self._sync(user)
+        return self.inner.load_user(user)
+
+    def save_user(self, user, data):
+        self.apply_batch([("save", user, data)])
+
+    def append_transactions(self, user, transactions):
+        return self.apply_batch([("append", user, transactions)])[0]
+
+    def post_recurring(self, user, postings):
+        return self.apply_batch([("post_recurring", user, postings)])[0]
+
+    def _write_through(self, ops):
+        try:
+            self.inner.apply_batch(ops)
+        except Exception:
+            # The cached profiles never reached the backend
+            for _, user, _ in ops:
+                self._drop(user)
+            raise
+
+    def apply_batch(self, ops):
+        with self._lock:
+            results = []
+            write_through = []
+            for kind, user, payload in ops:
+                if kind == "save":
+                    entry = self._entries.get(user)
+                    # The saved fields replace those of the cached profile
+                    profile = dict(entry[0], **profile_of(payload)) if entry is not None else profile_of(payload)
+                    complete = entry is not None or all(field in profile for field in PROFILE_FIELDS)
+                    # A save carrying new log entries is always written through
+                    if self.write_behind and complete and not payload.get("transactions"):
+                        self._put(user, profile, dirty=True)
+                    else:
+                        self._wait_flushed(user)
+                        if user in self._dirty:
+                            # The backend lacks the unsaved fields too
+                            payload = dict(payload, **profile)
+                            self._dirty.discard(user)
+                        if complete:
+                            self._put(user, profile, dirty=False)
+                        write_through.append((kind, user, payload))
+                    results.append(None)
+                elif kind == "append":
+                    if write_through:
+                        self._write_through(write_through)
+                        write_through = []
+                    self._sync(user)
+                    total = self.inner.append_transactions(user, payload)
+                    entry = self._entries.get(user)
+                    if entry is not None:
+                        # Only the savings derived from the log change, the size stays the same
+                        entry[0] = dict(entry[0], savings=max(0, total["total"]))
+                    results.append(total)
+                elif kind == "post_recurring":
+                    if write_through:
+                        self._write_through(write_through)
+                        write_through = []
+                    self._sync(user)
+                    results.append(self.inner.post_recurring(user, payload))
+                    # The backend decided which entries advanced
+                    self._drop(user)
+                else:
+                    raise ValueError(f"Unknown storage operation: {kind}")
+            if write_through:
+                self._write_through(write_through)
+            return results
+
+    def flush(self):
+        """Write every dirty profile to the backend in one batch, without holding the cache lock."""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            snapshot = {user: self._entries[user][0] for user in self._dirty}
+            self._dirty.clear()
+            self._flushing.update(snapshot)
+        saved = False
+        try:
+            self.inner.apply_batch([("save", user, profile) for user, profile in snapshot.items()])
+            saved = True
+        finally:
+            with self._lock:
+                self._flushing.difference_update(snapshot)
+                if saved:
+                    self.flushes += 1
+                    self.flushed_records += len(snapshot)
+                else:
+                    # Keep the changes for the next flush unless a newer save replaced them
+                    for user, profile in snapshot.items():
+                        if user not in self._dirty:
+                            self._put(user, profile, dirty=True)
+                self._flushed.notify_all()
+        return len(snapshot)
+
+    async def run_flusher(self):
+        """Periodically flush dirty records, meant to run as a background task."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Error flushing user cache: {e}")
+
+    def user_exists(self, user):
+        with self._lock:
+            if user in self._entries:
+                return True
+        return self.inner.user_exists(user)
+
+    def list_users(self):
+        self.flush()
+        return self.inner.list_users()
+
+    def iter_recurring(self):
+        self.flush()
+        return self.inner.iter_recurring()
+
+    def query_transactions(self, user, after=None, date_from=None, date_to=None, category=None, limit=100):
+        with self._lock:
+            self._sync(user)
+        return self.inner.query_transactions(user, after, date_from, date_to, category, limit)
+
+    def existing_hashes(self, user, hashes):
+        with self._lock:
+            self._sync(user)
+        return self.inner.existing_hashes(user, hashes)
+
+    def query_bills(self, user, due_from=None, due_to=None, status=None, limit=None, offset=0):
+        with self._lock:
+            self._sync(user)
+        return self.inner.query_bills(user, due_from, due_to, status, limit, offset)
+
+    def find_bill_id(self, user, title):
+        with self._lock:
+            self._sync(user)
+        return self.inner.find_bill_id(user, title)
+
+    def update_bill_status(self, user, bill_id, status):
+        with self._lock:
+            self._sync(user)
+            self._drop(user)
+        return self.inner.update_bill_status(user, bill_id, status)
+
+    def iter_due_bills(self, due_to, status="Pending"):
+        self.flush()
+        return self.inner.iter_due_bills(due_to, status)
+
+    def get_aggregates(self, user):
+        with self._lock:
+            self._sync(user)
+        return self.inner.get_aggregates(user)
+
+    def get_rollups(self, user, month_from=None, month_to=None):
+        with self._lock:
+            self._sync(user)
+        return self.inner.get_rollups(user, month_from, month_to)
+
+    def get_category_totals(self, user, period_keys):
+        with self._lock:
+            self._sync(user)
+        return self.inner.get_category_totals(user, period_keys)
+
+    def verify_aggregates(self, user):
+        with self._lock:
+            self._sync(user)
+        return self.inner.verify_aggregates(user)
+
+    def rebuild_aggregates(self, user):
+        with self._lock:
+            self._sync(user)
+            self._drop(user)
+        return self.inner.rebuild_aggregates(user)
+
+    def close(self):
+        self.flush()
+        self.inner.close()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "dirty": len(self._dirty),
+                "write_behind": self.write_behind,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "flushes": self.flushes,
+                "flushed_records": self.flushed_records,
+            }